@@ -0,0 +1,30 @@
+"""
+The admin site's URLs. urls.py includes this module at import time, but the
+apps' admin modules are only discovered, and the admin's URL patterns built,
+when the patterns are first read: by the first request under /admin/ or the
+first reverse() (which reads every included URLconf). Importing the project
+and resolving API URLs never loads them.
+"""
+from collections.abc import Sequence
+from functools import cached_property
+
+from django.contrib import admin
+
+
+class AdminURLPatterns(Sequence):
+    """admin.site.get_urls(), built on first use"""
+
+    @cached_property
+    def patterns(self):
+        admin.autodiscover()
+        return admin.site.get_urls()
+
+    def __getitem__(self, index):
+        return self.patterns[index]
+
+    def __len__(self):
+        return len(self.patterns)
+
+
+app_name = 'admin'
+urlpatterns = AdminURLPatterns()
@@ -0,0 +1,12 @@
+"""
+The API's own routes, without the admin's. urls.py mounts them; serializers
+reverse API URLs here (settings.API_URLCONF) because the first reverse() in
+the root URLconf reads every included URLconf, which loads the admin (see
+admin_urls.py) on the first menu response.
+"""
+from django.urls import path, include
+
+
+urlpatterns = [
+    path('api/', include('LittleLemonAPI.urls')),  # Include app URLs
+]
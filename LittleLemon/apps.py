@@ -0,0 +1,22 @@
+from django.contrib import admin
+from django.contrib.admin.apps import SimpleAdminConfig
+from django.contrib.admin.checks import check_admin_app, check_dependencies
+from django.core import checks
+
+
+def check_admin_modules(app_configs, **kwargs):
+    """The admin's own checks, run on every app's admin module (not yet imported while serving, see admin_urls.py)"""
+    admin.autodiscover()
+    return check_admin_app(app_configs, **kwargs)
+
+
+class LazyAdminConfig(SimpleAdminConfig):
+    """
+    The admin without autodiscovery at startup: LittleLemon/admin_urls.py
+    discovers the admin modules when the admin URLs load. The system checks
+    discover them first, so `manage.py check` still checks every ModelAdmin.
+    """
+
+    def ready(self):
+        checks.register(check_dependencies, checks.Tags.admin)
+        checks.register(check_admin_modules, checks.Tags.admin)
@@ -10,7 +10,19 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.core.handlers.asgi import ASGIRequest
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LittleLemon.settings')
+# Each ASGI request runs its sync database work on a thread of its own, so a
+# persistent connection would never be reused, only left open
+os.environ.setdefault('LITTLELEMON_CONN_MAX_AGE', '0')
+
+
+class AsyncViewsRequest(ASGIRequest):
+    # Django resolves a request with its own urlconf when it has one: the cart
+    # and order endpoints get their async views, see asgi_urls.py
+    urlconf = 'LittleLemon.asgi_urls'
+
 
 application = get_asgi_application()
+application.request_class = AsyncViewsRequest
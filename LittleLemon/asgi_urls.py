@@ -0,0 +1,14 @@
+"""
+URLconf of the ASGI entry point (see asgi.py): the cart and order endpoints
+are served by their async views, everything else as under WSGI.
+"""
+from django.urls import path, include
+from LittleLemonAPI.async_views import AsyncCartView, AsyncOrderView, AsyncSingleOrderView
+
+
+urlpatterns = [
+    path('api/cart/menu-items', AsyncCartView.as_view(), name='cart-menu-items'),
+    path('api/orders/', AsyncOrderView.as_view(), name='orders-list'),
+    path('api/orders/<int:order_id>', AsyncSingleOrderView.as_view(), name='single-order'),
+    path('', include('LittleLemon.urls')),
+]
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+from datetime import timedelta
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -32,7 +33,7 @@ ALLOWED_HOSTS = ['*']
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    'LittleLemon.apps.LazyAdminConfig',  # No autodiscovery at startup: LittleLemon/admin_urls.py discovers the admin modules when the admin URLs load
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -44,11 +45,13 @@ INSTALLED_APPS = [
     'rest_framework',
     'djoser',
     'rest_framework.authtoken',
+    'rest_framework_simplejwt.token_blacklist',
     'django_filters',
     'drf_yasg',
 ]
 
 MIDDLEWARE = [
+    'LittleLemonAPI.middleware.MetricsMiddleware',  # Outermost, so its latency covers the whole stack
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,10 +59,11 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    'LittleLemonAPI.middleware.StaticFilesMiddleware',  # WhiteNoise, async capable
 ]
 
 ROOT_URLCONF = 'LittleLemon.urls'
+API_URLCONF = 'LittleLemon.api_urls'  # Where serializers reverse API URLs, see LittleLemon/api_urls.py
 
 TEMPLATES = [
     {
@@ -86,10 +90,32 @@ WSGI_APPLICATION = 'LittleLemon.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('LITTLELEMON_DB_NAME', BASE_DIR / 'db.sqlite3'),  # e.g. a throwaway copy for profiling
     }
 }
 
+# SQLite tuned for concurrent requests; LITTLELEMON_SQLITE_PROFILE=default keeps SQLite's stock settings
+SQLITE_PROFILE = os.environ.get('LITTLELEMON_SQLITE_PROFILE', 'production')
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # Readers and the writer no longer block each other
+    'synchronous': 'NORMAL',  # Durable across crashes of the app in WAL mode; fsync at checkpoints only
+    'busy_timeout': 10000,  # Milliseconds a writer queues for the lock before "database is locked"
+    'cache_size': -64000,  # Page cache per connection, negative = KiB (64 MB)
+    'mmap_size': 256 * 1024 * 1024,  # Read the database through a memory map
+}
+if SQLITE_PROFILE == 'production':
+    DATABASES['default'].update(
+        # Reuse connections across requests (the PRAGMAs run once per connection). asgi.py sets
+        # this to 0: under ASGI every request runs its queries on a new thread and connection.
+        CONN_MAX_AGE=int(os.environ.get('LITTLELEMON_CONN_MAX_AGE', 600)),
+        CONN_HEALTH_CHECKS=True,
+        OPTIONS={
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # Transactions stay DEFERRED: the ones that read before they write (checkout, cart
+            # updates) take the write lock at BEGIN through LittleLemonAPI.transactions.immediate
+        },
+    )
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -134,6 +160,58 @@ STORAGES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory is per process, so without LITTLELEMON_CACHE_DIR the menu and roles are stale across
+# workers: a menu or role change only invalidates the worker that made it, and every other worker
+# (each serverless instance) serves what it cached for up to 30 seconds, the timeouts below.
+# LITTLELEMON_CACHE_DIR puts all workers on one FileBasedCache directory (it must be shared, e.g. a
+# volume mounted into every container), where invalidation reaches all of them.
+
+CACHE_DIR = os.environ.get('LITTLELEMON_CACHE_DIR')
+
+if CACHE_DIR:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+MENU_CACHE_ALIAS = 'default'
+MENU_CACHE_TIMEOUT = 60 * 60 if CACHE_DIR else 30  # Seconds a menu snapshot lives, at most this stale on other local-memory workers
+ROLE_CACHE_TIMEOUT = 5 * 60 if CACHE_DIR else 30  # Seconds a user's Manager / Delivery Crew roles are cached between requests
+EXPORT_CHUNK_SIZE = 500  # Orders read per query by the streaming order export
+FAST_SERIALIZATION = False  # Build the menu, cart and order lists from values() rows, see LittleLemonAPI/projections.py
+DISPATCH_BATCH_SIZE = 300  # Orders assigned per UPDATE by the delivery crew dispatcher (at most 333 on SQLite)
+CART_RESYNC_BATCH_SIZE = 1000  # Cart lines repriced per transaction by manage.py resync_cart_prices
+ORDER_ARCHIVE_AFTER_DAYS = 90  # manage.py archive_orders moves delivered orders older than this, see LittleLemonAPI/archive.py
+ORDER_ARCHIVE_BATCH_SIZE = 500  # Orders moved per transaction by manage.py archive_orders
+SEED_BATCH_SIZE = 5000  # Rows per bulk INSERT transaction of manage.py seed, see LittleLemonAPI/seeding.py
+COLD_START_BUDGET_MS = 750  # manage.py profile_startup fails when importing LittleLemon.wsgi and its first response take longer (measured 450-590 ms on a seeded database)
+IDEMPOTENCY_TTL = 24 * 60 * 60  # Seconds an Idempotency-Key result is replayed for
+IDEMPOTENCY_WAIT_TIMEOUT = 10  # Seconds a duplicate waits for the first request before answering 409
+IDEMPOTENCY_LOCK_TIMEOUT = 60  # Seconds after which an unfinished first request is considered dead
+
+# Per-endpoint metrics served at /api/metrics (admin only), see LittleLemonAPI/metrics.py
+METRICS_ENABLED = True
+# Shared directory where every worker process writes its totals; unset = this process only
+METRICS_DIR = os.environ.get('LITTLELEMON_METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 1.0  # Seconds between a process's writes to METRICS_DIR
+
+# Order event stream at /api/orders/events (ASGI), see LittleLemonAPI/events.py
+ORDER_EVENTS_QUEUE_SIZE = 100  # Undelivered events per stream before a slow client is disconnected
+ORDER_EVENTS_BACKLOG = 1000  # Recent events kept for clients reconnecting with Last-Event-ID
+ORDER_EVENTS_HEARTBEAT = 15  # Seconds between keep-alive comments on an idle stream
+ORDER_EVENTS_RETRY_MS = 3000  # Reconnection delay suggested to clients
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -142,6 +220,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
+        'rest_framework_simplejwt.authentication.JWTAuthentication', # "Bearer <access token>" from /api/jwt/create/
         'rest_framework.authentication.SessionAuthentication', # Enables login/logout
         'rest_framework.authentication.BasicAuthentication', # Optional: for API testing
     ],
@@ -175,6 +254,18 @@ DJOSER = {
     'USER_CREATE_PASSWORD_RETYPE': True,
     'LOGIN_FIELD': 'username',
 }
+# JWT mode: access tokens carry user id and role claims so the hot endpoints skip the DB
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    'ROTATE_REFRESH_TOKENS': True,
+    'BLACKLIST_AFTER_ROTATION': True,
+    'UPDATE_LAST_LOGIN': False,
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_OBTAIN_SERIALIZER': 'LittleLemonAPI.authentication.RoleTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'LittleLemonAPI.authentication.RoleTokenRefreshSerializer',
+}
+
 # DJOSER = {
 #     'USER_ID_FIELD': 'username',
 #     'USER_CREATE_PASSWORD_RETYPE': True,
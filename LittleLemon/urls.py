@@ -1,31 +1,18 @@
-from django.contrib import admin
 from django.urls import path, include, re_path
 from django.shortcuts import redirect 
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+from LittleLemonAPI import schema
 
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="LittleLemon Restaurant API",
-      default_version='v1',
-      description="A REST API for LittleLemon Restaurant",
-      contact=openapi.Contact(email="madukapaul92@gmail.com"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
-
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    path('admin/', include('LittleLemon.admin_urls')),  # Admin modules load when its patterns are first read
     path('api-auth/', include('rest_framework.urls')), # Enables login/logout
     path('api/', include('djoser.urls')),
     path('api/', include('djoser.urls.authtoken')),
-    path('api/', include('LittleLemonAPI.urls')),  # Include app URLs
-    path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'), # schema: drf_yasg
-    path('docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('api/', include('djoser.urls.jwt')), # JWT mode: jwt/create, jwt/refresh, jwt/verify
+    path('', include('LittleLemon.api_urls')),  # The app's URLs under /api/
+    path('swagger<format>/', schema.schema_view, name='schema-json'), # schema: prebuilt by build_openapi_schema
+    path('docs/', schema.ui_view('swagger'), name='schema-swagger-ui'),
+    path('redoc/', schema.ui_view('redoc'), name='schema-redoc'),
     # This handles any URLs not starting with 'api' and redirects them to '/api'
     re_path(r'^(?!api).*$', lambda request: redirect('/api', permanent=True)),
 ]
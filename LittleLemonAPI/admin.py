@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, MenuItem, Cart, Order, OrderItems
+from .models import Category, MenuItem, Cart, Order, OrderItems, ArchivedOrder, ArchivedOrderItems
 
 class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('title',)} 
@@ -10,4 +10,6 @@ admin.site.register(Category, CategoryAdmin)
 admin.site.register(MenuItem)
 admin.site.register(Cart)
 admin.site.register(Order)
-admin.site.register(OrderItems)
\ No newline at end of file
+admin.site.register(OrderItems)
+admin.site.register(ArchivedOrder)
+admin.site.register(ArchivedOrderItems)
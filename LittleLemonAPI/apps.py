@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class LittlelemonapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'LittleLemonAPI'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - registers the signal receivers
+
+        from django.conf import settings
+        if getattr(settings, 'METRICS_ENABLED', True):
+            from django.db.backends.signals import connection_created
+            from .metrics import install_query_timer
+            connection_created.connect(install_query_timer)
@@ -0,0 +1,65 @@
+"""
+Archival of delivered orders.
+
+Order and OrderItems only ever grow, and every OrderView listing, status
+filter and username search runs over that whole history. Delivered orders
+older than ORDER_ARCHIVE_AFTER_DAYS are instead moved into ArchivedOrder /
+ArchivedOrderItems by `python manage.py archive_orders`, keeping their ids:
+
+- orders move oldest first, ORDER_ARCHIVE_BATCH_SIZE at a time, each batch
+  copied and deleted in its own short write transaction, so checkouts and
+  status updates only ever wait for one batch;
+- a batch is read inside its transaction, so an order whose status changed
+  since the previous batch is not moved;
+- the sales rollups are untouched: an archived order still counts, and
+  rebuild_rollups reads both tables.
+
+Archived orders are read-only. GET /api/orders/<id> falls back to the archive
+and /api/orders/?archived=true lists it, with the same filters, search and
+pagination as the live orders.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Order, OrderItems, ArchivedOrder, ArchivedOrderItems
+from .transactions import immediate
+
+ORDER_FIELDS = ['id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date']
+ORDER_ITEM_FIELDS = ['order_id', 'menuitem_id', 'quantity', 'unit_price', 'price']
+
+
+def archive_cutoff(days=None):
+    """Delivered orders placed before this are archived"""
+    if days is None:
+        days = getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 90)
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_orders(before=None, batch_size=None):
+    """
+    Move the delivered orders placed before `before` (default: archive_cutoff())
+    and their order items into the archive tables, oldest first.
+
+    A generator: each batch runs in its own transaction and yields
+    (date of its newest order, orders moved) once committed.
+    """
+    before = before or archive_cutoff()
+    batch_size = batch_size or getattr(settings, 'ORDER_ARCHIVE_BATCH_SIZE', 500)
+    # Served by the order_delivered_date_idx partial index
+    candidates = Order.objects.filter(status=True, date__lt=before).order_by('date', 'id')
+    while True:
+        with immediate():
+            orders = list(candidates.values(*ORDER_FIELDS)[:batch_size])
+            if not orders:
+                return
+            ids = [order['id'] for order in orders]
+            archived = timezone.now()
+            ArchivedOrder.objects.bulk_create([ArchivedOrder(archived=archived, **order) for order in orders])
+            ArchivedOrderItems.objects.bulk_create(
+                [ArchivedOrderItems(**item) for item in OrderItems.objects.filter(order_id__in=ids).values(*ORDER_ITEM_FIELDS)],
+                batch_size=batch_size,
+            )
+            Order.objects.filter(pk__in=ids).delete()  # Cascades to the order items
+        yield orders[-1]['date'], len(orders)
@@ -0,0 +1,221 @@
+"""
+Async (ASGI) variants of the cart and order views.
+
+LittleLemon/asgi.py routes /api/cart/menu-items, /api/orders/ and
+/api/orders/<id> to the views below (see LittleLemon/asgi_urls.py); the WSGI
+entry point keeps serving the sync views in views.py, so a WSGI worker never
+pays for an event loop per request.
+
+The views are adrf views: adrf runs DRF's initial() (authentication,
+permissions, throttling) in one thread and awaits the handler. AsyncAPIView
+also resolves the user's roles in that thread, so the role checks of the
+handlers only read memoized data. Each variant subclasses its sync view and
+overrides every handler with one on the async ORM; the multi-statement writes
+(bulk cart update, checkout, order delete) and every request carrying an
+Idempotency-Key run the sync code in a thread, since Django has no async
+transaction.atomic.
+"""
+from adrf.views import APIView
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView as DRFAPIView
+
+from .idempotency import aidempotent
+from .models import MenuItem, Cart, Order, ArchivedOrder
+from .projections import CartRows, fast_serialization_enabled, ordering_columns
+from .renderers import EventStreamRenderer
+from .roles import get_roles, is_manager, is_delivery_crew
+from .schema import swagger_auto_schema
+from .serializers import CartSerializer, CartEntrySerializer, OrderSerializer
+from .services import update_cart, delete_order
+from .views import (HOT_PATH_AUTHENTICATION_CLASSES, CartView, OrderView, SingleOrderView,
+                    orders_with_details, archived_orders_with_details)
+from . import events
+
+
+class AsyncAPIView(APIView):
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        get_roles(request.user)  # Still in adrf's thread: the async handlers read the memoized roles
+
+    def check_throttles(self, request):
+        # adrf's runs async_to_sync() for the async throttles even when there are none. A nested
+        # async_to_sync in that thread can take in another request's sync_to_async call and exit
+        # without running it, leaving that request hanging. This app's throttles are all sync.
+        DRFAPIView.check_throttles(self, request)
+
+
+class AsyncCartView(AsyncAPIView, CartView):
+    async def get(self, request):
+        """Return all cart items for the authenticated user"""
+        return Response(await self.acart_data(request))
+
+    async def acart_data(self, request):
+        if fast_serialization_enabled():
+            rows = CartRows({'request': request})
+            return [rows(row) async for row in rows.values(Cart.objects.filter(user=request.user))]
+
+        cart_items = [item async for item in Cart.objects.filter(user=request.user).select_related('user', 'menuitem__category')]
+        serializer = CartSerializer(cart_items, many=True, context={'request': request})  #Pass request context
+        return serializer.data
+
+    @aidempotent(CartView.post)
+    async def post(self, request):
+        """Add a menu item to the cart or update quantity, or apply a list of such changes at once"""
+        if isinstance(request.data, list):
+            return await self.apost_many(request)
+
+        menu_item_id = request.data.get("menuitem")
+        quantity = int(request.data.get("quantity", 1))  # Default to 1 if not provided
+
+        if not menu_item_id or not quantity or int(quantity) <= 0:
+            return Response({"error": "Invalid menu item or quantity"}, status=status.HTTP_400_BAD_REQUEST)
+
+        menu_item_obj = await MenuItem.objects.select_related('category').filter(id=menu_item_id).afirst()
+        if menu_item_obj is None:
+            raise NotFound("No MenuItem matches the given query.")
+
+        cart_item, created = await Cart.objects.select_related('user', 'menuitem__category').aget_or_create(
+            user=request.user,
+            menuitem=menu_item_obj,
+            defaults={'quantity': quantity}  # No need to set unit_price, handled in model
+        )
+
+        if not created:
+            cart_item.quantity = quantity  # Update quantity # Instead of adding +=, we set the new quantity
+        await cart_item.asave()  # Triggers the `save()` method in the model
+
+        return Response(CartSerializer(cart_item, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+    async def apost_many(self, request):
+        """Set the quantity of every listed menu item (0 removes it) and return the whole cart"""
+        serializer = CartEntrySerializer(data=request.data, many=True, allow_empty=False)
+        serializer.is_valid(raise_exception=True)
+        await sync_to_async(update_cart)(request.user, serializer.validated_data)  # One transaction, in one thread
+        return Response(await self.acart_data(request), status=status.HTTP_200_OK)
+
+    async def delete(self, request):
+        """Remove all cart items for the authenticated user"""
+        await Cart.objects.filter(user=request.user).adelete()
+        return Response({"message": "Cart cleared successfully"}, status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncOrderView(AsyncAPIView, OrderView):
+    async def get(self, request, *args, **kwargs):
+        """List the orders visible to the user, one keyset page at a time"""
+        queryset = self.filter_queryset(self.get_queryset())
+        if fast_serialization_enabled():
+            return await self.afast_list(request, queryset)
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        if page is None:
+            page = [order async for order in queryset]
+            return Response(self.get_serializer(page, many=True).data)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    async def afast_list(self, request, queryset):
+        """get() built from values() rows, see projections.py"""
+        rows = self.order_rows()
+        values = rows.values(queryset, ordering_columns(self, queryset))
+        page = await self.paginator.apaginate_queryset(values, request, view=self)
+        orders = page if page is not None else [order async for order in values]
+        items = [item async for item in rows.items([order['id'] for order in orders])]
+        data = rows.render(orders, items)
+        return Response(data) if page is None else self.get_paginated_response(data)
+
+    @aidempotent(OrderView.post)
+    async def post(self, request, *args, **kwargs):
+        """Place an order from the user's cart"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        await sync_to_async(self.perform_create)(serializer)  # The checkout transaction runs in one thread
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class AsyncSingleOrderView(AsyncAPIView, SingleOrderView):
+    async def aget_object(self, order_id, archived=False):
+        """The live order, else (archived=True) the archived one; archived orders are read-only"""
+        try:
+            return await orders_with_details().aget(id=order_id)
+        except Order.DoesNotExist:
+            if archived:
+                try:
+                    return await archived_orders_with_details().aget(id=order_id)
+                except ArchivedOrder.DoesNotExist:
+                    pass
+            raise NotFound("Order not found")
+
+    async def get(self, request, order_id):
+        return self.order_response(request, await self.aget_object(order_id, archived=True))
+
+    async def patch(self, request, order_id):
+        try:
+            order = await orders_with_details().aget(id=order_id)
+        except Order.DoesNotExist:
+            return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
+        previous = (order.status, order.delivery_crew_id)
+
+        # Manager: Assign delivery crew and update status
+        if is_manager(request.user):
+            delivery_crew_username = request.data.get('delivery_crew')
+            if delivery_crew_username:
+                try:
+                    delivery_crew = await User.objects.aget(username=delivery_crew_username)
+                    order.delivery_crew = delivery_crew
+                except User.DoesNotExist:
+                    return Response({"error": "Delivery crew user not found"}, status=status.HTTP_400_BAD_REQUEST)
+
+            order.status = request.data.get('status', order.status)  # Keep the current status if not provided
+            await order.asave()
+            self.publish_change(order, *previous)
+            return Response(OrderSerializer(order, context={'request': request}).data)
+
+        # Delivery Crew: Only allowed to update status
+        if is_delivery_crew(request.user):
+            if "status" in request.data:
+                order.status = request.data['status']
+                await order.asave()
+                self.publish_change(order, *previous)
+                return Response(OrderSerializer(order, context={'request': request}).data)
+            return Response({"error": "You can only update the status."}, status=status.HTTP_403_FORBIDDEN)
+
+        return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
+
+    async def delete(self, request, order_id):
+        if is_manager(request.user):
+            order = await self.aget_object(order_id)
+            await sync_to_async(delete_order)(order)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
+
+
+# Server-Sent Events stream of order status / delivery crew changes, see events.py.
+# Customers get their own orders, delivery crew their assigned orders and managers
+# every order. Needs ASGI: under WSGI an open stream would hold a worker thread.
+class OrderEventsView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = HOT_PATH_AUTHENTICATION_CLASSES
+    renderer_classes = [EventStreamRenderer, *api_settings.DEFAULT_RENDERER_CLASSES]
+
+    @swagger_auto_schema(operation_summary='Stream order status and delivery crew changes (text/event-stream)')
+    async def get(self, request):
+        if not isinstance(request._request, ASGIRequest):
+            return Response({"error": "The order event stream is only served over ASGI."},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+        try:
+            last_event_id = int(request.headers['Last-Event-ID'])
+        except (KeyError, ValueError):
+            last_event_id = None
+
+        subscription = events.subscribe(request.user.pk, is_manager(request.user), last_event_id)
+        response = StreamingHttpResponse(subscription, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+        return response
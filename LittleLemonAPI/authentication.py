@@ -0,0 +1,79 @@
+"""
+JWT mode with role claims.
+
+Tokens issued through djoser's /api/jwt/create/ carry the user id, username,
+is_staff and the user's role set (Manager / Delivery Crew). The hot endpoints
+authenticate with StatelessJWTAuthentication, which builds the user from those
+claims instead of loading it, so neither authentication nor the role checks
+touch the database. Access tokens are short lived; refreshing re-reads the
+user's roles and rotates the refresh token.
+"""
+from django.contrib.auth.models import User
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .roles import get_roles, set_roles
+
+ROLES_CLAIM = 'roles'
+
+
+def add_user_claims(token, user):
+    """Stamp the claims StatelessJWTAuthentication needs onto a token"""
+    token['username'] = user.get_username()
+    token['is_staff'] = user.is_staff
+    token[ROLES_CLAIM] = sorted(get_roles(user))
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        add_user_claims(token, user)
+        return token
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: refresh.get(api_settings.USER_ID_CLAIM)}).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        # Re-stamp the claims so a role change reaches new access tokens on the next refresh
+        add_user_claims(refresh, user)
+        return super().validate({**attrs, 'refresh': str(refresh)})
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    Authenticate from the token claims alone.
+
+    The user is an unsaved-from-the-database User instance carrying the id,
+    username, is_staff and roles from the token. It is fine for filtering,
+    foreign keys and permission checks but must never be saved. Tokens without
+    role claims fall back to the regular database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if ROLES_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = User(
+            **{api_settings.USER_ID_FIELD: user_id},
+            username=validated_token.get('username', ''),
+            is_staff=validated_token.get('is_staff', False),
+            is_active=True,
+        )
+        user._state.adding = False
+        set_roles(user, validated_token[ROLES_CLAIM])
+        return user
@@ -0,0 +1,56 @@
+"""
+Raw INSERTs that skip the per-row model machinery.
+
+insert_rows hands a list of value tuples to the cursor's executemany: the
+database runs the same single-row INSERT once per tuple, prepared once, so
+there are still N statement executions, but no model instance per row and
+no 999-bound-value split as with bulk_create on SQLite. Django's query
+counter (CaptureQueriesContext, assertNumQueries) records an executemany as
+one query, so a constant count there means a constant number of calls from
+Python, not a single round trip. The sales rollups write their upserts (with
+an ON CONFLICT clause) with it and the seeder every cart, order and order
+item.
+
+insert_from copies the rows of a queryset into another table with one
+INSERT ... SELECT: a single statement whatever the number of rows, with the
+values computed by the database. Checkout writes the order lines with it.
+
+Both skip save(), signals and get_db_prep_value, so they are only for tables
+nothing listens to.
+"""
+from django.db import connections, router
+
+
+def _insert_sql(connection, model, fields):
+    quote = connection.ops.quote_name
+    columns = [model._meta.get_field(name).column for name in fields]
+    return f'INSERT INTO {quote(model._meta.db_table)} ({", ".join(map(quote, columns))})'
+
+
+def insert_rows(model, fields, rows, using=None, on_conflict=None):
+    """
+    INSERT the value tuples, already in database form and in `fields` order,
+    into the model's table on `using` (default: the router's write database
+    for the model). on_conflict(connection) may return SQL appended to the
+    statement, such as an ON CONFLICT ... DO UPDATE clause.
+    """
+    connection = connections[using or router.db_for_write(model)]
+    sql = f'{_insert_sql(connection, model, fields)} VALUES ({", ".join(["%s"] * len(fields))})'
+    if on_conflict:
+        sql += ' ' + on_conflict(connection)
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def insert_from(model, fields, queryset):
+    """
+    INSERT the rows selected by `queryset` into the model's table, on the
+    queryset's database, and return how many were inserted. `queryset` is a
+    values_list() of annotations only, annotated in `fields` order: the
+    SELECT lists annotations in the order they were added.
+    """
+    connection = connections[queryset.db]
+    select, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{_insert_sql(connection, model, fields)} {select}', params)
+        return cursor.rowcount
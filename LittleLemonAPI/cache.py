@@ -0,0 +1,67 @@
+"""
+Versioned snapshot cache for the serialized menu.
+
+Every cached menu response is stored under the current menu version, so
+bumping the version (on any MenuItem or Category change) makes every old
+snapshot unreachable at once without having to know which keys exist.
+The version lives in the cache, so the bump only reaches the workers that
+share it; see CACHES in settings for the local-memory default.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+MENU_VERSION_KEY = 'menu:version'
+
+
+def get_menu_cache():
+    """Return the cache backend used for menu snapshots"""
+    return caches[getattr(settings, 'MENU_CACHE_ALIAS', 'default')]
+
+
+def get_menu_version():
+    """Return the current menu version, creating one if the cache has none"""
+    cache = get_menu_cache()
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        # add() so that two processes racing here agree on a single version
+        cache.add(MENU_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version():
+    """Move to a fresh menu version, orphaning every existing snapshot"""
+    # A random token (not a counter) so an evicted version key can never
+    # come back with a value that matches an old snapshot
+    get_menu_cache().set(MENU_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate_menu():
+    """Bump the menu version once the current transaction commits"""
+    transaction.on_commit(bump_menu_version)
+
+
+def menu_snapshot_key(request):
+    """Build the snapshot key for this request's filter/search/ordering/page combination"""
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    )
+    # Hyperlinked `url` and pagination links are absolute, so the host is part of the key
+    raw = repr((request.build_absolute_uri(request.path), params))
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return f'menu:snapshot:{get_menu_version()}:{digest}'
+
+
+def get_menu_snapshot(key):
+    return get_menu_cache().get(key)
+
+
+def set_menu_snapshot(key, data):
+    timeout = getattr(settings, 'MENU_CACHE_TIMEOUT', 60 * 60)
+    get_menu_cache().set(key, data, timeout)
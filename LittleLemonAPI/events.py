@@ -0,0 +1,161 @@
+"""
+In-process fan-out of order updates for the Server-Sent Events stream.
+
+SingleOrderView.patch publishes an event whenever it changes an order's
+status or delivery crew. Every open stream (OrderEventsView) is a
+subscription with its own bounded asyncio queue on the event loop that
+serves it, and is itself the (async iterable) response body; publish() hands the event to each subscriber allowed to see it:
+
+- managers see every order;
+- a customer sees their own orders;
+- delivery crew see orders assigned to them, including the event that
+  moves an order away from them.
+
+publish() is thread safe and never blocks: a subscriber whose queue is full
+is disconnected instead (its client reconnects and catches up through
+Last-Event-ID). The last ORDER_EVENTS_BACKLOG events are kept so a
+reconnecting client gets what it missed; when even those don't reach back
+far enough, the stream starts with a `reset` event telling the client to
+reload its orders.
+
+Event ids start from the process start time in milliseconds, so they keep
+increasing across restarts.
+
+There is no broker: a stream only sees the updates made by the process
+serving it. Run the stream on a single ASGI worker, or route order updates
+and streams to the same one.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_subscribers = set()
+_ids = itertools.count(int(time.time() * 1000))
+_backlog = deque(maxlen=getattr(settings, 'ORDER_EVENTS_BACKLOG', 1000))
+
+
+class OrderEvent:
+    """One change to an order, as sent to the stream"""
+    __slots__ = ('id', 'data', 'user_id', 'crew_ids')
+
+    def __init__(self, id, data, user_id, crew_ids):
+        self.id = id
+        self.data = data
+        self.user_id = user_id
+        self.crew_ids = crew_ids
+
+    def encode(self):
+        return f'id: {self.id}\nevent: order\ndata: {json.dumps(self.data)}\n\n'.encode()
+
+
+class Subscription:
+    """An open stream: who is listening and the queue their events go to"""
+
+    def __init__(self, user_id, manager):
+        self.user_id = user_id
+        self.manager = manager
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=getattr(settings, 'ORDER_EVENTS_QUEUE_SIZE', 100))
+        self.closed = False
+        self.replay = []  # Backlog events to send before anything from the queue
+        self.missed = False  # Some events after Last-Event-ID are no longer in the backlog
+
+    def can_see(self, event):
+        return self.manager or self.user_id == event.user_id or self.user_id in event.crew_ids
+
+    def _put(self, event):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: end the stream rather than buffer without bound
+            self.closed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    def deliver(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:  # Its event loop is gone
+            unsubscribe(self)
+
+    async def get(self):
+        """The next event, or None once the subscription has been dropped"""
+        return await self.queue.get()
+
+    async def __aiter__(self):
+        """The SSE body: replayed events, then live ones, with heartbeats in between"""
+        heartbeat = getattr(settings, 'ORDER_EVENTS_HEARTBEAT', 15)
+        try:
+            yield f'retry: {getattr(settings, "ORDER_EVENTS_RETRY_MS", 3000)}\n\n'.encode()
+            if self.missed:
+                yield b'event: reset\ndata: {}\n\n'
+            replay, self.replay = self.replay, []
+            for event in replay:
+                yield event.encode()
+            while True:
+                try:
+                    event = await asyncio.wait_for(self.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield b': keep-alive\n\n'  # Lets proxies and the client see the connection is alive
+                    continue
+                if event is None:
+                    return
+                yield event.encode()
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop receiving events; StreamingHttpResponse calls this when the response is closed"""
+        self.closed = True
+        unsubscribe(self)
+
+
+def subscribe(user_id, manager, last_event_id=None):
+    """Open a subscription, with the backlog events after last_event_id to replay"""
+    subscription = Subscription(user_id, manager)
+    with _lock:
+        if last_event_id is not None and _backlog:
+            subscription.missed = _backlog[0].id > last_event_id + 1 and len(_backlog) == _backlog.maxlen
+            subscription.replay = [event for event in _backlog
+                                   if event.id > last_event_id and subscription.can_see(event)]
+        _subscribers.add(subscription)
+    return subscription
+
+
+def unsubscribe(subscription):
+    with _lock:
+        _subscribers.discard(subscription)
+
+
+def publish(order, previous_crew_id=None):
+    """Send the order's current status and delivery crew to every subscriber allowed to see it"""
+    crew_ids = {order.delivery_crew_id, previous_crew_id} - {None}
+    data = {
+        'id': order.pk,
+        'user': str(order.user),
+        'delivery_crew': str(order.delivery_crew) if order.delivery_crew_id else None,
+        'status': order._meta.get_field('status').to_python(order.status),
+    }
+    with _lock:
+        event = OrderEvent(next(_ids), data, order.user_id, crew_ids)
+        _backlog.append(event)
+        subscribers = [subscription for subscription in _subscribers if subscription.can_see(event)]
+    for subscription in subscribers:
+        subscription.deliver(event)
+    return event
+
+
+def reset():
+    """Drop all subscribers and the backlog (tests)"""
+    with _lock:
+        _subscribers.clear()
+        _backlog.clear()
+
@@ -0,0 +1,92 @@
+"""
+Streaming order export.
+
+Orders are read in keyset chunks of EXPORT_CHUNK_SIZE on (date, id), each
+chunk followed by one query for its order lines, so memory use is bounded by
+the chunk size whatever the number of rows, and no read cursor is held open
+while the client consumes the stream.
+"""
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import OrderItems
+from .pagination import keyset_after
+
+ORDER_FIELDS = ['id', 'date', 'user__username', 'delivery_crew__username', 'status', 'total']
+ITEM_FIELDS = ['order_id', 'menuitem_id', 'menuitem__title', 'quantity', 'unit_price', 'price']
+
+CSV_HEADER = [
+    'order_id', 'date', 'user', 'delivery_crew', 'status', 'total',
+    'menuitem_id', 'menuitem', 'quantity', 'unit_price', 'price',
+]
+
+
+def iter_orders(queryset, chunk_size=None):
+    """Yield (order, [order lines]) pairs as plain dicts, oldest order first"""
+    chunk_size = chunk_size or getattr(settings, 'EXPORT_CHUNK_SIZE', 500)
+    ordering = ['date', 'id']
+    queryset = queryset.order_by(*ordering).values(*ORDER_FIELDS)
+    last = None
+    while True:
+        chunk = queryset.filter(keyset_after(ordering, last)) if last else queryset
+        orders = list(chunk[:chunk_size])
+        if not orders:
+            return
+
+        lines = {order['id']: [] for order in orders}
+        for item in OrderItems.objects.filter(order_id__in=list(lines)).order_by('order_id', 'id').values(*ITEM_FIELDS):
+            lines[item['order_id']].append(item)
+        for order in orders:
+            yield order, lines[order['id']]
+
+        last = [orders[-1]['date'], orders[-1]['id']]
+
+
+def ndjson_lines(queryset):
+    """One JSON object per order, with its order items nested"""
+    for order, items in iter_orders(queryset):
+        row = {
+            'id': order['id'],
+            'user': order['user__username'],
+            'delivery_crew': order['delivery_crew__username'],
+            'status': order['status'],
+            'date': order['date'],
+            'total': order['total'],
+            'order_items': [
+                {
+                    'menuitem_id': item['menuitem_id'],
+                    'menuitem': item['menuitem__title'],
+                    'quantity': item['quantity'],
+                    'unit_price': item['unit_price'],
+                    'price': item['price'],
+                }
+                for item in items
+            ],
+        }
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(queryset):
+    """One CSV row per order item (orders without items get one row with empty item columns)"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for order, items in iter_orders(queryset):
+        head = [
+            order['id'], order['date'].isoformat(), order['user__username'],
+            order['delivery_crew__username'] or '', int(order['status']), order['total'],
+        ]
+        for item in items or [None]:
+            tail = [''] * 5 if item is None else [
+                item['menuitem_id'], item['menuitem__title'], item['quantity'], item['unit_price'], item['price'],
+            ]
+            yield writer.writerow(head + tail)
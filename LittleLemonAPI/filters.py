@@ -0,0 +1,11 @@
+from django_filters import rest_framework as filters
+from .models import Order
+
+# Filters for the manager order export: the OrderView filters plus a date range
+class OrderExportFilter(filters.FilterSet):
+    date_from = filters.IsoDateTimeFilter(field_name='date', lookup_expr='gte')
+    date_to = filters.IsoDateTimeFilter(field_name='date', lookup_expr='lt')
+
+    class Meta:
+        model = Order
+        fields = ['user__username', 'delivery_crew__username', 'status']
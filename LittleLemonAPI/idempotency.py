@@ -0,0 +1,225 @@
+"""
+Idempotency-Key support for the checkout and cart POSTs.
+
+A client that retries a slow POST /api/orders/ or POST /api/cart/menu-items
+sends the same `Idempotency-Key` header with each attempt. The first attempt
+claims the (user, key) pair by inserting an IdempotentRequest row, runs, and
+stores its status code and response data there, in the transaction of its own
+writes; every later attempt with that
+key gets the stored response back (with `Idempotent-Replayed: true`) without
+touching the cart, order or order item tables.
+
+- An attempt that arrives while the first is still running polls the row
+  until the result is stored, for at most IDEMPOTENCY_WAIT_TIMEOUT seconds,
+  then answers 409.
+- Reusing a key for a different request (method, path or body) is a 422.
+- Errors (an unexpected exception or a 5xx) release the key so a retry runs
+  again; 4xx responses are stored like any other result, including the ones
+  the view raises (ValidationError, NotFound, Http404, ...).
+- A claim left in progress for IDEMPOTENCY_LOCK_TIMEOUT seconds (its worker
+  died) is taken over by the next attempt.
+- Results are kept for IDEMPOTENCY_TTL seconds; an expired key starts over.
+  `python manage.py purge_idempotency_keys` deletes the expired rows.
+
+The async views (ASGI) poll without blocking the event loop and run the
+sync view's handler in a thread once they hold the key.
+"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotentRequest
+from .transactions import immediate
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def fingerprint(request):
+    """sha256 of the method, path and (parsed) body, to tell a retry from a different request under the same key"""
+    data = request.data
+    if hasattr(data, 'lists'):  # QueryDict from a form body
+        data = dict(data.lists())
+    body = json.dumps(data, cls=JSONEncoder, sort_keys=True)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def claim(user, key, digest):
+    """Insert the in-progress row for this key: (True, row) if this request got it, else (False, existing row or None)"""
+    now = timezone.now()
+    IdempotentRequest.objects.filter(user=user, key=key, expires__lte=now).delete()
+    try:
+        with transaction.atomic():
+            return True, IdempotentRequest.objects.create(
+                user=user, key=key, fingerprint=digest, started=now,
+                expires=now + timedelta(seconds=_setting('IDEMPOTENCY_TTL', 24 * 60 * 60)),
+            )
+    except IntegrityError:
+        return False, IdempotentRequest.objects.filter(user=user, key=key).first()
+
+
+def take_over(record):
+    """Claim an abandoned in-progress row; False if another attempt got to it first"""
+    return bool(IdempotentRequest.objects.filter(pk=record.pk, status_code=None, started=record.started)
+                .update(started=timezone.now()))
+
+
+def complete(record, response):
+    IdempotentRequest.objects.filter(pk=record.pk).update(
+        status_code=response.status_code, response=json.dumps(response.data, cls=JSONEncoder))
+
+
+def release(record):
+    IdempotentRequest.objects.filter(pk=record.pk, status_code=None).delete()
+
+
+def replay(record):
+    return Response(json.loads(record.response) if record.response else None, status=record.status_code,
+                    headers={REPLAYED_HEADER: 'true'})
+
+
+def _attempt(request, key, digest):
+    """
+    One try at the key: (record, None) when this request is to run, (None,
+    response) when it is answered without running, (None, None) while
+    another attempt with the key is still in progress.
+    """
+    while True:
+        claimed, record = claim(request.user, key, digest)
+        if claimed:
+            return record, None
+        if record is not None:
+            break
+        # Expired and deleted by another attempt in between; claim again
+
+    if record.fingerprint != digest:
+        return None, Response({'error': f'{HEADER} was already used for a different request'},
+                              status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if record.status_code is not None:
+        return None, replay(record)
+    lock_timeout = timedelta(seconds=_setting('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+    if record.started <= timezone.now() - lock_timeout and take_over(record):
+        return record, None
+    return None, None
+
+
+def _run(record, handler):
+    """
+    Run handler() for the claimed key and store its response, or free the key
+    if it fails. The handler's writes (the order placed, the cart changed) and
+    the stored response commit in one transaction, so no crash can leave the
+    writes done and the key still in progress for a retry to run them again.
+    """
+    try:
+        with immediate():
+            response = handler()
+            if response.status_code >= 500:
+                release(record)
+            else:
+                complete(record, response)
+    except BaseException:
+        release(record)  # The handler's writes were rolled back with it
+        raise
+    return response
+
+
+def _invalid_key(key):
+    if not 0 < len(key) <= IdempotentRequest._meta.get_field('key').max_length:
+        return Response({'error': f'{HEADER} must be 1 to 255 characters'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _in_progress():
+    return Response({'error': f'A request with this {HEADER} is still in progress'}, status=status.HTTP_409_CONFLICT)
+
+
+def run_once(request, key, handler):
+    """Run handler() for the first request with this key; replay its response for the others"""
+    error = _invalid_key(key)
+    if error:
+        return error
+    digest = fingerprint(request)
+    deadline = time.monotonic() + _setting('IDEMPOTENCY_WAIT_TIMEOUT', 10)
+    while True:
+        record, response = _attempt(request, key, digest)
+        if record is not None:
+            return _run(record, handler)
+        if response is not None:
+            return response
+        if time.monotonic() >= deadline:
+            return _in_progress()
+        time.sleep(_setting('IDEMPOTENCY_POLL_INTERVAL', 0.05))
+
+
+async def arun_once(request, key, handler):
+    """run_once() for async views: waits without blocking the event loop, runs handler() in a thread"""
+    error = _invalid_key(key)
+    if error:
+        return error
+    digest = fingerprint(request)
+    deadline = time.monotonic() + _setting('IDEMPOTENCY_WAIT_TIMEOUT', 10)
+    while True:
+        record, response = await sync_to_async(_attempt)(request, key, digest)
+        if record is not None:
+            return await sync_to_async(_run)(record, handler)
+        if response is not None:
+            return response
+        if time.monotonic() >= deadline:
+            return _in_progress()
+        await asyncio.sleep(_setting('IDEMPOTENCY_POLL_INTERVAL', 0.05))
+
+
+def _handler(view, method, request, args, kwargs):
+    def handler():
+        try:
+            return method(view, request, *args, **kwargs)
+        except Exception as exc:
+            # The response DRF sends for an APIException, Http404 or PermissionDenied, so it is
+            # stored (or, if 5xx, released) like a returned one; anything else is re-raised
+            return view.handle_exception(exc)
+    return handler
+
+
+def idempotent(method):
+    """Honour the Idempotency-Key header on a view method"""
+    @functools.wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return method(view, request, *args, **kwargs)
+        return run_once(request, key, _handler(view, method, request, args, kwargs))
+    return wrapper
+
+
+def aidempotent(sync_method):
+    """
+    Honour the Idempotency-Key header on an async view method. Requests with a
+    key are handled by sync_method, the @idempotent method of the sync view,
+    in a thread, so both views store and replay the same results.
+    """
+    method = inspect.unwrap(sync_method)
+
+    def decorator(async_method):
+        @functools.wraps(async_method)
+        async def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if key is None:
+                return await async_method(view, request, *args, **kwargs)
+            return await arun_once(request, key, _handler(view, method, request, args, kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.archive import archive_cutoff, archive_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Move delivered orders older than ORDER_ARCHIVE_AFTER_DAYS (and their order items) into "
+        "the archive tables, oldest first, one batch per transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Archive delivered orders placed more than this many days ago '
+                                 '(default: ORDER_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Orders per transaction (default: ORDER_ARCHIVE_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        before = archive_cutoff(options['days'])
+        batches = archived = 0
+        for newest, count in archive_orders(before, batch_size=options['batch_size']):
+            batches += 1
+            archived += count
+            if options['verbosity'] > 1:
+                self.stdout.write(f'orders up to {newest:%Y-%m-%d %H:%M}: {count} archived')
+        self.stdout.write(self.style.SUCCESS(
+            f'{archived} delivered orders placed before {before:%Y-%m-%d %H:%M} archived in {batches} batches.'))
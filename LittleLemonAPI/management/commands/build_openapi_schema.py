@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.schema import ARTIFACTS, STATIC_DIR, generate_schema, render_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the OpenAPI schema into static files (openapi/schema.json and .yaml) "
+        "that the schema views and WhiteNoise serve. Run it at build time, before collectstatic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', default=STATIC_DIR, type=Path,
+                            help='Static directory to write openapi/ into (default: the app static directory)')
+        parser.add_argument('--collectstatic', action='store_true',
+                            help='Run collectstatic afterwards, giving the files their hashed names')
+
+    def handle(self, *args, **options):
+        schema = generate_schema()
+        for format, (name, content_type) in ARTIFACTS.items():
+            path = options['output_dir'] / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(render_schema(format, schema))
+            self.stdout.write(f'{path}: {path.stat().st_size} bytes')
+        if options['collectstatic']:
+            finders.get_finder.cache_clear()  # The app finders listed the static directories before openapi/ existed
+            call_command('collectstatic', interactive=False, verbosity=0)
+            self.stdout.write('Static files collected.')
+        self.stdout.write(self.style.SUCCESS(f'OpenAPI schema built: {len(schema["paths"])} paths.'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.services import dispatch_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Assign every undelivered order without a delivery crew to the least loaded "
+        "Delivery Crew member. Safe to run from cron or alongside another run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Orders per UPDATE (default: DISPATCH_BATCH_SIZE)')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, dispatching every INTERVAL seconds (default: run once)')
+
+    def handle(self, *args, **options):
+        while True:
+            result = dispatch_orders(batch_size=options['batch_size'])
+            if not result['crew']:
+                self.stderr.write(self.style.WARNING('No active Delivery Crew members, nothing assigned.'))
+            for crew in result['crew']:
+                if crew['assigned']:
+                    self.stdout.write(f"{crew['delivery_crew']}: +{crew['assigned']} (load {crew['load']})")
+            self.stdout.write(self.style.SUCCESS(f"Assigned {result['assigned']} orders."))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
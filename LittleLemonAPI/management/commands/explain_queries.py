@@ -0,0 +1,138 @@
+import re
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+
+from LittleLemonAPI.cache import bump_menu_version
+from LittleLemonAPI.models import Order
+from LittleLemonAPI.seeding import ROLES
+
+# The only SCAN lines allowed in a plan: (probe label, or None for every probe, plan line pattern, why it is
+# not a full table scan). The first page of a listing has no cursor to SEARCH from, so it walks the table or
+# index in the listing's order and stops after the page: the next pages SEARCH from the cursor.
+FIRST_PAGE = 'first page: reads page_size + 1 rows in {} order, the next pages SEARCH from the cursor'
+ALLOWED_SCANS = [
+    ('menu-items-list', r'SCAN LittleLemonAPI_menuitem', FIRST_PAGE.format('primary key')),
+    ('menu-items-list ordering=price', r'SCAN LittleLemonAPI_menuitem USING INDEX LittleLemonAPI_menuitem_price_\w+',
+     FIRST_PAGE.format('price index')),
+    ('menu-items-list ordering=title', r'SCAN LittleLemonAPI_menuitem USING INDEX LittleLemonAPI_menuitem_title_\w+',
+     FIRST_PAGE.format('title index')),
+    ('orders-list (manager)', r'SCAN LittleLemonAPI_order USING INDEX order_date_idx', FIRST_PAGE.format('date index')),
+    ('orders-list status (manager)', r'SCAN LittleLemonAPI_order USING INDEX order_delivered_date_idx',
+     FIRST_PAGE.format('partial (delivered orders only) date index')),
+    (None, r'SCAN \w+ VIRTUAL TABLE INDEX \d+:M\d*',
+     'an FTS5 MATCH (the menu item search table is the only virtual table): answered from the full-text index'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN QUERY PLAN, after ANALYZE, on the SELECTs issued by each API endpoint "
+        "and fail if any of them scans a table, with or without an index, unless the scan "
+        "is in ALLOWED_SCANS. Runs on the data of `manage.py seed`, seeding it first when the "
+        "database has none, in a transaction that is always rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000, help='Orders to seed when the database has no seed data')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN checks are written for SQLite.')
+
+        failures = []
+        with transaction.atomic():
+            users = self.seeded_users(options)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')  # Plan with the statistics of this data, as production would
+            # Throttling would reject the probes, and its cache writes are irrelevant here
+            with mock.patch.object(SimpleRateThrottle, 'allow_request', return_value=True):
+                for label, role, path in self.probes(users):
+                    failures += self.probe(label, users[role], path)
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f'{len(failures)} queries scan a table: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('No table scans outside the allowlist.'))
+
+    def seeded_users(self, options):
+        """The first manager, delivery crew member and customer of `manage.py seed`, seeding (for this run) if needed"""
+        users = {role: User.objects.filter(username=f'{role}-0').first() for role, _ in ROLES}
+        if not all(users.values()):
+            call_command('seed', orders=options['orders'], stdout=StringIO())
+            users = {role: User.objects.get(username=f'{role}-0') for role, _ in ROLES}
+        users['order'] = Order.objects.filter(user=users['customer']).order_by('id').first()
+        return users
+
+    def probes(self, users):
+        order_id = users['order'].id
+        crew = users['crew'].username
+        customer = users['customer'].username
+        return [
+            ('menu-items-list', 'customer', '/api/menu-items/?page_size=5'),
+            ('menu-items-list ordering=price', 'customer', '/api/menu-items/?ordering=price&page_size=5'),
+            ('menu-items-list ordering=title', 'customer', '/api/menu-items/?ordering=-title&page_size=5'),
+            ('menu-items-list search', 'customer', '/api/menu-items/?search=item&page_size=5'),
+            ('menu-items-list search category', 'customer', '/api/menu-items/?search=category&page_size=5'),
+            ('menu-items-list search relevance', 'customer', '/api/menu-items/?search=item&ordering=relevance&page_size=5'),
+            ('cart-menu-items', 'customer', '/api/cart/menu-items'),
+            ('orders-list (manager)', 'manager', '/api/orders/?page_size=5'),
+            ('orders-list status (manager)', 'manager', '/api/orders/?status=true&page_size=5'),
+            ('orders-list crew filter (manager)', 'manager', f'/api/orders/?delivery_crew__username={crew}&page_size=5'),
+            ('orders-list user filter (manager)', 'manager', f'/api/orders/?user__username={customer}&page_size=5'),
+            ('orders-list (delivery crew)', 'crew', '/api/orders/?page_size=5'),
+            ('orders-list (customer)', 'customer', '/api/orders/?page_size=5'),
+            ('single-order', 'customer', f'/api/orders/{order_id}'),
+            ('sales-analytics (manager)', 'manager', '/api/analytics/sales?date_from=2000-01-01&date_to=2100-01-01'),
+        ]
+
+    def probe(self, label, user, path):
+        """Request the page (and the next page of a listing), then EXPLAIN every SELECT they ran"""
+        client = APIClient()
+        client.force_authenticate(user)
+        failures = []
+        for page in range(2):
+            if not path:
+                break
+            bump_menu_version()  # Menu snapshots would skip the queries we want to see
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(path)
+            if response.status_code != 200:
+                raise CommandError(f'{label}: GET {path} returned {response.status_code}')
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{label}: GET {path}'))
+            for query in queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                plan = self.explain(sql)
+                scans = [line for line in plan if self.is_scan(label, line)]
+                for line in plan:
+                    style = self.style.ERROR if line in scans else str
+                    self.stdout.write(style(f'  {line}'))
+                if scans:
+                    failures.append(label)
+
+            data = response.json()
+            path = data.get('next') if isinstance(data, dict) else None
+        return failures
+
+    @staticmethod
+    def explain(sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    @staticmethod
+    def is_scan(label, line):
+        """Any SCAN, with or without an index, that ALLOWED_SCANS doesn't list for this probe"""
+        return line.startswith('SCAN ') and not any(
+            probe in (None, label) and re.fullmatch(pattern, line) for probe, pattern, _ in ALLOWED_SCANS
+        )
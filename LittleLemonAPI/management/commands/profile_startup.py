@@ -0,0 +1,133 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Enough rows for the first page of every listing, seeded into the --temp-db database
+TEMP_DB_SEED = ['--categories', '5', '--menu-items', '50', '--managers', '1', '--crew', '2', '--customers', '10',
+                '--orders', '100', '--skip-rollups']
+
+# Runs in a fresh interpreter: import the entry point, then send it one request
+PROBE = '''
+import io, json, time
+from wsgiref.util import setup_testing_defaults
+start = time.perf_counter()
+from {module} import application
+imported = time.perf_counter()
+environ = {{'REQUEST_METHOD': 'GET', 'PATH_INFO': {path!r}, 'wsgi.input': io.BytesIO(b'')}}
+setup_testing_defaults(environ)
+status = []
+b''.join(application(environ, lambda s, h, exc_info=None: status.append(s)))
+done = time.perf_counter()
+print(json.dumps({{'import_ms': (imported - start) * 1000, 'first_response_ms': (done - imported) * 1000,
+                  'status': status[0]}}))
+'''
+
+
+def parse_importtime(stderr):
+    """(module, self µs, cumulative µs) for every line -X importtime wrote"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(own), int(cumulative)))
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        "Cold-start profile of the WSGI entry point: time to import it and to answer the first "
+        "request, in fresh interpreters, with the slowest modules and packages from -X importtime. "
+        "Fails when the import and the first response together take longer than COLD_START_BUDGET_MS "
+        "or the first request doesn't answer 2xx (--temp-db profiles against a migrated and seeded "
+        "throwaway database)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='LittleLemon.wsgi', help='Module exposing `application`')
+        parser.add_argument('--path', default='/api/menu-items/', help='URL of the first request')
+        parser.add_argument('--runs', type=int, default=3, help='Cold starts to time; the median is reported')
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help='Budget for the import plus the first response (default: settings.COLD_START_BUDGET_MS)')
+        parser.add_argument('--top', type=int, default=15, help='Modules and packages to list')
+        parser.add_argument('--temp-db', action='store_true',
+                            help='Run against a freshly migrated and seeded throwaway SQLite database instead of the configured one')
+
+    def env(self, database=None):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'LittleLemon.settings')}
+        if database:
+            env['LITTLELEMON_DB_NAME'] = str(database)  # Read by settings.DATABASES
+        return env
+
+    def migrate(self, database):
+        """Migrate and seed the database, so the first response renders rows (and loads what rendering them loads)"""
+        for command in (['migrate', '--noinput', '-v0'], ['seed', *TEMP_DB_SEED]):
+            result = subprocess.run([sys.executable, 'manage.py', *command], cwd=settings.BASE_DIR,
+                                    env=self.env(database), capture_output=True, text=True)
+            if result.returncode:
+                raise CommandError(f'Could not {command[0]} {database}:\n{result.stderr[-2000:]}')
+
+    def probe(self, options, importtime=False):
+        command = [sys.executable, *(['-X', 'importtime'] if importtime else []),
+                   '-c', PROBE.format(module=options['module'], path=options['path'])]
+        result = subprocess.run(command, cwd=settings.BASE_DIR, env=self.env(options['database']),
+                                capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f'{options["module"]} failed to start:\n{result.stderr[-2000:]}')
+        run = json.loads(result.stdout.strip().splitlines()[-1])
+        if not run['status'].startswith('2'):
+            # An error page is no measure of a cold start (and usually means the database isn't migrated)
+            raise CommandError(f'{options["path"]} answered {run["status"]}; use --temp-db to profile against '
+                               f'a migrated throwaway database:\n{result.stderr[-2000:]}')
+        return run, result.stderr
+
+    def handle(self, *args, **options):
+        if not options['temp_db']:
+            self.profile({**options, 'database': None})
+            return
+        with tempfile.TemporaryDirectory(prefix='littlelemon-startup-') as directory:
+            database = Path(directory) / 'db.sqlite3'
+            self.migrate(database)
+            self.profile({**options, 'database': database})
+
+    def profile(self, options):
+        budget = options['budget_ms']
+        if budget is None:
+            budget = getattr(settings, 'COLD_START_BUDGET_MS', 500)
+
+        runs = [self.probe(options)[0] for _ in range(max(options['runs'], 1))]
+        import_ms = statistics.median(run['import_ms'] for run in runs)
+        first_response_ms = statistics.median(run['first_response_ms'] for run in runs)
+
+        # A separate run for the breakdown: -X importtime slows the imports down
+        _, stderr = self.probe(options, importtime=True)
+        modules = parse_importtime(stderr)
+        packages = Counter()
+        for name, own, _ in modules:
+            packages[name.split('.')[0]] += own
+
+        top = options['top']
+        self.stdout.write(f'{"module":48} {"self ms":>8} {"cumulative ms":>14}')
+        for name, own, cumulative in sorted(modules, key=lambda module: -module[1])[:top]:
+            self.stdout.write(f'{name:48} {own / 1000:>8.1f} {cumulative / 1000:>14.1f}')
+        self.stdout.write(f'\n{"package":48} {"self ms":>8}')
+        for name, own in packages.most_common(top):
+            self.stdout.write(f'{name:48} {own / 1000:>8.1f}')
+
+        self.stdout.write(
+            f'\n{len(modules)} modules imported. Median of {len(runs)} cold starts: '
+            f'import {options["module"]} {import_ms:.0f} ms, first response from {options["path"]} '
+            f'{first_response_ms:.0f} ms ({runs[-1]["status"]}), total {import_ms + first_response_ms:.0f} ms'
+        )
+        if import_ms + first_response_ms > budget:
+            raise CommandError(f'Cold start of {options["module"]} took {import_ms + first_response_ms:.0f} ms, '
+                               f'over the {budget:.0f} ms budget')
+        self.stdout.write(self.style.SUCCESS(f'Within the {budget:.0f} ms cold-start budget.'))
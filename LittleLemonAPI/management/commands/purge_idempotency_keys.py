@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from LittleLemonAPI.models import IdempotentRequest
+
+
+class Command(BaseCommand):
+    help = "Delete the stored Idempotency-Key results whose IDEMPOTENCY_TTL has passed."
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotentRequest.objects.filter(expires__lte=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(f'{deleted} expired idempotency keys deleted.'))
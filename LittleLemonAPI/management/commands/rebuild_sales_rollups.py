@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily sales rollups (per day, per menu item and per category) "
+        "from the order tables, in one transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rollup rows per INSERT')
+
+    def handle(self, *args, **options):
+        counts = rebuild_rollups(batch_size=options['batch_size'])
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: {count} rows')
+        self.stdout.write(self.style.SUCCESS('Sales rollups rebuilt.'))
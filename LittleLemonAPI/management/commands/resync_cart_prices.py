@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.services import resync_carts
+
+
+class Command(BaseCommand):
+    help = (
+        "Reprice every cart line against the current menu prices, one UPDATE per batch of "
+        "cart lines, each batch in its own transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Cart lines per transaction (default: CART_RESYNC_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        batches = repriced = 0
+        for last_id, count in resync_carts(batch_size=options['batch_size']):
+            batches += 1
+            repriced += count
+            if options['verbosity'] > 1:
+                self.stdout.write(f'carts up to id {last_id}: {count} repriced')
+        self.stdout.write(self.style.SUCCESS(f'{repriced} cart lines repriced in {batches} batches.'))
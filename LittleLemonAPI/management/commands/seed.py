@@ -0,0 +1,68 @@
+import time
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonAPI.rollups import rebuild_rollups
+from LittleLemonAPI.seeding import PASSWORD, ROLES, SyntheticData
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a deterministic synthetic dataset: categories, menu items, managers, "
+        "delivery crew, customers, carts, orders and order items, bulk inserted in batches. "
+        "Reports the insert throughput per table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--menu-items', type=int, default=500)
+        parser.add_argument('--managers', type=int, default=2)
+        parser.add_argument('--crew', type=int, default=10)
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--cart-lines', type=int, default=5, help='Cart rows per customer')
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--history-days', type=int, default=365, help='Orders are spread over this many days')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows per INSERT transaction (default: SEED_BATCH_SIZE)')
+        parser.add_argument('--skip-rollups', action='store_true', help="Don't rebuild the sales rollups afterwards")
+
+    def handle(self, *args, **options):
+        if options['menu_items'] and not options['categories']:
+            raise CommandError('Menu items need at least one category')
+        if options['orders'] and not options['customers']:
+            raise CommandError('Orders need at least one customer')
+        data = SyntheticData(
+            categories=options['categories'], menu_items=options['menu_items'], managers=options['managers'],
+            crew=options['crew'], customers=options['customers'], cart_lines=options['cart_lines'],
+            orders=options['orders'], items_per_order=options['items_per_order'],
+            history_days=options['history_days'], seed=options['seed'], batch_size=options['batch_size'],
+        )
+        taken = User.objects.filter(username__in=[next(data.usernames(role), None) for role, _ in ROLES]).first()
+        if taken:
+            raise CommandError(f'User {taken.username} already exists: seed an empty database')
+
+        rows, seconds = defaultdict(int), defaultdict(float)
+        start = time.perf_counter()
+        for model, count, spent in data.insert():
+            rows[model] += count
+            seconds[model] += spent
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{model._meta.label}: {rows[model]} rows, {count / max(spent, 1e-9):,.0f} rows/s')
+        wall = time.perf_counter() - start
+
+        self.stdout.write(f'{"table":28} {"rows":>12} {"seconds":>9} {"rows/s":>12}')
+        for model in rows:
+            self.stdout.write(f'{model._meta.label:28} {rows[model]:>12} {seconds[model]:>9.1f} '
+                              f'{rows[model] / max(seconds[model], 1e-9):>12,.0f}')
+        total = sum(rows.values())
+        self.stdout.write(f'{"total":28} {total:>12} {wall:>9.1f} {total / wall:>12,.0f}  (wall clock, generation included)')
+
+        if not options['skip_rollups']:
+            start = time.perf_counter()
+            rebuild_rollups()
+            self.stdout.write(f'Sales rollups rebuilt in {time.perf_counter() - start:.1f}s.')
+        self.stdout.write(self.style.SUCCESS(f'Seeded {total} rows (seed {options["seed"]}); every user\'s password is {PASSWORD}.'))
@@ -0,0 +1,264 @@
+"""
+Per-endpoint request metrics in Prometheus text format.
+
+MetricsMiddleware (middleware.py) records, per resolved URL name and method:
+request counts by status code, a latency histogram, the number and total
+time of database queries and the time spent serializing (serializer.data
+of this app's serializers, see serializers.TimedSerializerMixin, plus response
+rendering). Recording is a few dict updates under a lock.
+
+Queries are timed by a wrapper installed on every database connection as it
+is opened; it reads the current request's record from a context variable,
+so queries run through sync_to_async (async views) are counted too.
+
+Each process keeps its own totals. With METRICS_DIR set, a thread of every
+process also writes them to <METRICS_DIR>/<pid>-<random hex>.json every
+METRICS_FLUSH_INTERVAL seconds (write to a temp file, then rename), and the
+metrics endpoint sums all files in the directory, so the numbers cover every
+worker. The random part keeps a new process that is given an exited one's pid
+from taking over its file. A file not rewritten for STALE_FLUSHES intervals
+belongs to a process that has exited: it is left out of the totals and
+removed, so the counters drop (a counter reset to Prometheus) when a worker
+goes away.
+"""
+import atexit
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNRESOLVED = '<unresolved>'
+
+STALE_FLUSHES = 5  # Flush intervals after which a file in METRICS_DIR is taken for an exited process's
+
+_lock = threading.Lock()
+_series = {}  # (endpoint, method) -> totals, see _new_totals()
+_file = None  # (pid, name) of this process's file in METRICS_DIR, see file_name()
+_flushing_pid = None  # Process whose flush thread is running, see start_writer()
+
+# Record of the request being handled, see timed_query() and timed_data()
+current_request = contextvars.ContextVar('metrics_request', default=None)
+
+
+def get_buckets():
+    return tuple(getattr(settings, 'METRICS_LATENCY_BUCKETS', DEFAULT_BUCKETS))
+
+
+def _new_totals():
+    return {
+        'statuses': {},
+        'buckets': [0] * len(get_buckets()),
+        'count': 0,
+        'seconds': 0.0,
+        'queries': 0,
+        'db_seconds': 0.0,
+        'serialization_seconds': 0.0,
+    }
+
+
+class RequestRecord:
+    """What one request costs; filled in while it is handled"""
+    __slots__ = ('queries', 'db_seconds', 'serialization_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialization_seconds = 0.0
+
+
+def record(endpoint, method, status, seconds, request_record):
+    """Add one finished request to this process's totals"""
+    with _lock:
+        totals = _series.get((endpoint, method))
+        if totals is None:
+            totals = _series[(endpoint, method)] = _new_totals()
+        status = str(status)
+        totals['statuses'][status] = totals['statuses'].get(status, 0) + 1
+        bucket = bisect_left(get_buckets(), seconds)
+        if bucket < len(totals['buckets']):
+            totals['buckets'][bucket] += 1  # Per-bucket counts, made cumulative on export
+        totals['count'] += 1
+        totals['seconds'] += seconds
+        totals['queries'] += request_record.queries
+        totals['db_seconds'] += request_record.db_seconds
+        totals['serialization_seconds'] += request_record.serialization_seconds
+    if _flushing_pid != os.getpid():
+        start_writer()
+
+
+def reset():
+    """Forget this process's totals (tests)"""
+    with _lock:
+        _series.clear()
+
+
+def _snapshot():
+    with _lock:
+        return [[endpoint, method, json.loads(json.dumps(totals))] for (endpoint, method), totals in _series.items()]
+
+
+def get_flush_interval():
+    return getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0)
+
+
+def file_name():
+    """This process's file in METRICS_DIR; a forked worker gets its own"""
+    global _file
+    pid = os.getpid()
+    with _lock:
+        if _file is None or _file[0] != pid:
+            _file = (pid, f'{pid}-{uuid.uuid4().hex}.json')
+        return _file[1]
+
+
+def flush():
+    """Write this process's totals to METRICS_DIR, if one is configured"""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as fh:
+            json.dump({'buckets': get_buckets(), 'series': _snapshot()}, fh)
+        os.replace(tmp, os.path.join(directory, file_name()))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _flush_forever():
+    while True:
+        time.sleep(get_flush_interval())
+        flush()  # Idle workers too, so their files don't go stale
+
+
+def start_writer():
+    """Start this process's flush thread; called on its first request (threads don't survive a fork)"""
+    global _flushing_pid
+    with _lock:
+        if _flushing_pid == os.getpid():
+            return
+        _flushing_pid = os.getpid()
+    if getattr(settings, 'METRICS_DIR', None):
+        threading.Thread(target=_flush_forever, name='metrics-flush', daemon=True).start()
+
+
+atexit.register(flush)
+
+
+def collect():
+    """Totals of every process writing to METRICS_DIR (or just this one), keyed by (endpoint, method)"""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory:
+        return {(endpoint, method): totals for endpoint, method, totals in _snapshot()}
+
+    flush()
+    stale_before = time.time() - STALE_FLUSHES * get_flush_interval()
+    merged = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.stat(path).st_mtime < stale_before:
+                os.unlink(path)  # Its process has exited
+                continue
+            with open(path) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            continue  # Removed or unreadable: skip rather than fail the scrape
+        if tuple(data.get('buckets', ())) != get_buckets():
+            continue  # Written with other bucket bounds, can't be added up
+        for endpoint, method, totals in data['series']:
+            into = merged.setdefault((endpoint, method), _new_totals())
+            for status, count in totals['statuses'].items():
+                into['statuses'][status] = into['statuses'].get(status, 0) + count
+            into['buckets'] = [a + b for a, b in zip(into['buckets'], totals['buckets'])]
+            for key in ('count', 'seconds', 'queries', 'db_seconds', 'serialization_seconds'):
+                into[key] += totals[key]
+    return merged
+
+
+def _labels(**labels):
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    series = sorted(collect().items())
+    buckets = get_buckets()
+    lines = []
+
+    def metric(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    metric('littlelemon_http_requests_total', 'counter', 'Requests by URL name, method and status code.')
+    for (endpoint, method), totals in series:
+        for status, count in sorted(totals['statuses'].items()):
+            lines.append(f'littlelemon_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+    metric('littlelemon_http_request_duration_seconds', 'histogram', 'Request latency in seconds.')
+    for (endpoint, method), totals in series:
+        cumulative = 0
+        for bound, count in zip(buckets, totals['buckets']):
+            cumulative += count
+            lines.append(f'littlelemon_http_request_duration_seconds_bucket{_labels(endpoint=endpoint, method=method, le=bound)} {cumulative}')
+        lines.append(f'littlelemon_http_request_duration_seconds_bucket{_labels(endpoint=endpoint, method=method, le="+Inf")} {totals["count"]}')
+        lines.append(f'littlelemon_http_request_duration_seconds_sum{_labels(endpoint=endpoint, method=method)} {totals["seconds"]}')
+        lines.append(f'littlelemon_http_request_duration_seconds_count{_labels(endpoint=endpoint, method=method)} {totals["count"]}')
+
+    for name, key, help_text in (
+        ('littlelemon_db_queries_total', 'queries', 'Database queries run.'),
+        ('littlelemon_db_query_duration_seconds_total', 'db_seconds', 'Time spent in database queries.'),
+        ('littlelemon_serialization_duration_seconds_total', 'serialization_seconds',
+         'Time spent in serializer.data and response rendering.'),
+    ):
+        metric(name, 'counter', help_text)
+        for (endpoint, method), totals in series:
+            lines.append(f'{name}{_labels(endpoint=endpoint, method=method)} {totals[key]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def timed_query(execute, sql, params, many, context):
+    """Database execute wrapper adding each query to the current request's record"""
+    request_record = current_request.get()
+    if request_record is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_record.queries += 1
+        request_record.db_seconds += time.perf_counter() - start
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver: time every query run on the new connection"""
+    if timed_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(timed_query)
+
+
+def timed_data(get_data):
+    """Call get_data(), adding the time it takes to the current request's record"""
+    request_record = current_request.get()
+    if request_record is None:
+        return get_data()
+    start = time.perf_counter()
+    try:
+        return get_data()
+    finally:
+        request_record.serialization_seconds += time.perf_counter() - start
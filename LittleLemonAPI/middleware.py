@@ -0,0 +1,129 @@
+import threading
+import time
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.string_utils import ensure_leading_trailing_slash
+
+from . import metrics
+
+
+# Record latency, status, database work and serialization time per URL name, see metrics.py
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'METRICS_ENABLED', True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        request_record, token, start = self.started(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        self.finished(request, response, request_record, start)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        request_record, token, start = self.started(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        self.finished(request, response, request_record, start)
+        return response
+
+    def started(self, request):
+        # Queries (metrics.timed_query) and serializers report to the record through a context
+        # variable, which also reaches the threads sync_to_async runs ORM calls in
+        request_record = metrics.RequestRecord()
+        request._metrics = request_record
+        return request_record, metrics.current_request.set(request_record), time.perf_counter()
+
+    def finished(self, request, response, request_record, start):
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.view_name if match else metrics.UNRESOLVED
+        metrics.record(endpoint, request.method, response.status_code, time.perf_counter() - start, request_record)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook; time it as serialization
+        request_record = getattr(request, '_metrics', None)
+        if request_record is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                request_record.serialization_seconds += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+
+# WhiteNoise, usable on both sides of ASGI: a sync-only middleware would run every
+# request below it (the async API views included) in a thread of its own.
+# The scan of STATIC_ROOT (a stat and a set of headers per file) waits for the
+# first request under a static prefix, so it stays out of a worker's cold start
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        self.deferred = []  # add_files calls still to run
+        self.deferred_prefixes = ()
+        self.scan_lock = threading.Lock()
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def add_files(self, root, prefix=None):
+        if self.autorefresh:
+            return super().add_files(root, prefix)
+        self.deferred.append(partial(super().add_files, root, prefix))
+        self.deferred_prefixes += (ensure_leading_trailing_slash(prefix),)
+
+    def add_files_from_finders(self):
+        self.deferred.append(super().add_files_from_finders)
+        self.deferred_prefixes += (self.static_prefix,)
+
+    def needs_scan(self, path):
+        return self.autorefresh or bool(self.deferred) and path.startswith(self.deferred_prefixes)
+
+    def match(self, path):
+        if self.autorefresh:
+            return self.find_file(path)
+        if self.needs_scan(path):
+            with self.scan_lock:
+                while self.deferred:
+                    self.deferred[0]()
+                    self.deferred.pop(0)
+        return self.files.get(path)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.match(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.needs_scan(request.path_info):
+            static_file = await sync_to_async(self.match)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,72 @@
+# Generated by Django 5.1.6 on 2026-10-18 04:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = 'LittleLemonAPI_menuitem_fts'
+
+CREATE_SQL = [
+    f"""CREATE VIRTUAL TABLE "{FTS_TABLE}" USING fts5(title, category_title, tokenize='trigram')""",
+    f"""INSERT INTO "{FTS_TABLE}" (rowid, title, category_title)
+        SELECT m.id, m.title, c.title
+        FROM "LittleLemonAPI_menuitem" m JOIN "LittleLemonAPI_category" c ON c.id = m.category_id""",
+    # Triggers rather than signals, so bulk_create and queryset.update() stay in sync too
+    f"""CREATE TRIGGER "menuitem_fts_insert" AFTER INSERT ON "LittleLemonAPI_menuitem" BEGIN
+        INSERT INTO "{FTS_TABLE}" (rowid, title, category_title)
+        VALUES (new.id, new.title, (SELECT title FROM "LittleLemonAPI_category" WHERE id = new.category_id));
+    END""",
+    f"""CREATE TRIGGER "menuitem_fts_update" AFTER UPDATE OF title, category_id ON "LittleLemonAPI_menuitem" BEGIN
+        UPDATE "{FTS_TABLE}"
+        SET title = new.title, category_title = (SELECT title FROM "LittleLemonAPI_category" WHERE id = new.category_id)
+        WHERE rowid = new.id;
+    END""",
+    f"""CREATE TRIGGER "menuitem_fts_delete" AFTER DELETE ON "LittleLemonAPI_menuitem" BEGIN
+        DELETE FROM "{FTS_TABLE}" WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER "category_fts_update" AFTER UPDATE OF title ON "LittleLemonAPI_category" BEGIN
+        UPDATE "{FTS_TABLE}" SET category_title = new.title
+        WHERE rowid IN (SELECT id FROM "LittleLemonAPI_menuitem" WHERE category_id = new.id);
+    END""",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS "category_fts_update"',
+    'DROP TRIGGER IF EXISTS "menuitem_fts_delete"',
+    'DROP TRIGGER IF EXISTS "menuitem_fts_update"',
+    'DROP TRIGGER IF EXISTS "menuitem_fts_insert"',
+    f'DROP TABLE IF EXISTS "{FTS_TABLE}"',
+]
+
+
+def run_on_sqlite(statements):
+    # Other databases keep the plain icontains search (see LittleLemonAPI.search)
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for sql in statements:
+                schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0007_order_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuItemSearch',
+            fields=[
+                ('menuitem', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='LittleLemonAPI.menuitem')),
+                ('document', models.TextField(db_column='LittleLemonAPI_menuitem_fts')),
+                ('title', models.TextField()),
+                ('category_title', models.TextField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'LittleLemonAPI_menuitem_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(run_on_sqlite(CREATE_SQL), run_on_sqlite(DROP_SQL)),
+    ]
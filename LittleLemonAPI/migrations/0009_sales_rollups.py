@@ -0,0 +1,102 @@
+# Generated by Django 5.1.6 on 2026-10-18 04:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Fill the new rollup tables from the existing orders, as rebuild_rollups
+    does, so that placing and deleting orders adjusts complete figures.
+    """
+    db = schema_editor.connection.alias
+    Order = apps.get_model('LittleLemonAPI', 'Order')
+    OrderItems = apps.get_model('LittleLemonAPI', 'OrderItems')
+    DailySales = apps.get_model('LittleLemonAPI', 'DailySales')
+    day = TruncDate('date')
+    item_day = TruncDate('order__date')
+
+    units = dict(
+        OrderItems.objects.using(db).annotate(day=item_day).values('day')
+        .annotate(units=Sum('quantity')).order_by().values_list('day', 'units')
+    )
+    DailySales.objects.using(db).bulk_create(
+        (
+            DailySales(day=row['day'], revenue=row['revenue'], orders=row['orders'], units=units.get(row['day'], 0))
+            for row in Order.objects.using(db).annotate(day=day).values('day')
+            .annotate(revenue=Sum('total'), orders=Count('id')).order_by().iterator()
+        ),
+        batch_size=1000,
+    )
+
+    for name, key in (('DailyMenuItemSales', 'menuitem'), ('DailyCategorySales', 'menuitem__category')):
+        model = apps.get_model('LittleLemonAPI', name)
+        rows = (
+            OrderItems.objects.using(db).annotate(day=item_day).values('day', key)
+            .annotate(revenue=Sum('price'), orders=Count('order', distinct=True), units=Sum('quantity'))
+            .order_by().iterator()
+        )
+        field = model._meta.get_field(key.split('__')[-1]).attname
+        model.objects.using(db).bulk_create(
+            (
+                model(day=row['day'], revenue=row['revenue'], orders=row['orders'], units=row['units'],
+                      **{field: row[key]})
+                for row in rows
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0008_menuitem_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day',), name='daily_sales_day_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='LittleLemonAPI.category')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'category'), name='daily_category_sales_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyMenuItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('menuitem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='LittleLemonAPI.menuitem')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'menuitem'), name='daily_menuitem_sales_uniq')],
+            },
+        ),
+        # Existing orders count from the start; the tables are dropped on the way back
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
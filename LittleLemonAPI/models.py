@@ -19,6 +19,30 @@ class MenuItem(models.Model):
     def __str__(self):
         return self.title
 
+# Full-text search lookup: `<fts table column> MATCH <query>`
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+# Read-only view of the SQLite FTS5 (trigram) index over menu item and category titles.
+# The table and the triggers that keep it in sync are created by migration 0008.
+class MenuItemSearch(models.Model):
+    menuitem = models.OneToOneField(MenuItem, primary_key=True, db_column='rowid', on_delete=models.DO_NOTHING, related_name='search')
+    document = models.TextField(db_column='LittleLemonAPI_menuitem_fts')  # FTS5 hidden column named after the table, matches every column
+    title = models.TextField()
+    category_title = models.TextField()
+    rank = models.FloatField()  # bm25 of the current MATCH, lower is better
+
+    class Meta:
+        managed = False
+        db_table = 'LittleLemonAPI_menuitem_fts'
+
+MenuItemSearch._meta.get_field('document').register_lookup(Match)
+
 # Cart model to track items added to the user's cart
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -28,7 +52,8 @@ class Cart(models.Model):
     price = models.DecimalField(max_digits=6, decimal_places=2, editable=False)  # Prevent manual edits, Total price for this item in cart
 
     class Meta:
-        unique_together = ('menuitem', 'user')
+        # user first: the cart is always looked up by user, then by menu item
+        unique_together = ('user', 'menuitem')
 
     def save(self, *args, **kwargs):
         """Ensure unit_price is always taken from menuitem and update price"""
@@ -47,6 +72,18 @@ class Order(models.Model):
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # Store total in DB
     date = models.DateTimeField(auto_now_add=True)  # Store both date and time
 
+    class Meta:
+        # One index per OrderView access path, each ending in the (date, id) listing order
+        indexes = [
+            models.Index(fields=['date', 'id'], name='order_date_idx'),
+            models.Index(fields=['user', 'date', 'id'], name='order_user_date_idx'),
+            models.Index(fields=['delivery_crew', 'date', 'id'], name='order_crew_date_idx'),
+            # Django writes status filters as a bare `WHERE "status"` / `WHERE NOT "status"`, which
+            # a (status, ...) index can't serve; partial indexes with the same condition can
+            models.Index(fields=['date', 'id'], condition=models.Q(status=False), name='order_pending_date_idx'),
+            models.Index(fields=['date', 'id'], condition=models.Q(status=True), name='order_delivered_date_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
 
@@ -63,3 +100,78 @@ class OrderItems(models.Model):
 
     def __str__(self):
         return f"{self.quantity} x {self.menuitem.title} in Order #{self.order.id}"
+
+# Delivered orders moved out of Order / OrderItems by archive.py, keeping their ids.
+# Read-only: SingleOrderView and OrderView?archived=true read them, nothing writes them
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # The Order id, so /api/orders/<id> keeps working
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='archived_deliveries', null=True)
+    status = models.BooleanField(default=1)  # Only delivered orders are archived
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    date = models.DateTimeField()
+    archived = models.DateTimeField()
+
+    class Meta:
+        # The OrderView access paths, as on Order
+        indexes = [
+            models.Index(fields=['date', 'id'], name='archived_order_date_idx'),
+            models.Index(fields=['user', 'date', 'id'], name='archived_order_user_date_idx'),
+            models.Index(fields=['delivery_crew', 'date', 'id'], name='archived_order_crew_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order #{self.id} by {self.user.username}"
+
+class ArchivedOrderItems(models.Model):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name="order_items")
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.SmallIntegerField()
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+    price = models.DecimalField(max_digits=6, decimal_places=2)
+
+    class Meta:
+        unique_together = ('order', 'menuitem')
+
+    def __str__(self):
+        return f"{self.quantity} x {self.menuitem.title} in archived order #{self.order.id}"
+
+# Daily sales rollups, kept up to date by rollups.py as orders are placed and deleted
+class SalesRollup(models.Model):
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)  # Orders placed that day (containing this item / category)
+    units = models.IntegerField(default=0)  # Menu item units sold
+
+    class Meta:
+        abstract = True
+
+class DailySales(SalesRollup):
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day'], name='daily_sales_day_uniq')]
+
+class DailyMenuItemSales(SalesRollup):
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'menuitem'], name='daily_menuitem_sales_uniq')]
+
+class DailyCategorySales(SalesRollup):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'category'], name='daily_category_sales_uniq')]
+
+# Outcome of a POST sent with an Idempotency-Key header, replayed for retries (see idempotency.py).
+# status_code is null while the first request is still running
+class IdempotentRequest(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 of method, path and body
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.TextField(blank=True)  # JSON of the response data
+    started = models.DateTimeField()
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'key'], name='idempotent_request_user_key_uniq')]
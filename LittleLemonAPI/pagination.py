@@ -0,0 +1,170 @@
+"""
+Keyset (cursor) pagination.
+
+DRF's CursorPagination keys on the first ordering field and uses an offset to
+step over ties, so a column with many equal values (menu prices, order status)
+degrades into an OFFSET scan. KeysetCursorPagination always appends the
+primary key as a tiebreaker and stores the full sort key of the boundary row
+in the cursor, so every page is a single indexed range query:
+
+    WHERE price >= p AND (price > p OR id > i) ORDER BY price, id LIMIT n + 1
+
+No COUNT query is run.
+"""
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+from .search import SEARCH_RANK, is_ranked
+
+
+def keyset_after(ordering, values):
+    """
+    Q matching rows strictly after `values` in `ordering`.
+
+    Spelled as f1 >= v1 AND (f1 > v1 OR (f2 >= v2 AND (f2 > v2 OR ...))) so the
+    leading column gives the database an index range to seek to.
+    """
+    condition = None
+    for field, value in reversed(list(zip(ordering, values))):
+        name = field.lstrip('-')
+        strict, inclusive = ('lt', 'lte') if field.startswith('-') else ('gt', 'gte')
+        after = Q(**{f'{name}__{strict}': value})
+        if condition is not None:
+            after = Q(**{f'{name}__{inclusive}': value}) & (after | condition)
+        condition = after
+    return condition
+
+
+class KeysetCursorPagination(CursorPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'  # Clients pick a page size...
+    max_page_size = 100  # ...up to this cap
+
+    def get_default_ordering(self, queryset):
+        return self.ordering
+
+    def get_ordering(self, request, queryset, view):
+        """Use the view's ordering (OrderingFilter or default) with the primary key as tiebreaker"""
+        ordering = self.get_default_ordering(queryset)
+        for backend in getattr(view, 'filter_backends', []):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view) or ordering
+                break
+
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        ordering = tuple(field for field in ordering if field.lstrip('-') not in ('id', 'pk'))
+        # The tiebreaker follows the direction of the leading field so one index serves both
+        descending = bool(ordering) and ordering[0].startswith('-')
+        return ordering + ('-pk' if descending else 'pk',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        return self._set_page(list(self._page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset for async views; the page is fetched with the async ORM"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        return self._set_page([obj async for obj in self._page_queryset(queryset, request, view)])
+
+    def _page_queryset(self, queryset, request, view):
+        """The rows of the requested page plus one, to tell whether there is another page"""
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        self.reverse = self.cursor.reverse if self.cursor else False
+
+        # Walking backwards is walking forwards over the flipped ordering
+        ordering = [self._flip(field) for field in self.ordering] if self.reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor and self.cursor.position is not None:
+            queryset = queryset.filter(keyset_after(ordering, self._decode_position(self.cursor.position, queryset)))
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+
+        self.has_next = has_more if not self.reverse else True
+        self.has_previous = has_more if self.reverse else self.cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self._encode_position(self.page[-1])
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self._encode_position(self.page[0])
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def _encode_position(self, instance):
+        values = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            if isinstance(instance, dict):  # A values() row, keyed by the full lookup path
+                values.append(instance['id' if name == 'pk' else name])
+                continue
+            value = instance
+            for attr in name.split('__'):
+                value = getattr(value, attr)
+            values.append(value)
+        # str() keeps full microsecond precision on datetimes (DjangoJSONEncoder rounds to milliseconds)
+        return json.dumps(values, default=str)
+
+    def _decode_position(self, position, queryset):
+        """The cursor's sort key, each value converted by the field it's compared with"""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # A tampered cursor ("garbage" for a date) would otherwise fail in the query as a 500
+        try:
+            return [self._ordering_field(queryset, field).to_python(value) for field, value in zip(self.ordering, values)]
+        except (TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _ordering_field(queryset, field):
+        """The model field (or annotation output field) an ordering entry sorts by, following relations"""
+        name = field.lstrip('-')
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        model = queryset.model
+        for part in name.split('__'):
+            target = model._meta.pk if part == 'pk' else model._meta.get_field(part)
+            model = target.related_model
+        return target
+
+
+class OrderCursorPagination(KeysetCursorPagination):
+    ordering = '-date'  # Newest orders first
+
+
+class MenuItemCursorPagination(KeysetCursorPagination):
+    ordering = 'pk'
+
+    def get_default_ordering(self, queryset):
+        # Full-text search results come best match first unless the client asks otherwise
+        return SEARCH_RANK if is_ranked(queryset) else self.ordering
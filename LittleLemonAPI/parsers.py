@@ -0,0 +1,22 @@
+import codecs
+import csv
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+# Parse a CSV upload (first line is the header) into a list of row dicts.
+# Empty cells are dropped so they count as "not given" rather than "blank".
+class CSVParser(BaseParser):
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            reader = csv.DictReader(codecs.getreader(encoding)(stream))
+            return [
+                {name.strip(): value.strip() for name, value in row.items() if name and value and value.strip()}
+                for row in reader
+            ]
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise ParseError(f'CSV parse error - {exc}')
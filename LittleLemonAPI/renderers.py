@@ -0,0 +1,13 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+# Lets clients ask for text/event-stream (EventSource does). The stream itself
+# is a StreamingHttpResponse; this only renders error responses, as JSON.
+class EventStreamRenderer(BaseRenderer):
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode() if data is not None else b''
@@ -0,0 +1,61 @@
+"""
+Role resolution for the Manager / Delivery Crew checks.
+
+A user's group names are loaded once per request (memoized on the user
+object that authentication attached to the request) and shared across
+requests through the cache for ROLE_CACHE_TIMEOUT seconds. Group membership
+changes invalidate the cached entry (in every worker sharing the cache),
+see signals.py.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+MANAGER = 'Manager'
+DELIVERY_CREW = 'Delivery Crew'
+
+_USER_ATTR = '_roles'
+
+
+def _cache_key(user_id):
+    return f'roles:{user_id}'
+
+
+def get_roles(user):
+    """Return the set of group names the user belongs to"""
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, _USER_ATTR, None)
+    if roles is None:
+        key = _cache_key(user.pk)
+        roles = cache.get(key)
+        if roles is None:
+            roles = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(key, roles, getattr(settings, 'ROLE_CACHE_TIMEOUT', 300))
+        setattr(user, _USER_ATTR, roles)
+    return roles
+
+
+def set_roles(user, roles):
+    """Attach an already known role set to the user, skipping the lookup"""
+    setattr(user, _USER_ATTR, frozenset(roles))
+
+
+def is_manager(user):
+    return MANAGER in get_roles(user)
+
+
+def is_delivery_crew(user):
+    return DELIVERY_CREW in get_roles(user)
+
+
+def invalidate_roles(user_ids):
+    """Forget the cached role sets of these users, now and again on commit"""
+    keys = [_cache_key(user_id) for user_id in user_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    # Deleting again after commit stops a concurrent request from re-caching
+    # the membership it read before this transaction committed
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,171 @@
+"""
+Daily sales rollups.
+
+DailySales, DailyMenuItemSales and DailyCategorySales hold revenue, order
+count and units per day (and per menu item / category). They are maintained
+incrementally: placing an order adds its figures and deleting one subtracts
+them, in the caller's transaction, each table with one
+INSERT ... ON CONFLICT DO UPDATE (run once per row by one executemany
+through bulk.insert_rows) that adds to the existing row. Reports
+then read a handful of rows per day instead of the order history.
+
+Orders count towards the day of their timestamp in the current time zone.
+Category rows use the menu item's category when the order is recorded (a
+rebuild uses the current one). Changes made outside place_order and
+SingleOrderView.delete (admin, cascades, raw SQL) are not tracked;
+`manage.py rebuild_sales_rollups` recomputes everything from the order tables.
+Archiving an order (archive.py) leaves its figures in place, and a rebuild
+reads the archive tables too.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connections, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .bulk import insert_rows
+from .models import Order, OrderItems, ArchivedOrder, ArchivedOrderItems, DailySales, DailyMenuItemSales, DailyCategorySales
+
+ROLLUP_MODELS = [DailySales, DailyMenuItemSales, DailyCategorySales]
+
+# Where rebuild_rollups finds orders: the live tables and the archive (see archive.py)
+ORDER_TABLES = [(Order, OrderItems), (ArchivedOrder, ArchivedOrderItems)]
+
+
+def _add_to_rollup(model, key_fields, rows, using):
+    """Add revenue/orders/units to the rows keyed by key_fields, creating missing rows"""
+    if not rows:
+        return
+
+    def add_to_existing(connection):
+        quote = connection.ops.quote_name
+        key_columns = [model._meta.get_field(name).column for name in key_fields]
+        updates = ', '.join(f'{quote(column)} = {quote(model._meta.db_table)}.{quote(column)} + excluded.{quote(column)}'
+                            for column in ('revenue', 'orders', 'units'))
+        return f'ON CONFLICT ({", ".join(map(quote, key_columns))}) DO UPDATE SET {updates}'
+
+    insert_rows(model, key_fields + ['revenue', 'orders', 'units'], rows, using=using, on_conflict=add_to_existing)
+
+
+def _apply(order, order_items, sign):
+    """Add (sign=1) or subtract (sign=-1) one order's figures, on the order's database"""
+    using = order._state.db
+    day = connections[using].ops.adapt_datefield_value(timezone.localdate(order.date))
+    units = 0
+    menu_items = defaultdict(lambda: [Decimal('0'), 0])
+    categories = defaultdict(lambda: [Decimal('0'), 0])
+    for order_item in order_items:
+        units += order_item.quantity
+        for totals in (menu_items[order_item.menuitem_id], categories[order_item.menuitem.category_id]):
+            totals[0] += order_item.price
+            totals[1] += order_item.quantity
+
+    def rows(totals):
+        return [(day, key, sign * revenue, sign, sign * quantity) for key, (revenue, quantity) in totals.items()]
+
+    with transaction.atomic(using=using):
+        _add_to_rollup(DailySales, ['day'], [(day, sign * order.total, sign, sign * units)], using)
+        _add_to_rollup(DailyMenuItemSales, ['day', 'menuitem'], rows(menu_items), using)
+        _add_to_rollup(DailyCategorySales, ['day', 'category'], rows(categories), using)
+
+
+def record_order(order, order_items):
+    """Count a newly placed order; order_items need their menuitem loaded"""
+    _apply(order, order_items, 1)
+
+
+def forget_order(order, order_items):
+    """Take a deleted order back out of the rollups"""
+    _apply(order, order_items, -1)
+
+
+def _summed(querysets, keys):
+    """Add up the revenue/orders/units aggregates of several querysets per value of `keys`"""
+    totals = defaultdict(lambda: [Decimal('0'), 0, 0])
+    for queryset in querysets:
+        for row in queryset.order_by().iterator():
+            row_totals = totals[tuple(row[key] for key in keys)]
+            for i, name in enumerate(('revenue', 'orders', 'units')):
+                row_totals[i] += row.get(name) or 0
+    return totals
+
+
+def rebuild_rollups(batch_size=1000):
+    """Recompute every rollup row from the order tables, live and archived"""
+    day = TruncDate('date')
+    item_day = TruncDate('order__date')
+    with transaction.atomic():
+        for model in ROLLUP_MODELS:
+            model.objects.all().delete()
+
+        days = _summed(
+            [orders.objects.annotate(day=day).values('day').annotate(revenue=Sum('total'), orders=Count('id'))
+             for orders, _ in ORDER_TABLES]
+            + [items.objects.annotate(day=item_day).values('day').annotate(units=Sum('quantity'))
+               for _, items in ORDER_TABLES],
+            ['day'],
+        )
+        DailySales.objects.bulk_create(
+            (DailySales(day=key, revenue=revenue, orders=orders, units=units)
+             for (key,), (revenue, orders, units) in days.items()),
+            batch_size=batch_size,
+        )
+
+        for model, key in ((DailyMenuItemSales, 'menuitem'), (DailyCategorySales, 'menuitem__category')):
+            # An order is either live or archived, never both, so the distinct order counts add up
+            rows = _summed(
+                [items.objects.annotate(day=item_day).values('day', key)
+                 .annotate(revenue=Sum('price'), orders=Count('order', distinct=True), units=Sum('quantity'))
+                 for _, items in ORDER_TABLES],
+                ['day', key],
+            )
+            field = model._meta.get_field(key.split('__')[-1]).attname
+            model.objects.bulk_create(
+                (
+                    model(day=row_day, revenue=revenue, orders=orders, units=units, **{field: value})
+                    for (row_day, value), (revenue, orders, units) in rows.items()
+                ),
+                batch_size=batch_size,
+            )
+
+    return {model.__name__: model.objects.count() for model in ROLLUP_MODELS}
+
+
+def sales_report(date_from, date_to, limit=10):
+    """
+    Totals, a per-day series and the top menu items and categories by revenue
+    for the inclusive date range, read from the rollup tables only.
+    """
+    in_range = {'day__gte': date_from, 'day__lte': date_to}
+    days = list(
+        DailySales.objects.filter(**in_range).order_by('day').values('day', 'revenue', 'orders', 'units')
+    )
+    sums = {'revenue': Sum('revenue'), 'orders': Sum('orders'), 'units': Sum('units')}
+    menu_items = list(
+        DailyMenuItemSales.objects.filter(**in_range).values('menuitem_id', 'menuitem__title')
+        .annotate(**sums).order_by('-revenue', 'menuitem_id')[:limit]
+    )
+    categories = list(
+        DailyCategorySales.objects.filter(**in_range).values('category_id', 'category__title')
+        .annotate(**sums).order_by('-revenue', 'category_id')[:limit]
+    )
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'revenue': sum((day['revenue'] for day in days), Decimal('0')),
+        'orders': sum(day['orders'] for day in days),
+        'units': sum(day['units'] for day in days),
+        'days': days,
+        'menu_items': [
+            {'id': row['menuitem_id'], 'title': row['menuitem__title'],
+             'revenue': row['revenue'], 'orders': row['orders'], 'units': row['units']}
+            for row in menu_items
+        ],
+        'categories': [
+            {'id': row['category_id'], 'title': row['category__title'],
+             'revenue': row['revenue'], 'orders': row['orders'], 'units': row['units']}
+            for row in categories
+        ],
+    }
@@ -0,0 +1,159 @@
+"""
+Prebuilt OpenAPI schema.
+
+drf_yasg builds the schema by introspecting every view, serializer, filter
+and paginator, and the stock schema views did that on every request.
+`python manage.py build_openapi_schema` now does it once, at build time,
+writing openapi/schema.json and openapi/schema.yaml into this app's static
+directory; collectstatic gives them hashed names and WhiteNoise serves them
+with far-future cache headers.
+
+- /swagger.json/ and /swagger.yaml/ answer from that file or, before it has
+  been built, from a schema generated on the first request and kept for the
+  life of the process;
+- /docs/ and /redoc/ render drf_yasg's UI pages around a stub schema (title
+  and version only) and point the browser at the hashed static file, or at
+  /swagger.json/ when there is none, so they never introspect the API either.
+
+Views declare their operation overrides with this module's
+swagger_auto_schema, which only records them: drf_yasg's own decorator is
+applied when the schema is generated, so serving the API never imports
+drf_yasg.
+
+The prebuilt schema has no `host`: clients use the host it was loaded from.
+"""
+import threading
+from functools import cache
+from pathlib import Path
+
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+
+INFO = {
+    'title': 'LittleLemon Restaurant API',
+    'default_version': 'v1',
+    'description': 'A REST API for LittleLemon Restaurant',
+    'contact_email': 'madukapaul92@gmail.com',
+}
+
+# Static file name and content type per schema format (the `format` of the schema-json route)
+ARTIFACTS = {
+    '.json': ('openapi/schema.json', 'application/json'),
+    '.yaml': ('openapi/schema.yaml', 'application/yaml'),
+}
+
+STATIC_DIR = Path(__file__).resolve().parent / 'static'  # Where the command writes; collected by AppDirectoriesFinder
+
+# (view method, keyword arguments) recorded by swagger_auto_schema, waiting for drf_yasg's decorator
+_overrides = []
+_overrides_lock = threading.Lock()
+
+
+def swagger_auto_schema(**overrides):
+    """
+    drf_yasg.utils.swagger_auto_schema, deferred: the overrides are recorded
+    and passed to drf_yasg's decorator by generate_schema(). Takes the same
+    keyword arguments and goes in the same place (above @action).
+    """
+    def decorator(view_method):
+        with _overrides_lock:
+            _overrides.append((view_method, overrides))
+        return view_method
+    return decorator
+
+
+def _apply_overrides():
+    """Run drf_yasg's decorator for every recorded override, once each"""
+    from drf_yasg.utils import swagger_auto_schema
+
+    with _overrides_lock:
+        while _overrides:
+            view_method, overrides = _overrides.pop(0)
+            swagger_auto_schema(**overrides)(view_method)
+
+
+def _info():
+    from drf_yasg import openapi
+
+    info = dict(INFO)
+    return openapi.Info(contact=openapi.Contact(email=info.pop('contact_email')), **info)
+
+
+def generate_schema():
+    """The full schema of every public endpoint, as drf_yasg's schema view builds it"""
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    _apply_overrides()
+    return OpenAPISchemaGenerator(_info()).get_schema(request=None, public=True)
+
+
+def render_schema(format, schema=None):
+    """The schema encoded as JSON or YAML"""
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+
+    codec = {'.json': OpenAPICodecJson, '.yaml': OpenAPICodecYaml}[format]
+    return codec(validators=[]).encode(schema or generate_schema())
+
+
+def _read_artifact(name):
+    """The built schema file: the collected copy, else the one in the app's static directory"""
+    if staticfiles_storage.exists(name):
+        with staticfiles_storage.open(name) as fh:
+            return fh.read()
+    path = finders.find(name)
+    return Path(path).read_bytes() if path else None
+
+
+@cache
+def schema_bytes(format):
+    """The schema in this format, from the built file or generated once per process"""
+    return _read_artifact(ARTIFACTS[format][0]) or render_schema(format)
+
+
+def schema_url():
+    """Where the UI fetches the schema from: the hashed static file if it has been collected"""
+    try:
+        return staticfiles_storage.url(ARTIFACTS['.json'][0])
+    except ValueError:  # Not in the staticfiles manifest
+        return reverse('schema-json', kwargs={'format': '.json'})
+
+
+def schema_view(request, format):
+    if format not in ARTIFACTS:
+        raise Http404
+    return HttpResponse(schema_bytes(format), content_type=ARTIFACTS[format][1])
+
+
+@cache
+def _ui_view(renderer):
+    from drf_yasg import openapi
+    from drf_yasg.generators import OpenAPISchemaGenerator
+    from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+    from drf_yasg.views import get_schema_view
+    from rest_framework.permissions import AllowAny
+
+    class InfoOnlyGenerator(OpenAPISchemaGenerator):
+        # The page only shows the title and version; the schema itself is fetched from schema_url()
+        def get_schema(self, request=None, public=False):
+            return openapi.Swagger(info=self.info, paths=openapi.Paths(paths={}), _prefix='/', _version=self.version)
+
+    class PrebuiltSwaggerUIRenderer(SwaggerUIRenderer):
+        def get_swagger_ui_settings(self):
+            return {**super().get_swagger_ui_settings(), 'url': schema_url()}
+
+    class PrebuiltReDocRenderer(ReDocRenderer):
+        def get_redoc_settings(self):
+            return {**super().get_redoc_settings(), 'url': schema_url()}
+
+    renderer_class = {'swagger': PrebuiltSwaggerUIRenderer, 'redoc': PrebuiltReDocRenderer}[renderer]
+    view = get_schema_view(_info(), public=True, permission_classes=(AllowAny,), generator_class=InfoOnlyGenerator)
+    return view.as_cached_view(renderer_classes=(renderer_class,))
+
+
+def ui_view(renderer):
+    """The swagger-ui or ReDoc page; drf_yasg is only imported on its first request"""
+    def view(request, *args, **kwargs):
+        return _ui_view(renderer)(request, *args, **kwargs)
+    return view
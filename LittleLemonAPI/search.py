@@ -0,0 +1,44 @@
+"""
+Menu search backed by the SQLite FTS5 trigram index (MenuItemSearch).
+
+`?search=` keeps its SearchFilter meaning (every term must appear, as a
+substring, in the menu item title or its category title), but matches come
+from the full-text index instead of a `LIKE '%term%'` scan of every row.
+
+Results keep the listing's ordering by default. `?ordering=relevance` ranks
+them by bm25 instead; that scores every match, so it is opt-in rather than
+paid on each keystroke of a broad term. Terms shorter than three characters
+can't be answered by a trigram index, and other databases have no FTS table,
+so both fall back to the regular icontains search.
+"""
+from django.db import connection
+from django.db.models import F
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from .models import MenuItemSearch
+
+RELEVANCE = 'relevance'
+SEARCH_RANK = 'search_rank'
+
+
+class MenuSearchFilter(filters.SearchFilter):
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        if connection.vendor != 'sqlite' or any(len(term) < 3 for term in terms):
+            return super().filter_queryset(request, queryset, view)
+
+        # Each term as a quoted FTS5 string; space-separated strings are ANDed
+        query = ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        if request.query_params.get(api_settings.ORDERING_PARAM) == RELEVANCE:
+            return queryset.filter(search__document__match=query).annotate(**{SEARCH_RANK: F('search__rank')})
+        # A rowid subquery keeps the listing's own ordering (and its indexes) in charge
+        matches = MenuItemSearch.objects.filter(document__match=query).values('pk')
+        return queryset.filter(pk__in=matches)
+
+
+def is_ranked(queryset):
+    """Whether MenuSearchFilter attached a relevance rank to this queryset"""
+    return SEARCH_RANK in queryset.query.annotations
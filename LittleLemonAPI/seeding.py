@@ -0,0 +1,171 @@
+"""
+Synthetic data at production scale, for `python manage.py seed` and the benchmarks.
+
+Rows go in batch_size at a time, one transaction per batch, never through
+Model.save() (Cart.save alone re-reads the menu item for every row): the
+menu and the users with bulk_create, which gives them their ids, and carts,
+orders and order items as plain value tuples with bulk.insert_rows. Only ids
+and prices are kept in memory and orders are generated a batch at a time with
+their order items, so tens of millions of order items are bounded by disk
+and time, not memory.
+
+The data is a function of the counts, `seed` and `end` alone (the batch size
+doesn't change it):
+
+- categories `Category N` and menu items `Item N` priced 2.00 to 30.00, every
+  seventh one featured;
+- users `manager-N`, `crew-N` and `customer-N` (password lemon-pass-123), the
+  first two in the Manager and Delivery Crew groups;
+- cart_lines distinct menu items in every customer's cart;
+- orders spread round robin over the customers and the crew, every other one
+  delivered, each with items_per_order distinct menu items, placed over the
+  history_days before `end` (default: midnight today): each order at a random
+  time within its own slot of that period, so dates rise with the ids as they
+  do in production (and the date indexes are appended to, not rewritten).
+
+Signals don't fire for bulk inserts: the menu cache is invalidated at the end,
+and the sales rollups are left to rebuild_rollups.
+"""
+import datetime
+import itertools
+import random
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User, Group
+from django.core.management.color import no_style
+from django.db import connection, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Category, MenuItem, Cart, Order, OrderItems, ArchivedOrder
+from .bulk import insert_rows
+from .cache import invalidate_menu
+from .roles import MANAGER, DELIVERY_CREW
+
+PASSWORD = 'lemon-pass-123'
+ROLES = [('manager', MANAGER), ('crew', DELIVERY_CREW), ('customer', None)]
+
+
+class SyntheticData:
+    """A deterministic dataset of the given size; insert() writes it"""
+
+    def __init__(self, categories=10, menu_items=500, managers=1, crew=5, customers=50, cart_lines=5,
+                 orders=2000, items_per_order=3, history_days=30, seed=1, end=None, batch_size=None):
+        self.categories = categories
+        self.menu_items = menu_items
+        self.users = {'manager': managers, 'crew': crew, 'customer': customers}
+        self.cart_lines = min(cart_lines, menu_items)
+        self.orders = orders
+        self.items_per_order = min(items_per_order, menu_items)
+        self.history_minutes = history_days * 24 * 60
+        self.end = end or timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time.min))
+        self.batch_size = batch_size or getattr(settings, 'SEED_BATCH_SIZE', 5000)
+        self.rng = random.Random(seed)
+        self.menu = []  # (id, price) of every menu item
+        self.user_ids = {}  # Role -> user ids
+
+    def usernames(self, role):
+        return (f'{role}-{i}' for i in range(self.users[role]))
+
+    def insert(self):
+        """Insert everything, one transaction per batch; yields (model, rows, seconds spent inserting) per batch"""
+        yield from self.insert_menu()
+        yield from self.insert_users()
+        yield from self.insert_carts()
+        yield from self.insert_orders()
+        invalidate_menu()
+
+    def bulk_insert(self, model, objs, inserted=None):
+        """bulk_create the unsaved instances batch_size at a time, passing each inserted batch (with ids) to inserted()"""
+        objs = iter(objs)
+        while batch := list(itertools.islice(objs, self.batch_size)):
+            start = time.perf_counter()
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            seconds = time.perf_counter() - start
+            if inserted:
+                inserted(batch)
+            yield model, len(batch), seconds
+
+    def insert_menu(self):
+        categories = []
+        yield from self.bulk_insert(
+            Category, (Category(slug=f'category-{i}', title=f'Category {i}') for i in range(self.categories)),
+            categories.extend,
+        )
+        items = (
+            MenuItem(title=f'Item {i}', price=Decimal(self.rng.randint(200, 3000)) / 100, featured=i % 7 == 0,
+                     category=categories[i % len(categories)])
+            for i in range(self.menu_items)
+        )
+        yield from self.bulk_insert(MenuItem, items, lambda batch: self.menu.extend((item.pk, item.price) for item in batch))
+
+    def insert_users(self):
+        password = make_password(PASSWORD)  # Hash once, not once per user
+        memberships = []
+        for role, group in ROLES:
+            ids = self.user_ids[role] = []
+            users = (User(username=username, password=password) for username in self.usernames(role))
+            yield from self.bulk_insert(User, users, lambda batch: ids.extend(user.pk for user in batch))
+            if group:
+                memberships.append((Group.objects.get_or_create(name=group)[0].pk, ids))
+        membership = User.groups.through
+        yield from self.bulk_insert(membership, (
+            membership(user_id=user_id, group_id=group_id) for group_id, ids in memberships for user_id in ids
+        ))
+
+    def raw_insert(self, model, fields, rows):
+        """
+        INSERT the value tuples (already in database form) with bulk.insert_rows,
+        batch_size rows per transaction: bulk_create builds an instance per row
+        and, on SQLite, sends at most 999 values per statement.
+        """
+        using = router.db_for_write(model)
+        rows = iter(rows)
+        while batch := list(itertools.islice(rows, self.batch_size)):
+            start = time.perf_counter()
+            with transaction.atomic(using=using):
+                insert_rows(model, fields, batch, using=using)
+            yield model, len(batch), time.perf_counter() - start
+
+    def insert_carts(self):
+        def carts():
+            for customer_id in self.user_ids['customer']:
+                for index in self.rng.sample(range(len(self.menu)), self.cart_lines):
+                    menuitem_id, price = self.menu[index]
+                    quantity = self.rng.randint(1, 3)
+                    yield customer_id, menuitem_id, quantity, price, price * quantity
+        yield from self.raw_insert(Cart, ['user', 'menuitem', 'quantity', 'unit_price', 'price'], carts())
+
+    def insert_orders(self):
+        """Orders and their items, with ids following the highest order id in use (live or archived)"""
+        customers, crew = self.user_ids['customer'], self.user_ids['crew']
+        first_id = max(Order.objects.aggregate(Max('id'))['id__max'] or 0,
+                       ArchivedOrder.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        adapt_date = connection.ops.adapt_datetimefield_value
+        slot = self.history_minutes / max(self.orders, 1)  # Minutes of history per order
+        for start in range(0, self.orders, self.batch_size):
+            orders, items = [], []
+            for i in range(start, min(start + self.batch_size, self.orders)):
+                order_id = first_id + i
+                lines = [(*self.menu[index], self.rng.randint(1, 3))
+                         for index in self.rng.sample(range(len(self.menu)), self.items_per_order)]
+                orders.append((
+                    order_id,
+                    customers[i % len(customers)],
+                    crew[i % len(crew)] if crew else None,
+                    i % 2 == 0,
+                    sum(price * quantity for _, price, quantity in lines),
+                    adapt_date(self.end - datetime.timedelta(minutes=slot * (self.orders - i - self.rng.random()))),
+                ))
+                items.extend((order_id, menuitem_id, quantity, price, price * quantity) for menuitem_id, price, quantity in lines)
+            yield from self.raw_insert(Order, ['id', 'user', 'delivery_crew', 'status', 'total', 'date'], orders)
+            yield from self.raw_insert(OrderItems, ['order', 'menuitem', 'quantity', 'unit_price', 'price'], items)
+
+        # Explicit ids don't advance the id sequence on every backend
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Order]):
+                cursor.execute(sql)
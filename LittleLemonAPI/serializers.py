@@ -1,16 +1,57 @@
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
+
+from django.conf import settings
+from django.utils import timezone
+
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 from .models import Category, MenuItem, Cart, Order, OrderItems
 from django.contrib.auth.models import User
+from .services import place_order
+from .metrics import timed_data
+
+# serializer.data timed into the request's metrics record, see metrics.py
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        return timed_data(lambda: super(TimedListSerializer, self).data)
+
+class TimedSerializerMixin:
+    """
+    Time the top-level serializer.data of one object and, through
+    TimedListSerializer as the default list_serializer_class, of many=True
+    lists. Only this app's serializers use it; DRF's and other apps' are left alone.
+    """
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not hasattr(cls, 'Meta'):
+            cls.Meta = type('Meta', (), {})
+        if not hasattr(cls.Meta, 'list_serializer_class'):
+            cls.Meta.list_serializer_class = TimedListSerializer
+
+    @property
+    def data(self):
+        return timed_data(lambda: super(TimedSerializerMixin, self).data)
+
+# `url` of a hyperlinked serializer, reversed in settings.API_URLCONF: the API's routes only, so
+# rendering it doesn't load the admin's URLs (and with them every admin module)
+class APIHyperlinkedIdentityField(serializers.HyperlinkedIdentityField):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reverse = partial(reverse, urlconf=getattr(settings, 'API_URLCONF', None))
 
 # Serializer for Category
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'slug', 'title']
 
-class MenuItemSerializer(serializers.HyperlinkedModelSerializer):
+class MenuItemSerializer(TimedSerializerMixin, serializers.HyperlinkedModelSerializer):
     category = CategorySerializer(read_only=True)  # Serialize category as a nested object
     category_id = serializers.IntegerField(write_only=True)  # Allow writing `category_id` directly
+    serializer_url_field = APIHyperlinkedIdentityField
 
     class Meta:
         model = MenuItem
@@ -28,8 +69,24 @@ class MenuItemSerializer(serializers.HyperlinkedModelSerializer):
         return menu_item
 
 
+# One row of a bulk menu import. Rows match an existing item by id, else by title;
+# a row with an id may leave the title out to keep the stored one, and price and
+# category_id are only required when the row creates a new item.
+class MenuItemImportSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False, min_value=1)
+    title = serializers.CharField(max_length=255, required=False)
+    price = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=Decimal('0'), required=False)
+    featured = serializers.BooleanField(required=False)
+    category_id = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        if 'id' not in attrs and 'title' not in attrs:
+            raise serializers.ValidationError("Give the id or the title of the menu item.")
+        return attrs
+
+
 # Serializer for Cart
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     menuitem = MenuItemSerializer()  # Nested serializer to display menu item details
     user = serializers.StringRelatedField()  # Display the username instead of ID
 
@@ -37,8 +94,13 @@ class CartSerializer(serializers.ModelSerializer):
         model = Cart
         fields = '__all__'
 
+# One entry of a bulk cart update; quantity 0 removes the menu item from the cart
+class CartEntrySerializer(serializers.Serializer):
+    menuitem = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=0)
+
 # Serializer for OrderItems
-class OrderItemsSerializer(serializers.ModelSerializer):
+class OrderItemsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     menuitem = MenuItemSerializer(read_only=True)
 
     class Meta:
@@ -46,7 +108,7 @@ class OrderItemsSerializer(serializers.ModelSerializer):
         fields = ['menuitem', 'quantity', 'unit_price', 'price']
 
 # Serializer for Order
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
     delivery_crew = serializers.StringRelatedField(read_only=True)
     order_items = OrderItemsSerializer(many=True, read_only=True)
@@ -56,32 +118,44 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'delivery_crew', 'status', 'date', 'total', 'order_items']
 
     def create(self, validated_data):
-        user = self.context['request'].user
-        cart_items = Cart.objects.filter(user=user)
-
-        if not cart_items.exists():
-            raise serializers.ValidationError("Your cart is empty. Add items before placing an order.")
-
-        # Create order
-        order = Order.objects.create(user=user)
-
-        # Move items from cart to order
-        for cart_item in cart_items:
-            OrderItems.objects.create(
-                order=order,
-                menuitem=cart_item.menuitem,
-                quantity=cart_item.quantity,
-                unit_price=cart_item.menuitem.price,
-                price=cart_item.quantity * cart_item.menuitem.price,
-            )
-
-        # Clear the cart
-        cart_items.delete()
-
-        return order
+        # Move the user's cart into a new order in one transaction
+        return place_order(self.context['request'].user)
+
+# Date range and size of a sales report; defaults to the last 7 days
+class SalesReportQuerySerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)  # Top menu items / categories returned
+
+    def validate(self, attrs):
+        attrs.setdefault('date_to', timezone.localdate())
+        attrs.setdefault('date_from', attrs['date_to'] - timedelta(days=6))
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from must not be after date_to.")
+        return attrs
+
+# Revenue, order count and units sold, as read from the sales rollups
+class SalesFiguresSerializer(TimedSerializerMixin, serializers.Serializer):
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+
+class DailySalesSerializer(SalesFiguresSerializer):
+    day = serializers.DateField()
+
+class RankedSalesSerializer(SalesFiguresSerializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+
+class SalesReportSerializer(SalesFiguresSerializer):
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    days = DailySalesSerializer(many=True)
+    menu_items = RankedSalesSerializer(many=True)
+    categories = RankedSalesSerializer(many=True)
 
 # Serializer for User (for registration, login, etc.)
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email']
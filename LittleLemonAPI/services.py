@@ -0,0 +1,353 @@
+import heapq
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Value
+from rest_framework import serializers
+
+from .models import Category, MenuItem, Cart, Order, OrderItems
+from .bulk import insert_from
+from .transactions import immediate
+from .cache import invalidate_menu
+from .rollups import record_order, forget_order
+from .roles import DELIVERY_CREW
+from . import events
+
+
+def place_order(user):
+    """
+    Turn the user's cart into an order, atomically.
+
+    The cart and its menu items are read (and locked, where the database
+    supports it) in one query, and the order total is computed in the same
+    pass. The order lines are written with one INSERT ... SELECT from the cart
+    and the menu, whatever the number of lines, and the cart is emptied with
+    one DELETE. If another checkout drained the cart, or a line was added, in
+    the meantime the whole transaction is rolled back, so a cart can never
+    produce two orders or be left half-drained.
+
+    The order is saved with save(), so its post_save receivers run. The order
+    lines are not: the INSERT sends no post_save for them (nothing listens for
+    OrderItems). The sales rollups are updated here, in the same transaction.
+    """
+    with immediate():
+        cart_items = list(
+            Cart.objects.select_for_update(of=('self', 'menuitem'))
+            .select_related('menuitem')
+            .filter(user=user)
+        )
+        if not cart_items:
+            raise serializers.ValidationError("Your cart is empty. Add items before placing an order.")
+
+        order_items = []
+        total = Decimal('0')
+        for cart_item in cart_items:
+            unit_price = cart_item.menuitem.price
+            price = unit_price * cart_item.quantity
+            total += price
+            # Unsaved, for the rollups: the rows themselves are copied by the INSERT below
+            order_items.append(OrderItems(
+                menuitem=cart_item.menuitem,
+                quantity=cart_item.quantity,
+                unit_price=unit_price,
+                price=price,
+            ))
+
+        order = Order.objects.create(user=user, total=total)
+        price_field = OrderItems._meta.get_field('price')
+        inserted = insert_from(OrderItems, ['order', 'menuitem', 'quantity', 'unit_price', 'price'], (
+            Cart.objects.filter(user=user)
+            .annotate(line_order=Value(order.pk))
+            .annotate(line_menuitem=F('menuitem_id'))
+            .annotate(line_quantity=F('quantity'))
+            .annotate(line_unit_price=F('menuitem__price'))
+            .annotate(line_price=ExpressionWrapper(F('menuitem__price') * F('quantity'), output_field=DecimalField(
+                max_digits=price_field.max_digits, decimal_places=price_field.decimal_places)))
+            .values_list('line_order', 'line_menuitem', 'line_quantity', 'line_unit_price', 'line_price')
+        ))
+        record_order(order, order_items)
+
+        # Claim the cart: if the lines written or the rows deleted differ from
+        # those read, a concurrent request changed or already checked out the cart
+        deleted, _ = Cart.objects.filter(user=user).delete()
+        if inserted != len(cart_items) or deleted != len(cart_items):
+            raise serializers.ValidationError("Your cart changed while the order was being placed. Please try again.")
+
+    return order
+
+
+def update_cart(user, entries):
+    """
+    Apply a batch of {menuitem, quantity} entries to the user's cart.
+
+    Quantity 0 removes the line, anything else sets it (later entries for the
+    same menu item win). All menu items are checked and priced with one query,
+    removals are one DELETE and additions/updates one upsert, all in a single
+    transaction: either every entry is applied or none is. bulk_create skips
+    Cart.save, so the unit and line prices are set here from the same read.
+    """
+    quantities = {entry['menuitem']: entry['quantity'] for entry in entries}
+
+    with immediate():
+        prices = dict(MenuItem.objects.filter(pk__in=list(quantities)).values_list('pk', 'price'))
+        missing = [menuitem_id for menuitem_id in quantities if menuitem_id not in prices]
+        if missing:
+            raise serializers.ValidationError(
+                {'menuitem': [f"Menu item {menuitem_id} does not exist." for menuitem_id in missing]}
+            )
+
+        removed = [menuitem_id for menuitem_id, quantity in quantities.items() if not quantity]
+        if removed:
+            Cart.objects.filter(user=user, menuitem_id__in=removed).delete()
+
+        lines = [
+            Cart(
+                user=user,
+                menuitem_id=menuitem_id,
+                quantity=quantity,
+                unit_price=prices[menuitem_id],
+                price=prices[menuitem_id] * quantity,
+            )
+            for menuitem_id, quantity in quantities.items() if quantity
+        ]
+        if lines:
+            Cart.objects.bulk_create(
+                lines,
+                update_conflicts=True,
+                unique_fields=['user', 'menuitem'],
+                update_fields=['quantity', 'unit_price', 'price'],
+            )
+
+
+def reprice_carts(carts):
+    """
+    Bring the given Cart rows up to their menu item's current price.
+
+    One UPDATE for the whole set, touching only the rows whose unit_price is
+    stale: unit_price and price are computed in SQL from the menu item, the
+    way Cart.save would compute them one row at a time. Returns the number of
+    rows repriced.
+    """
+    current_price = Subquery(MenuItem.objects.filter(pk=OuterRef('menuitem_id')).values('price')[:1])
+    price_field = Cart._meta.get_field('price')
+    return carts.exclude(unit_price=F('menuitem__price')).update(
+        unit_price=current_price,
+        price=ExpressionWrapper(current_price * F('quantity'), output_field=DecimalField(
+            max_digits=price_field.max_digits, decimal_places=price_field.decimal_places)),
+    )
+
+
+def resync_carts(batch_size=None):
+    """
+    Reprice every cart line against the current menu, in transactions of at
+    most batch_size (CART_RESYNC_BATCH_SIZE) lines taken in primary key order.
+    Yields (last cart id of the batch, lines repriced) per batch.
+    """
+    batch_size = batch_size or getattr(settings, 'CART_RESYNC_BATCH_SIZE', 1000)
+    last_id = 0
+    while True:
+        ids = list(Cart.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        upper = ids[-1]
+        with transaction.atomic():
+            repriced = reprice_carts(Cart.objects.filter(pk__gt=last_id, pk__lte=upper))
+        yield upper, repriced
+        last_id = upper
+
+
+def delete_order(order):
+    """Delete an order (loaded with its order items and their menu items) and take it out of the sales rollups"""
+    with transaction.atomic():
+        forget_order(order, order.order_items.all())
+        order.delete()
+
+
+def dispatch_orders(batch_size=None):
+    """
+    Assign every undelivered order without a delivery crew to the least loaded
+    Delivery Crew member (fewest undelivered orders; ties go to the lowest id).
+
+    Crew load comes from one aggregate query and is then tracked in memory.
+    Orders are taken oldest first, batch_size at a time, and each batch is
+    written with one bulk UPDATE in its own transaction (batch_size is capped
+    at the most orders the database takes in one UPDATE: 333 on SQLite, whose
+    bulk_update binds three values per object). The UPDATE only
+    touches orders that are still unassigned and undelivered, so when two
+    runs overlap an order keeps whichever crew member got it first; the loser
+    re-reads that batch's assignments (one query) and carries on.
+
+    Returns {'assigned': n, 'crew': [{'delivery_crew', 'assigned', 'load'}, ...]}.
+    """
+    batch_size = batch_size or getattr(settings, 'DISPATCH_BATCH_SIZE', 300)
+    unassigned = Order.objects.filter(status=False, delivery_crew__isnull=True)
+    # bulk_update binds pk twice (CASE WHEN and IN) plus the field per object, and splits past the limit
+    ops = connections[unassigned.db].ops
+    batch_size = min(batch_size, ops.bulk_batch_size(['pk', 'pk', 'delivery_crew'], range(batch_size)))
+    crew = {user.pk: user for user in User.objects.filter(groups__name=DELIVERY_CREW, is_active=True).order_by('pk')}
+    loads = dict.fromkeys(crew, 0)
+    loads.update(
+        Order.objects.filter(status=False, delivery_crew__in=list(crew)).order_by()
+        .values('delivery_crew').annotate(load=Count('id')).values_list('delivery_crew', 'load')
+    )
+    assigned = dict.fromkeys(crew, 0)
+
+    while crew:
+        batch = list(unassigned.select_related('user').order_by('date', 'id')[:batch_size])
+        if not batch:
+            break
+        heap = [(load, crew_id) for crew_id, load in loads.items()]
+        heapq.heapify(heap)
+        for order in batch:
+            load, crew_id = heapq.heappop(heap)
+            order.delivery_crew = crew[crew_id]
+            heapq.heappush(heap, (load + 1, crew_id))
+
+        with transaction.atomic():
+            updated = unassigned.bulk_update(batch, ['delivery_crew'])
+            if updated == len(batch):
+                won = batch
+            else:
+                # An overlapping run got to some of these orders first
+                current = dict(Order.objects.filter(pk__in=[order.pk for order in batch]).values_list('pk', 'delivery_crew'))
+                won = [order for order in batch if current[order.pk] == order.delivery_crew_id]
+                for order in batch:
+                    if current[order.pk] != order.delivery_crew_id and current[order.pk] in loads:
+                        loads[current[order.pk]] += 1
+
+        for order in won:
+            loads[order.delivery_crew_id] += 1
+            assigned[order.delivery_crew_id] += 1
+            events.publish(order)
+
+    return {
+        'assigned': sum(assigned.values()),
+        'crew': [
+            {'delivery_crew': user.username, 'assigned': assigned[crew_id], 'load': loads[crew_id]}
+            for crew_id, user in crew.items()
+        ],
+    }
+
+
+MENU_IMPORT_FIELDS = ['title', 'price', 'featured', 'category_id']
+
+
+def import_menu(rows):
+    """
+    Create or update menu items from already validated import rows.
+
+    Each row updates the item with its id, or else the item with its title,
+    or else creates a new item. Only the fields a row gives are written, so
+    an id row without a title keeps the stored one. No two items may end up
+    with the same title, counting the renames the file makes (titles are how
+    rows find their item). Categories and existing items are loaded with
+    one query each and every row is checked before anything is written, so
+    the result is either a list of per-row errors (and no changes) or one
+    bulk_create plus one bulk_update in a single transaction.
+
+    Bulk writes do not send post_save, so the menu cache is invalidated here,
+    once for the whole batch, and the carts holding a repriced item are
+    updated with one reprice_carts UPDATE; the search index follows through
+    its triggers.
+
+    Returns (results, errors): results hold {row, id, action} per row, errors
+    hold {row, errors} for every rejected row.
+    """
+    ids = {row['id'] for row in rows if 'id' in row}
+    titles = {row['title'] for row in rows if 'title' in row}  # Also the items that renames would collide with
+    category_ids = set(Category.objects.filter(
+        pk__in=[row['category_id'] for row in rows if 'category_id' in row]
+    ).values_list('pk', flat=True))
+
+    with immediate():
+        existing = list(MenuItem.objects.select_for_update().filter(Q(pk__in=ids) | Q(title__in=titles)).order_by('pk'))
+        by_id = {item.pk: item for item in existing}
+        by_title = {}
+        for item in existing:
+            by_title.setdefault(item.title, []).append(item)
+
+        errors, plan, claimed = [], [], set()
+        for index, row in enumerate(rows):
+            row_errors = {}
+            if 'id' in row:
+                item = by_id.get(row['id'])
+                if item is None:
+                    row_errors['id'] = [f"Menu item {row['id']} does not exist."]
+            else:
+                matches = by_title.get(row['title'], [])
+                if len(matches) > 1:
+                    row_errors['title'] = [f"{len(matches)} menu items are titled {row['title']!r}, give an id instead."]
+                item = matches[0] if matches else None
+
+            # An id row without a title only gets here with an unknown id, which is already an error
+            key = item.pk if item is not None else row.get('title')
+            if key is not None and key in claimed:
+                row_errors.setdefault('non_field_errors', []).append("Another row already changes this menu item.")
+            claimed.add(key)
+
+            if item is None and not row_errors:
+                for field in ('price', 'category_id'):
+                    if field not in row:
+                        row_errors[field] = ["This field is required when creating a menu item."]
+            if 'category_id' in row and row['category_id'] not in category_ids:
+                row_errors['category_id'] = [f"Category with id {row['category_id']} does not exist."]
+
+            if row_errors:
+                errors.append({'row': index, 'errors': row_errors})
+            else:
+                plan.append((index, item, row))
+
+        errors += _title_collisions(plan, existing)
+        if errors:
+            return [], sorted(errors, key=lambda error: error['row'])
+
+        created, updated, results = [], [], []
+        for index, item, row in plan:
+            if item is None:
+                item = MenuItem(featured=False)
+                created.append(item)
+                action = 'created'
+            else:
+                updated.append(item)
+                action = 'updated'
+            for field in MENU_IMPORT_FIELDS:
+                if field in row:
+                    setattr(item, field, row[field])
+            results.append((index, item, action))
+
+        MenuItem.objects.bulk_create(created)
+        MenuItem.objects.bulk_update(updated, MENU_IMPORT_FIELDS)
+        repriced = [item.pk for index, item, action in results if action == 'updated' and 'price' in rows[index]]
+        if repriced:
+            reprice_carts(Cart.objects.filter(menuitem_id__in=repriced))
+        invalidate_menu()
+
+    return [{'row': index, 'id': item.pk, 'action': action} for index, item, action in results], []
+
+
+def _title_collisions(plan, existing):
+    """
+    Errors for the planned rows that create an item or rename one to a title
+    another item would also have once the file is applied: another row's
+    item, or an existing item the file leaves alone.
+    """
+    planned = {item.pk for index, item, row in plan if item is not None}
+    owners = {}
+    for item in existing:
+        if item.pk not in planned:
+            owners.setdefault(item.title, []).append(None)
+    for index, item, row in plan:
+        owners.setdefault(row['title'] if 'title' in row else item.title, []).append(index)
+
+    errors = []
+    for index, item, row in plan:
+        if 'title' not in row or (item is not None and item.title == row['title']):
+            continue  # Keeps its title, so it is the other row's error
+        others = [other for other in owners[row['title']] if other != index]
+        if others:
+            where = ', '.join('an existing item' if other is None else f'row {other}' for other in others)
+            errors.append({'row': index, 'errors': {
+                'title': [f"{row['title']!r} would also be the title of {where}."]}})
+    return errors
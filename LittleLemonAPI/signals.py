@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User, Group
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from .models import Category, MenuItem, Cart
+from .cache import invalidate_menu
+from .roles import invalidate_roles
+
+# Any change to the menu makes every cached menu snapshot stale
+@receiver([post_save, post_delete], sender=MenuItem)
+@receiver([post_save, post_delete], sender=Category)
+def menu_changed(sender, **kwargs):
+    invalidate_menu()
+
+# A menu item saved with a new price reprices the carts holding it, in one UPDATE
+@receiver(post_save, sender=MenuItem)
+def menu_item_saved(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or 'price' in update_fields):
+        from .services import reprice_carts  # Not at import: services loads DRF, and this module loads at startup
+        reprice_carts(Cart.objects.filter(menuitem=instance))
+
+# Group membership changed from either side (user.groups or group.user_set)
+@receiver(m2m_changed, sender=User.groups.through)
+def group_membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_roles([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_roles(list(instance.user_set.values_list('id', flat=True)))
+    else:
+        invalidate_roles(pk_set)
+
+# Renaming or deleting a group changes the role set of all of its members
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_roles(list(instance.user_set.values_list('id', flat=True)))
@@ -1,3 +1,1755 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User, Group
+from django.core import checks
+from django.core.cache import cache, caches
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import F, Sum
+from django.core.management import call_command, CommandError
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+
+from .models import Category, MenuItem, Cart, Order, OrderItems, ArchivedOrder, ArchivedOrderItems, DailySales, DailyMenuItemSales, DailyCategorySales, IdempotentRequest
+from .rollups import record_order, rebuild_rollups
+from .services import place_order, update_cart, dispatch_orders, reprice_carts
+from .seeding import SyntheticData
+from .roles import get_roles
+from .pagination import OrderCursorPagination
+from . import metrics, events, schema, idempotency
+from .views import CartView, OrderView, SingleOrderView
+from .async_views import AsyncCartView, AsyncOrderView, AsyncSingleOrderView
+from LittleLemon.asgi import AsyncViewsRequest
+from .middleware import StaticFilesMiddleware
+
+
+# Base test case with throttling disabled and a clean cache for every test
+class APITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttle_patch = mock.patch.object(SimpleRateThrottle, 'allow_request', return_value=True)
+        throttle_patch.start()
+        self.addCleanup(throttle_patch.stop)
+        self.client = APIClient()
+
+    def make_user(self, username, group=None):
+        user = User.objects.create_user(username=username, password='lemon-pass-123')
+        if group:
+            user.groups.add(Group.objects.get_or_create(name=group)[0])
+        return user
+
+    def bearer(self, user):
+        # JWT headers for AsyncClient, which takes them per request
+        from .authentication import RoleTokenObtainPairSerializer
+        return {'Authorization': f'Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}'}
+
+
+class MenuSnapshotCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(slug='mains', title='Mains')
+        self.item = MenuItem.objects.create(title='Pasta', price='9.50', featured=False, category=self.category)
+
+    def test_cache_hit_skips_the_database(self):
+        first = self.client.get('/api/menu-items/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/menu-items/')
+        self.assertEqual(first.json(), second.json())
+
+    def test_query_string_is_part_of_the_key(self):
+        self.assertEqual(len(self.client.get('/api/menu-items/?search=pasta').json()['results']), 1)
+        self.assertEqual(len(self.client.get('/api/menu-items/?search=pizza').json()['results']), 0)
+
+    def test_menu_item_save_invalidates_snapshot(self):
+        self.client.get('/api/menu-items/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.price = '11.00'
+            self.item.save()
+        response = self.client.get('/api/menu-items/')
+        self.assertEqual(response.json()['results'][0]['price'], '11.00')
+
+    def test_category_change_invalidates_snapshot(self):
+        self.client.get('/api/menu-items/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.title = 'Main courses'
+            self.category.save()
+        response = self.client.get('/api/menu-items/')
+        self.assertEqual(response.json()['results'][0]['category']['title'], 'Main courses')
+
+    def test_shared_cache_dir_invalidates_every_worker(self):
+        file_cache = 'django.core.cache.backends.filebased.FileBasedCache'
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(CACHES={'default': {'BACKEND': file_cache, 'LOCATION': directory}}):
+            self.client.get('/api/menu-items/')
+            # Another worker: its own cache handler on the same directory
+            other_worker = caches.create_connection('default')
+            with mock.patch('LittleLemonAPI.cache.get_menu_cache', return_value=other_worker), \
+                    self.captureOnCommitCallbacks(execute=True):
+                self.item.price = '11.00'
+                self.item.save()
+            response = self.client.get('/api/menu-items/')
+        self.assertEqual(response.json()['results'][0]['price'], '11.00')
+
+
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = self.make_user('customer')
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.menu = MenuItem.objects.bulk_create(
+            MenuItem(title=f'Dish {i}', price=i + 1, featured=False, category=category) for i in range(1000)
+        )
+
+    def fill_cart(self, user, lines):
+        Cart.objects.bulk_create(
+            Cart(user=user, menuitem=item, quantity=2, unit_price=item.price, price=item.price * 2)
+            for item in self.menu[:lines]
+        )
+
+    def checkout_queries(self, user, lines):
+        self.fill_cart(user, lines)
+        with CaptureQueriesContext(connection) as queries:
+            place_order(user)
+        return len(queries)
+
+    def test_post_creates_order_and_drains_cart(self):
+        self.fill_cart(self.customer, 3)
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/orders/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total'], '12.00')
+        self.assertEqual(len(response.json()['order_items']), 3)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    def test_empty_cart_is_rejected(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.post('/api/orders/').status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        other = self.make_user('other')
+        self.assertEqual(self.checkout_queries(self.customer, 1), self.checkout_queries(other, 200))
+
+    def test_cart_past_the_parameter_limit_is_one_insert(self):
+        # 1000 lines of 5 columns: bulk_create would have split them at SQLite's 999 bound values
+        self.fill_cart(self.customer, 1000)
+        with CaptureQueriesContext(connection) as queries:
+            order = place_order(self.customer)
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT INTO "LittleLemonAPI_orderitems"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(OrderItems.objects.filter(order=order).count(), 1000)
+        self.assertEqual(OrderItems.objects.filter(order=order).aggregate(total=Sum('price'))['total'], order.total)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    def test_checkout_updates_the_sales_rollups(self):
+        self.fill_cart(self.customer, 3)
+        self.client.force_authenticate(self.customer)
+        order_id = self.client.post('/api/orders/').json()['id']
+        self.assertEqual(list(OrderItems.objects.filter(order=order_id).values_list('price', flat=True).order_by('price')),
+                         [Decimal('2.00'), Decimal('4.00'), Decimal('6.00')])
+        self.assertEqual(list(DailySales.objects.values_list('revenue', 'orders', 'units')), [(Decimal('12.00'), 1, 6)])
+        self.assertEqual(DailyMenuItemSales.objects.count(), 3)
+
+    def test_checkout_response_query_count_does_not_grow_with_cart_size(self):
+        counts = set()
+        for user, lines in ((self.customer, 1), (self.make_user('other'), 20)):
+            self.fill_cart(user, lines)
+            self.client.force_authenticate(user)
+            get_roles(user)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(len(self.client.post('/api/orders/').json()['order_items']), lines)
+                counts.add(len(queries))
+        self.assertEqual(len(counts), 1)
+
+    def test_cart_drained_concurrently_rolls_back(self):
+        self.fill_cart(self.customer, 2)
+        def drained_by_other_checkout(*args, **kwargs):
+            # Another checkout commits first and empties the same cart
+            Cart.objects.filter(user=self.customer).delete()
+            return record_order(*args, **kwargs)
+
+        with mock.patch('LittleLemonAPI.services.record_order', side_effect=drained_by_other_checkout):
+            with self.assertRaises(ValidationError):
+                place_order(self.customer)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItems.objects.exists())
+
+
+class BulkCartTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = self.make_user('customer')
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.menu = MenuItem.objects.bulk_create(
+            MenuItem(title=f'Dish {i}', price=i + 1, featured=False, category=category) for i in range(15)
+        )
+        self.client.force_authenticate(self.customer)
+
+    def post(self, entries):
+        return self.client.post('/api/cart/menu-items', entries, format='json')
+
+    def test_list_fills_cart_in_one_request(self):
+        response = self.post([{'menuitem': item.id, 'quantity': 2} for item in self.menu])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 15)
+        line = Cart.objects.get(user=self.customer, menuitem=self.menu[4])
+        self.assertEqual((line.quantity, line.unit_price, line.price), (2, 5, 10))
+
+    def test_updates_and_removals_apply_together(self):
+        self.post([{'menuitem': item.id, 'quantity': 1} for item in self.menu[:3]])
+        response = self.post([
+            {'menuitem': self.menu[0].id, 'quantity': 0},
+            {'menuitem': self.menu[1].id, 'quantity': 4},
+            {'menuitem': self.menu[5].id, 'quantity': 1},
+        ])
+        quantities = {line['menuitem']['id']: line['quantity'] for line in response.json()}
+        self.assertEqual(quantities, {self.menu[1].id: 4, self.menu[2].id: 1, self.menu[5].id: 1})
+        self.assertEqual(Cart.objects.get(user=self.customer, menuitem=self.menu[1]).price, 8)
+
+    def test_unknown_menu_item_rejects_the_whole_batch(self):
+        response = self.post([{'menuitem': self.menu[0].id, 'quantity': 1}, {'menuitem': 9999, 'quantity': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post([{'menuitem': self.menu[0].id, 'quantity': -1}]).status_code, 400)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        get_roles(self.customer)
+        counts = set()
+        for size in (1, 15):
+            Cart.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries:
+                self.post([{'menuitem': item.id, 'quantity': 1} for item in self.menu[:size]])
+                counts.add(len(queries))
+        self.assertEqual(len(counts), 1)
+
+
+class BulkMenuImportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = self.make_user('manager', 'Manager')
+        self.mains = Category.objects.create(slug='mains', title='Mains')
+        self.desserts = Category.objects.create(slug='desserts', title='Desserts')
+        self.pasta = MenuItem.objects.create(title='Pasta', price=9, featured=False, category=self.mains)
+        self.tart = MenuItem.objects.create(title='Lemon Tart', price=6, featured=False, category=self.desserts)
+        self.client.force_authenticate(self.manager)
+
+    def bulk(self, data, **kwargs):
+        return self.client.post('/api/menu-items/bulk/', data, **kwargs)
+
+    def test_json_rows_upsert_by_id_and_title(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.bulk([
+                {'id': self.pasta.id, 'title': 'Linguine', 'price': '10.50'},
+                {'title': 'Lemon Tart', 'featured': True},
+                {'title': 'Soup', 'price': '4.00', 'category_id': self.mains.id},
+            ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['created'], response.json()['updated']), (1, 2))
+        self.pasta.refresh_from_db()
+        self.tart.refresh_from_db()
+        self.assertEqual((self.pasta.title, str(self.pasta.price)), ('Linguine', '10.50'))
+        self.assertTrue(self.tart.featured)
+        self.assertEqual(MenuItem.objects.get(title='Soup').category, self.mains)
+
+    def test_csv_upload(self):
+        body = f'title,price,featured,category_id\nSoup,4.00,false,{self.mains.id}\nPasta,11.00,,\n'
+        response = self.bulk(body, content_type='text/csv')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(MenuItem.objects.get(title='Pasta').price, 11)
+        self.assertEqual(MenuItem.objects.count(), 3)
+
+    def test_errors_are_reported_per_row_and_nothing_is_written(self):
+        response = self.bulk([
+            {'title': 'Soup', 'price': '4.00', 'category_id': self.mains.id},
+            {'title': 'Salad', 'price': '5.00', 'category_id': 999},
+            {'id': 999, 'title': 'Ghost'},
+            {'title': 'Bread'},
+            {'title': 'Pasta', 'price': '1.00'},
+            {'id': self.pasta.id, 'title': 'Pasta again'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = {error['row']: error['errors'] for error in response.json()['errors']}
+        self.assertEqual(sorted(errors), [1, 2, 3, 5])
+        self.assertIn('category_id', errors[1])
+        self.assertIn('id', errors[2])
+        self.assertEqual(sorted(errors[3]), ['category_id', 'price'])
+        self.assertFalse(MenuItem.objects.filter(title='Soup').exists())
+
+        response = self.bulk([{'title': 'Soup', 'price': 'cheap'}], format='json')
+        self.assertEqual(response.json()['errors'][0]['row'], 0)
+
+    def test_id_rows_keep_the_stored_title(self):
+        response = self.bulk([{'id': self.pasta.id, 'price': '12.00'}, {'id': self.tart.id, 'featured': True}], format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.pasta.refresh_from_db()
+        self.tart.refresh_from_db()
+        self.assertEqual((self.pasta.title, str(self.pasta.price)), ('Pasta', '12.00'))
+        self.assertEqual((self.tart.title, self.tart.featured), ('Lemon Tart', True))
+
+        response = self.bulk([{'price': '1.00'}], format='json')
+        self.assertIn('non_field_errors', response.json()['errors'][0]['errors'])
+        response = self.bulk([{'id': 999, 'price': '1.00'}], format='json')
+        self.assertIn('id', response.json()['errors'][0]['errors'])
+
+    def test_titles_stay_unique_after_renames(self):
+        response = self.bulk([
+            {'id': self.pasta.id, 'title': 'Soup'},
+            {'title': 'Soup', 'price': '4.00', 'category_id': self.mains.id},
+            {'id': self.tart.id, 'title': 'Bread'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = {error['row']: error['errors'] for error in response.json()['errors']}
+        self.assertEqual(sorted(errors), [0, 1])
+        self.assertIn('row 1', errors[0]['title'][0])
+
+        response = self.bulk([{'id': self.pasta.id, 'title': 'Lemon Tart'}], format='json')
+        self.assertIn('an existing item', response.json()['errors'][0]['errors']['title'][0])
+        self.assertEqual(MenuItem.objects.filter(title='Lemon Tart').count(), 1)
+
+        # Swapping two titles leaves them unique
+        response = self.bulk([{'id': self.pasta.id, 'title': 'Lemon Tart'}, {'id': self.tart.id, 'title': 'Pasta'}], format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.pasta.refresh_from_db()
+        self.assertEqual(self.pasta.title, 'Lemon Tart')
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        get_roles(self.manager)
+        counts = set()
+        for size in (2, 200):
+            rows = [{'title': f'Dish {size}-{i}', 'price': '5.00', 'category_id': self.mains.id} for i in range(size)]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.bulk(rows, format='json').status_code, 200)
+                counts.add(len(queries))
+        self.assertEqual(len(counts), 1)
+
+    def test_menu_snapshot_is_invalidated_once(self):
+        self.client.get('/api/menu-items/')
+        with mock.patch('LittleLemonAPI.services.invalidate_menu') as invalidate:
+            self.bulk([{'title': f'Dish {i}', 'price': '5.00', 'category_id': self.mains.id} for i in range(5)], format='json')
+        invalidate.assert_called_once()
+
+    def test_only_managers_can_import(self):
+        self.client.force_authenticate(self.make_user('customer'))
+        self.assertEqual(self.bulk([{'title': 'Soup'}], format='json').status_code, 403)
+
+
+class OrderListingQueryCountTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = self.make_user('manager', 'Manager')
+        self.crew = self.make_user('crew', 'Delivery Crew')
+        self.customer = self.make_user('customer')
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.menu = MenuItem.objects.bulk_create(
+            MenuItem(title=f'Dish {i}', price=5, featured=False, category=category) for i in range(3)
+        )
+        # A single page must hold every order, otherwise page size caps the work per request
+        page_size = mock.patch.multiple(OrderCursorPagination, page_size=1000, max_page_size=1000)
+        page_size.start()
+        self.addCleanup(page_size.stop)
+
+    def seed_orders(self, count):
+        orders = Order.objects.bulk_create(
+            Order(user=self.customer, delivery_crew=self.crew, total=15) for _ in range(count)
+        )
+        OrderItems.objects.bulk_create(
+            OrderItems(order=order, menuitem=item, quantity=1, unit_price=5, price=5)
+            for order in orders for item in self.menu
+        )
+
+    def listing_queries(self, user, count):
+        Order.objects.all().delete()
+        self.seed_orders(count)
+        self.client.force_authenticate(user)
+        get_roles(user)  # Roles are cached across requests, keep that out of the count
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/orders/')
+        self.assertEqual(len(response.json()['results']), count)
+        return len(queries)
+
+    def test_manager_listing_query_count_is_fixed(self):
+        # Orders joined to both users, order items joined to menu items and categories
+        for count in (1, 50, 500):
+            self.assertEqual(self.listing_queries(self.manager, count), 2, f'{count} orders')
+
+    def test_delivery_crew_and_customer_listings_query_count_is_fixed(self):
+        for user in (self.crew, self.customer):
+            counts = {self.listing_queries(user, count) for count in (1, 50, 500)}
+            self.assertEqual(len(counts), 1, user.username)
+
+    def test_single_order_query_count_is_fixed(self):
+        self.seed_orders(1)
+        order = Order.objects.get()
+        self.client.force_authenticate(self.customer)
+        with self.assertNumQueries(3):
+            self.client.get(f'/api/orders/{order.id}')
+
+
+class RoleResolutionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser(username='admin', password='lemon-pass-123')
+        self.manager = self.make_user('manager', 'Manager')
+        self.customer = self.make_user('customer')
+
+    def test_roles_are_loaded_once_across_requests(self):
+        self.client.force_authenticate(User.objects.get(pk=self.manager.pk))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/groups/delivery-crew/users')
+        self.assertEqual(sum('auth_group' in q['sql'] and 'user_groups' in q['sql'] for q in queries), 1)
+
+        # A fresh user object per request, as token authentication produces
+        self.client.force_authenticate(User.objects.get(pk=self.manager.pk))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/groups/delivery-crew/users')
+        self.assertFalse(any('user_groups' in q['sql'] for q in queries))
+
+    def test_group_changes_through_the_api_invalidate_roles(self):
+        self.assertNotIn('Manager', get_roles(User.objects.get(pk=self.customer.pk)))
+        self.client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/groups/manager/users', {'username': 'customer'})
+        self.assertIn('Manager', get_roles(User.objects.get(pk=self.customer.pk)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/api/groups/manager/users/customer')
+        self.assertNotIn('Manager', get_roles(User.objects.get(pk=self.customer.pk)))
+
+    def test_group_side_changes_invalidate_roles(self):
+        self.assertIn('Manager', get_roles(User.objects.get(pk=self.manager.pk)))
+        Group.objects.get(name='Manager').user_set.clear()
+        self.assertEqual(get_roles(User.objects.get(pk=self.manager.pk)), frozenset())
+
+
+class JWTModeTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = self.make_user('manager', 'Manager')
+
+    def obtain(self):
+        response = self.client.post('/api/jwt/create/', {'username': 'manager', 'password': 'lemon-pass-123'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_access_token_carries_role_claims(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        token = AccessToken(self.obtain()['access'])
+        self.assertEqual(token['user_id'], self.manager.pk)
+        self.assertEqual(token['roles'], ['Manager'])
+
+    def test_hot_endpoints_authenticate_without_user_or_role_queries(self):
+        access = self.obtain()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q['sql'] for q in queries if 'FROM "auth_user"' in q['sql'] or 'auth_user_groups' in q['sql']])
+
+        # The claims-backed user works as a foreign key on writes
+        item = MenuItem.objects.create(
+            title='Soup', price=4, featured=False, category=Category.objects.create(slug='s', title='Starters')
+        )
+        response = self.client.post('/api/cart/menu-items', {'menuitem': item.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['user'], 'manager')
+        self.assertTrue(Cart.objects.filter(user=self.manager, menuitem=item).exists())
+
+    def test_refresh_rotates_and_blacklists_the_old_token(self):
+        refresh = self.obtain()['refresh']
+        response = self.client.post('/api/jwt/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()['refresh'], refresh)
+        self.assertEqual(self.client.post('/api/jwt/refresh/', {'refresh': refresh}).status_code, 401)
+
+    def test_refresh_picks_up_role_changes(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        refresh = self.obtain()['refresh']
+        self.manager.groups.clear()
+        access = self.client.post('/api/jwt/refresh/', {'refresh': refresh}).json()['access']
+        self.assertEqual(AccessToken(access)['roles'], [])
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(slug='mains', title='Mains')
+        # Only three distinct prices, so most of the ordering is decided by the id tiebreaker
+        MenuItem.objects.bulk_create(
+            MenuItem(title=f'Dish {i:02}', price=i % 3 + 1, featured=False, category=category) for i in range(25)
+        )
+
+    def walk(self, url):
+        ids, pages = [], []
+        while url:
+            data = self.client.get(url).json()
+            pages.append(data)
+            ids += [item['id'] for item in data['results']]
+            url = data['next']
+        return ids, pages
+
+    def test_pages_cover_every_item_once_in_order(self):
+        ids, pages = self.walk('/api/menu-items/?ordering=price&page_size=7')
+        expected = list(MenuItem.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 4)
+        self.assertNotIn('count', pages[0])
+
+    def test_previous_links_walk_back(self):
+        ids, pages = self.walk('/api/menu-items/?ordering=-title&page_size=7')
+        back, url = [], pages[-1]['previous']
+        while url:
+            data = self.client.get(url).json()
+            back = [item['id'] for item in data['results']] + back
+            url = data['previous']
+        self.assertEqual(back + [item['id'] for item in pages[-1]['results']], ids)
+
+    def test_deep_page_is_one_query_without_count(self):
+        _, pages = self.walk('/api/menu-items/?page_size=5')
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(pages[-2]['next'])
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries))
+        self.assertEqual(len([q for q in queries if 'LittleLemonAPI_menuitem' in q['sql']]), 1)
+
+    def test_page_size_is_capped(self):
+        MenuItem.objects.bulk_create(
+            MenuItem(title=f'Extra {i}', price=1, featured=False, category=Category.objects.get()) for i in range(100)
+        )
+        self.assertEqual(len(self.client.get('/api/menu-items/?page_size=500').json()['results']), 100)
+
+    def test_tampered_cursor_is_not_found(self):
+        def cursor(*position):
+            return base64.b64encode(urlencode({'p': json.dumps(position)}).encode()).decode()
+
+        manager = self.make_user('manager', 'Manager')
+        Order.objects.create(user=manager, total=10)
+        self.client.force_authenticate(manager)
+        for path, params in (
+            ('/api/orders/', {'cursor': cursor('garbage', 1)}),
+            ('/api/orders/', {'ordering': 'status', 'cursor': cursor('maybe', 1)}),
+            ('/api/orders/', {'ordering': 'user__username', 'cursor': cursor('manager', [1])}),
+            ('/api/menu-items/', {'ordering': 'price', 'cursor': cursor('cheap', 1)}),
+            ('/api/menu-items/', {'cursor': cursor({'id': 1})}),
+        ):
+            with self.subTest(path=path, params=params):
+                self.assertEqual(self.client.get(path, params).status_code, 404)
+        # Untampered values still page as before
+        response = self.client.get('/api/menu-items/', {'ordering': 'price', 'cursor': cursor('2.00', 1)})
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryPlanTests(TestCase):
+    def test_endpoint_queries_use_indexes(self):
+        # Raises CommandError if any endpoint query scans a table outside the allowlist
+        call_command('explain_queries', stdout=StringIO())
+        self.assertFalse(User.objects.filter(username='customer-0').exists())  # The seed data is rolled back
+
+    def test_index_scans_outside_the_allowlist_fail(self):
+        from .management.commands import explain_queries
+
+        allowed = [scan for scan in explain_queries.ALLOWED_SCANS if scan[0] != 'orders-list (manager)']
+        with mock.patch.object(explain_queries, 'ALLOWED_SCANS', allowed), \
+                self.assertRaisesMessage(CommandError, '1 queries scan a table: orders-list (manager)'):
+            call_command('explain_queries', orders=500, stdout=StringIO())
+
+
+class MenuFullTextSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.desserts = Category.objects.create(slug='desserts', title='Desserts')
+        mains = Category.objects.create(slug='mains', title='Mains')
+        self.tart = MenuItem.objects.create(title='Lemon Tart', price=6, featured=True, category=self.desserts)
+        self.pasta = MenuItem.objects.create(title='Lemon Pasta', price=12, featured=False, category=mains)
+        MenuItem.objects.create(title='Greek Salad', price=8, featured=False, category=mains)
+
+    def search(self, term, **params):
+        cache.clear()
+        response = self.client.get('/api/menu-items/', {'search': term, **params})
+        return [item['title'] for item in response.json()['results']]
+
+    def test_substring_matches_title_and_category(self):
+        self.assertEqual(sorted(self.search('emo')), ['Lemon Pasta', 'Lemon Tart'])
+        self.assertEqual(self.search('dessert'), ['Lemon Tart'])
+        self.assertEqual(self.search('lemon tart'), ['Lemon Tart'])
+        self.assertEqual(self.search('"quoted'), [])
+
+    def test_index_follows_bulk_and_category_changes(self):
+        MenuItem.objects.filter(pk=self.pasta.pk).update(title='Linguine')
+        Category.objects.filter(pk=self.desserts.pk).update(title='Sweets')
+        MenuItem.objects.bulk_create([MenuItem(title='Lemonade', price=3, featured=False, category=self.desserts)])
+        self.assertEqual(sorted(self.search('lemon')), ['Lemon Tart', 'Lemonade'])
+        self.assertEqual(sorted(self.search('sweet')), ['Lemon Tart', 'Lemonade'])
+        self.tart.delete()
+        self.assertEqual(self.search('sweet'), ['Lemonade'])
+
+    def test_relevance_ordering_ranks_best_match_first(self):
+        MenuItem.objects.create(title='Lemon Lemon Lemon', price=2, featured=False, category=self.desserts)
+        self.assertEqual(self.search('lemon', ordering='relevance')[0], 'Lemon Lemon Lemon')
+        # Walking the ranked results page by page still returns each match once
+        response = self.client.get('/api/menu-items/', {'search': 'lemon', 'ordering': 'relevance', 'page_size': 1})
+        titles = []
+        while True:
+            data = response.json()
+            titles += [item['title'] for item in data['results']]
+            if not data['next']:
+                break
+            response = self.client.get(data['next'])
+        self.assertEqual(sorted(titles), ['Lemon Lemon Lemon', 'Lemon Pasta', 'Lemon Tart'])
+
+    def test_short_terms_fall_back_to_icontains(self):
+        self.assertEqual(self.search('ek'), ['Greek Salad'])
+
+
+class OrderExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = self.make_user('manager', 'Manager')
+        self.crew = self.make_user('crew', 'Delivery Crew')
+        self.customer = self.make_user('customer')
+        category = Category.objects.create(slug='mains', title='Mains')
+        menu = MenuItem.objects.bulk_create(
+            MenuItem(title=f'Dish {i}', price=5, featured=False, category=category) for i in range(2)
+        )
+        self.orders = Order.objects.bulk_create(
+            Order(user=self.customer, delivery_crew=self.crew if i % 2 else None, status=bool(i % 2), total=10)
+            for i in range(7)
+        )
+        for day, order in enumerate(self.orders, start=1):
+            Order.objects.filter(pk=order.pk).update(date=f'2024-01-{day:02d}T12:00:00Z')
+        OrderItems.objects.bulk_create(
+            OrderItems(order=order, menuitem=item, quantity=1, unit_price=5, price=5)
+            for order in self.orders[1:] for item in menu
+        )
+        self.client.force_authenticate(self.manager)
+
+    def export(self, export_format='ndjson', **params):
+        response = self.client.get(f'/api/orders/export.{export_format}', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def ndjson(self, **params):
+        return [json.loads(line) for line in self.export(**params).splitlines()]
+
+    def test_ndjson_streams_every_order_with_its_items(self):
+        rows = self.ndjson()
+        self.assertEqual([row['id'] for row in rows], [order.id for order in self.orders])
+        self.assertEqual(rows[0]['order_items'], [])
+        self.assertEqual([item['menuitem'] for item in rows[1]['order_items']], ['Dish 0', 'Dish 1'])
+
+    def test_filters_match_the_order_listing(self):
+        self.assertEqual(len(self.ndjson(status=1)), 3)
+        self.assertEqual(len(self.ndjson(delivery_crew__username='crew')), 3)
+        self.assertEqual(len(self.ndjson(user__username='manager')), 0)
+        self.assertEqual(len(self.ndjson(date_from='2024-01-02T00:00:00Z', date_to='2024-01-05T00:00:00Z')), 3)
+        self.assertEqual(self.client.get('/api/orders/export.ndjson', {'date_from': 'soon'}).status_code, 400)
+
+    def test_csv_has_one_row_per_order_item(self):
+        rows = list(csv.reader(StringIO(self.export('csv'))))
+        self.assertEqual(rows[0][:2], ['order_id', 'date'])
+        self.assertEqual(len(rows), 1 + 1 + 6 * 2)
+
+    def test_chunks_walk_all_orders_in_bounded_queries(self):
+        get_roles(self.manager)
+        with self.settings(EXPORT_CHUNK_SIZE=3), CaptureQueriesContext(connection) as queries:
+            rows = self.ndjson()
+            query_count = len(queries)
+        self.assertEqual(len(rows), 7)
+        # Three chunks of orders, each followed by its items, then the empty chunk that ends the walk
+        self.assertEqual(query_count, 3 * 2 + 1)
+
+    def test_only_managers_can_export(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/orders/export.ndjson').status_code, 403)
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/orders/export.xml').status_code, 404)
+
+
+class SalesRollupTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = self.make_user('manager', 'Manager')
+        self.customer = self.make_user('customer')
+        self.mains = Category.objects.create(slug='mains', title='Mains')
+        self.desserts = Category.objects.create(slug='desserts', title='Desserts')
+        self.pasta = MenuItem.objects.create(title='Pasta', price=10, featured=False, category=self.mains)
+        self.soup = MenuItem.objects.create(title='Soup', price=4, featured=False, category=self.mains)
+        self.tart = MenuItem.objects.create(title='Tart', price=6, featured=False, category=self.desserts)
+
+    def order(self, **quantities):
+        for name, quantity in quantities.items():
+            item = getattr(self, name)
+            Cart.objects.create(user=self.customer, menuitem=item, quantity=quantity)
+        return place_order(self.customer)
+
+    def snapshot(self):
+        return {
+            model.__name__: sorted(model.objects.values_list(*fields))
+            for model, fields in (
+                (DailySales, ('day', 'revenue', 'orders', 'units')),
+                (DailyMenuItemSales, ('day', 'menuitem', 'revenue', 'orders', 'units')),
+                (DailyCategorySales, ('day', 'category', 'revenue', 'orders', 'units')),
+            )
+        }
+
+    def report(self, **params):
+        self.client.force_authenticate(self.manager)
+        response = self.client.get('/api/analytics/sales', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_orders_are_added_and_removed_incrementally(self):
+        self.order(pasta=2, soup=1)
+        order = self.order(tart=1, soup=3)
+        report = self.report()
+        self.assertEqual((report['revenue'], report['orders'], report['units']), ('42.00', 2, 7))
+        self.assertEqual([row['title'] for row in report['menu_items']], ['Pasta', 'Soup', 'Tart'])
+        self.assertEqual(report['menu_items'][1], {'id': self.soup.id, 'title': 'Soup', 'revenue': '16.00', 'orders': 2, 'units': 4})
+        self.assertEqual([row['title'] for row in report['categories']], ['Mains', 'Desserts'])
+        self.assertEqual(report['categories'][0]['orders'], 2)
+
+        self.client.delete(f'/api/orders/{order.id}')
+        report = self.report()
+        self.assertEqual((report['revenue'], report['orders'], report['units']), ('24.00', 1, 3))
+        self.assertEqual(report['categories'][1]['revenue'], '0.00')
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.order(pasta=2, soup=1)
+        self.order(tart=1, soup=3)
+        self.order(pasta=1)
+        incremental = self.snapshot()
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_report_reads_rollups_only(self):
+        self.order(pasta=1)
+        Order.objects.filter().update(date='2024-03-01T10:00:00Z')
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self.report(date_from='2024-03-01', date_to='2024-03-01')['orders'], 1)
+        self.assertEqual(self.report(date_from='2024-03-02', date_to='2024-03-09')['orders'], 0)
+        get_roles(self.manager)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/analytics/sales', {'date_from': '2024-01-01', 'date_to': '2024-12-31'})
+            tables = ' '.join(query['sql'] for query in queries)
+        self.assertEqual(len(queries), 3)
+        self.assertNotIn('"LittleLemonAPI_order"', tables)
+
+    def test_bad_ranges_and_non_managers_are_rejected(self):
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/analytics/sales', {'date_from': '2024-02-01', 'date_to': '2024-01-01'}).status_code, 400)
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/analytics/sales').status_code, 403)
+
+
+class SalesRollupMigrationTests(TransactionTestCase):
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()  # Pick up the previous migrate()
+        executor.migrate([('LittleLemonAPI', target)])
+        return executor.loader.project_state(('LittleLemonAPI', target)).apps
+
+    def test_migration_backfills_the_existing_orders(self):
+        latest = MigrationLoader(connection).graph.leaf_nodes('LittleLemonAPI')[0][1]
+        apps = self.migrate('0008_menuitem_fts')
+        self.addCleanup(self.migrate, latest)
+        customer = apps.get_model('auth', 'User').objects.create(username='customer')
+        category = apps.get_model('LittleLemonAPI', 'Category').objects.create(slug='mains', title='Mains')
+        MenuItem_, Order_, OrderItems_ = (apps.get_model('LittleLemonAPI', name) for name in ('MenuItem', 'Order', 'OrderItems'))
+        pasta = MenuItem_.objects.create(title='Pasta', price=10, featured=False, category=category)
+        soup = MenuItem_.objects.create(title='Soup', price=4, featured=False, category=category)
+        for lines in ([(pasta, 2), (soup, 1)], [(soup, 3)]):
+            order = Order_.objects.create(user=customer, total=sum(item.price * quantity for item, quantity in lines))
+            for item, quantity in lines:
+                OrderItems_.objects.create(order=order, menuitem=item, quantity=quantity, unit_price=item.price,
+                                           price=item.price * quantity)
+
+        self.migrate('0009_sales_rollups')
+        self.assertEqual(list(DailySales.objects.values_list('revenue', 'orders', 'units')), [(Decimal('36.00'), 2, 6)])
+        backfilled = [sorted(model.objects.values_list('day', 'revenue', 'orders', 'units'))
+                      for model in (DailySales, DailyMenuItemSales, DailyCategorySales)]
+        self.migrate(latest)
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual([sorted(model.objects.values_list('day', 'revenue', 'orders', 'units'))
+                          for model in (DailySales, DailyMenuItemSales, DailyCategorySales)], backfilled)
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.admin = User.objects.create_superuser('admin', password='lemon-pass-123')
+        category = Category.objects.create(slug='mains', title='Mains')
+        MenuItem.objects.create(title='Pasta', price=9, featured=False, category=category)
+
+    def scrape(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if line and not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_requests_are_recorded_per_url_name(self):
+        customer = self.make_user('customer')
+        self.client.force_authenticate(customer)
+        self.client.get('/api/menu-items/')
+        self.client.get('/api/menu-items/')
+        self.client.get('/api/orders/999')
+        samples = self.scrape()
+
+        labels = 'endpoint="menuitem-list",method="GET"'
+        self.assertEqual(samples[f'littlelemon_http_requests_total{{{labels},status="200"}}'], 2)
+        self.assertEqual(samples[f'littlelemon_http_request_duration_seconds_count{{{labels}}}'], 2)
+        self.assertEqual(samples[f'littlelemon_http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'], 2)
+        self.assertGreater(samples[f'littlelemon_db_queries_total{{{labels}}}'], 0)
+        self.assertGreater(samples[f'littlelemon_serialization_duration_seconds_total{{{labels}}}'], 0)
+        self.assertEqual(samples['littlelemon_http_requests_total{endpoint="single-order",method="GET",status="404"}'], 1)
+
+    def test_only_this_apps_serializers_are_timed(self):
+        from rest_framework import serializers as drf_serializers
+        from djoser.serializers import UserSerializer as DjoserUserSerializer
+        from .serializers import CategorySerializer
+
+        request_record = metrics.RequestRecord()
+        token = metrics.current_request.set(request_record)
+        self.addCleanup(metrics.current_request.reset, token)
+        CategorySerializer(Category.objects.all(), many=True).data
+        listed = request_record.serialization_seconds
+        self.assertGreater(listed, 0)
+        CategorySerializer(Category.objects.get()).data
+        self.assertGreater(request_record.serialization_seconds, listed)
+
+        # DRF's classes and other apps' serializers are left as they are
+        before = request_record.serialization_seconds
+        DjoserUserSerializer(self.admin).data
+        self.assertEqual(request_record.serialization_seconds, before)
+        for cls in (drf_serializers.Serializer, drf_serializers.ListSerializer):
+            self.assertEqual(cls.data.fget.__module__, 'rest_framework.serializers')
+
+    def test_totals_of_all_worker_processes_are_added_up(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            self.client.get('/api/menu-items/')
+            # Another worker process left its totals in the shared directory
+            other = {'buckets': list(metrics.get_buckets()), 'series': [
+                ['menuitem-list', 'GET', {**metrics._new_totals(), 'statuses': {'200': 5}, 'count': 5, 'queries': 5}],
+            ]}
+            with open(os.path.join(directory, '999999.json'), 'w') as fh:
+                json.dump(other, fh)
+            samples = self.scrape()
+            self.assertIn(metrics.file_name(), os.listdir(directory))
+        self.assertEqual(samples['littlelemon_http_requests_total{endpoint="menuitem-list",method="GET",status="200"}'], 6)
+
+    def test_files_of_exited_workers_expire(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            self.client.get('/api/menu-items/')
+            self.assertTrue(metrics.file_name().startswith(f'{os.getpid()}-'))
+            # A worker that exited a while ago, whose pid may since have been reused
+            exited = os.path.join(directory, f'{os.getpid()}.json')
+            with open(exited, 'w') as fh:
+                json.dump({'buckets': list(metrics.get_buckets()), 'series': [
+                    ['menuitem-list', 'GET', {**metrics._new_totals(), 'statuses': {'200': 5}, 'count': 5}],
+                ]}, fh)
+            last_write = time.time() - metrics.STALE_FLUSHES * metrics.get_flush_interval() - 1
+            os.utime(exited, (last_write, last_write))
+            samples = self.scrape()
+            self.assertEqual(os.listdir(directory), [metrics.file_name()])
+        self.assertEqual(samples['littlelemon_http_requests_total{endpoint="menuitem-list",method="GET",status="200"}'], 1)
+
+    def test_only_admins_can_read_metrics(self):
+        self.client.force_authenticate(self.make_user('manager', 'Manager'))
+        self.assertEqual(self.client.get('/api/metrics').status_code, 403)
+
+
+# AsyncClient builds plain ASGIRequests: route them the way LittleLemon.asgi routes its own
+asgi_urls = override_settings(ROOT_URLCONF=AsyncViewsRequest.urlconf)
+
+
+@asgi_urls
+class AsyncViewTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = self.make_user('customer')
+        self.crew = self.make_user('crew', 'Delivery Crew')
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.pasta = MenuItem.objects.create(title='Pasta', price=9, featured=False, category=category)
+        self.headers = {user.username: self.bearer(user) for user in (self.customer, self.crew)}
+
+    def test_asgi_serves_the_async_views_and_wsgi_the_sync_ones(self):
+        for view in (CartView, OrderView, SingleOrderView):
+            self.assertFalse(view.view_is_async, view.__name__)
+        for view in (AsyncCartView, AsyncOrderView, AsyncSingleOrderView):
+            self.assertTrue(view.view_is_async, view.__name__)
+            self.assertTrue(asyncio.iscoroutinefunction(view.as_view()), view.__name__)
+        for path, sync_view, async_view in (('/api/cart/menu-items', CartView, AsyncCartView),
+                                            ('/api/orders/', OrderView, AsyncOrderView),
+                                            ('/api/orders/1', SingleOrderView, AsyncSingleOrderView)):
+            self.assertIs(resolve(path, urlconf=settings.ROOT_URLCONF).func.view_class, async_view)
+            self.assertIs(resolve(path, urlconf='LittleLemon.urls').func.view_class, sync_view)
+
+    async def test_initial_does_not_nest_an_event_loop(self):
+        # A nested async_to_sync in initial() can swallow a concurrent request's sync_to_async call
+        with mock.patch('adrf.views.async_to_sync') as nested:
+            response = await AsyncClient().get('/api/cart/menu-items', headers=self.headers['customer'])
+        self.assertEqual(response.status_code, 200)
+        nested.assert_not_called()
+
+    async def test_cart_to_order_to_delivery_over_asgi(self):
+        client, customer, crew = AsyncClient(), self.headers['customer'], self.headers['crew']
+        response = await client.post('/api/cart/menu-items', {'menuitem': self.pasta.pk, 'quantity': 2},
+                                     content_type='application/json', headers=customer)
+        self.assertEqual(response.status_code, 201)
+        response = await client.get('/api/cart/menu-items', headers=customer)
+        self.assertEqual([line['quantity'] for line in response.json()], [2])
+
+        response = await client.post('/api/orders/', headers=customer)
+        self.assertEqual(response.status_code, 201)
+        order_id = response.json()['id']
+        self.assertEqual(response.json()['total'], '18.00')
+        response = await client.get('/api/orders/', headers=customer)
+        self.assertEqual([order['id'] for order in response.json()['results']], [order_id])
+
+        await Order.objects.filter(pk=order_id).aupdate(delivery_crew=self.crew)
+        response = await client.patch(f'/api/orders/{order_id}', {'status': 1}, content_type='application/json', headers=crew)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['status'])
+        self.assertEqual((await client.get(f'/api/orders/{order_id}', headers=customer)).status_code, 200)
+        self.assertEqual((await client.delete(f'/api/orders/{order_id}', headers=customer)).status_code, 403)
+
+    async def test_database_backed_authentication_and_errors(self):
+        from rest_framework.authtoken.models import Token
+        token = await Token.objects.acreate(user=self.customer)
+        client, headers = AsyncClient(), {'Authorization': f'Token {token.key}'}
+        self.assertEqual((await client.get('/api/cart/menu-items', headers=headers)).status_code, 200)
+        self.assertEqual((await client.get('/api/orders/999', headers=headers)).status_code, 404)
+        self.assertEqual((await client.get('/api/cart/menu-items')).status_code, 401)
+        response = await client.post('/api/cart/menu-items', [{'menuitem': 999, 'quantity': 1}],
+                                     content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+
+@asgi_urls
+class OrderEventStreamTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        events.reset()
+        self.addCleanup(events.reset)
+        self.customer = self.make_user('customer')
+        self.other_customer = self.make_user('other')
+        self.crew = self.make_user('crew', 'Delivery Crew')
+        self.new_crew = self.make_user('new-crew', 'Delivery Crew')
+        self.manager = self.make_user('manager', 'Manager')
+        self.order = Order.objects.create(user=self.customer, delivery_crew=self.crew, total=10)
+        self.headers = {user.username: self.bearer(user) for user in
+                        (self.customer, self.other_customer, self.crew, self.new_crew, self.manager)}
+        self.responses = []
+
+    async def open_stream(self, username, **headers):
+        response = await AsyncClient().get('/api/orders/events', headers={**self.headers[username], **headers})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.responses.append(response)
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry: '))
+        return stream
+
+    async def next_event(self, stream, timeout=1):
+        chunk = (await asyncio.wait_for(anext(stream), timeout)).decode()
+        fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+        return fields['event'], json.loads(fields['data'])
+
+    async def assert_no_event(self, stream):
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(anext(stream), 0.05)
+
+    async def test_patch_changes_reach_the_streams_allowed_to_see_them(self):
+        streams = {name: await self.open_stream(name) for name in self.headers}
+        client = AsyncClient()
+        response = await client.patch(f'/api/orders/{self.order.pk}', {'delivery_crew': 'new-crew'},
+                                      content_type='application/json', headers=self.headers['manager'])
+        self.assertEqual(response.status_code, 200)
+        reassigned = ('order', {'id': self.order.pk, 'user': 'customer', 'delivery_crew': 'new-crew', 'status': False})
+        for name in ('customer', 'crew', 'new-crew', 'manager'):  # The old crew hears the order moved away
+            self.assertEqual(await self.next_event(streams[name]), reassigned, name)
+
+        response = await client.patch(f'/api/orders/{self.order.pk}', {'status': 1},
+                                      content_type='application/json', headers=self.headers['new-crew'])
+        self.assertEqual(response.status_code, 200)
+        delivered = ('order', {**reassigned[1], 'status': True})
+        for name in ('customer', 'new-crew', 'manager'):
+            self.assertEqual(await self.next_event(streams[name]), delivered, name)
+        await self.assert_no_event(streams['crew'])
+        await self.assert_no_event(streams['other'])
+
+        # Nothing changed, nothing sent
+        await client.patch(f'/api/orders/{self.order.pk}', {'status': True},
+                           content_type='application/json', headers=self.headers['manager'])
+        await self.assert_no_event(streams['manager'])
+
+        for response in self.responses:
+            response.close()  # What the ASGI handler does once the client has gone
+        self.assertFalse(events._subscribers)
+
+    async def test_reconnect_replays_missed_events(self):
+        order = self.order
+        first = events.publish(order)
+        await Order.objects.filter(pk=order.pk).aupdate(status=True)
+        order.status = True
+        events.publish(order)
+        stream = await self.open_stream('customer', **{'Last-Event-ID': str(first.id)})
+        self.assertEqual((await self.next_event(stream))[1]['status'], True)
+        await self.assert_no_event(stream)
+
+        # A full backlog that no longer reaches back to `first`
+        events._backlog.clear()
+        events._backlog.extend([events.publish(order)] * events._backlog.maxlen)
+        stream = await self.open_stream('manager', **{'Last-Event-ID': str(first.id)})
+        self.assertEqual(await self.next_event(stream), ('reset', {}))
+
+    async def test_slow_stream_is_disconnected(self):
+        with self.settings(ORDER_EVENTS_QUEUE_SIZE=2):
+            stream = await self.open_stream('manager')
+            for _ in range(3):
+                events.publish(self.order)
+            await asyncio.sleep(0)  # Let the loop run the queued deliveries
+            with self.assertRaises(StopAsyncIteration):
+                while True:
+                    await asyncio.wait_for(anext(stream), 1)
+        self.assertFalse(events._subscribers)
+
+    def test_requires_authentication_and_asgi(self):
+        self.assertEqual(self.client.get('/api/orders/events').status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=self.headers['customer']['Authorization'])
+        self.assertEqual(self.client.get('/api/orders/events', HTTP_ACCEPT='text/event-stream').status_code, 501)
+
+
+class OrderDispatchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = self.make_user('customer')
+        self.manager = self.make_user('manager', 'Manager')
+        self.crew = [self.make_user(name, 'Delivery Crew') for name in ('ann', 'bob', 'cat')]
+        ann, bob, cat = self.crew
+        Order.objects.bulk_create(
+            [Order(user=self.customer, delivery_crew=ann) for _ in range(2)]
+            + [Order(user=self.customer, delivery_crew=cat, status=True)]  # Delivered orders are no load
+        )
+        self.delivered = Order.objects.create(user=self.customer, status=True)
+        self.pending = [Order.objects.create(user=self.customer) for _ in range(4)]
+
+    def crew_of(self, orders):
+        return [Order.objects.get(pk=order.pk).delivery_crew.username for order in orders]
+
+    def test_assigns_least_loaded_crew_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = dispatch_orders(batch_size=3)
+        self.assertEqual(self.crew_of(self.pending), ['bob', 'cat', 'bob', 'cat'])
+        self.assertIsNone(Order.objects.get(pk=self.delivered.pk).delivery_crew)
+        self.assertEqual(result, {'assigned': 4, 'crew': [
+            {'delivery_crew': 'ann', 'assigned': 0, 'load': 2},
+            {'delivery_crew': 'bob', 'assigned': 2, 'load': 2},
+            {'delivery_crew': 'cat', 'assigned': 2, 'load': 2},
+        ]})
+        loads = [query['sql'] for query in queries if 'COUNT(' in query['sql']]
+        self.assertEqual(len(loads), 1)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)  # One per batch
+        self.assertEqual(dispatch_orders()['assigned'], 0)
+
+    def test_batches_past_the_parameter_limit_are_one_update_each(self):
+        # bulk_update binds three values per order: SQLite's 999 would split a batch of 500 in two
+        Order.objects.bulk_create(Order(user=self.customer) for _ in range(496))
+        from django.db.models import QuerySet
+        bulk_update = QuerySet.bulk_update
+        batches = []
+
+        def counted(queryset, objs, fields, **kwargs):
+            with CaptureQueriesContext(connection) as queries:
+                updated = bulk_update(queryset, objs, fields, **kwargs)
+            batches.append((len(objs), updated, sum(query['sql'].startswith('UPDATE') for query in queries)))
+            return updated
+
+        with mock.patch.object(QuerySet, 'bulk_update', autospec=True, side_effect=counted):
+            result = dispatch_orders(batch_size=500)
+        self.assertEqual(result['assigned'], 500)
+        self.assertEqual(batches, [(333, 333, 1), (167, 167, 1)])
+        self.assertFalse(Order.objects.filter(status=False, delivery_crew__isnull=True).exists())
+
+    def test_overlapping_run_keeps_first_assignment(self):
+        from django.db.models import QuerySet
+        bulk_update = QuerySet.bulk_update
+        first = self.pending[0]
+
+        def other_run_first(queryset, objs, fields, **kwargs):
+            Order.objects.filter(pk=first.pk).update(delivery_crew=self.crew[0])
+            return bulk_update(queryset, objs, fields, **kwargs)
+
+        with mock.patch.object(QuerySet, 'bulk_update', autospec=True, side_effect=other_run_first):
+            result = dispatch_orders()
+        self.assertEqual(self.crew_of(self.pending), ['ann', 'cat', 'bob', 'cat'])
+        self.assertEqual(result['assigned'], 3)
+        self.assertEqual([crew['load'] for crew in result['crew']], [3, 1, 2])
+
+    def test_endpoint_and_command(self):
+        self.client.force_authenticate(self.crew[0])
+        self.assertEqual(self.client.post('/api/orders/dispatch').status_code, 403)
+        self.client.force_authenticate(self.manager)
+        response = self.client.post('/api/orders/dispatch')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['assigned'], 4)
+
+        Order.objects.create(user=self.customer)
+        out = StringIO()
+        call_command('dispatch_orders', stdout=out)
+        self.assertIn('ann: +1 (load 3)', out.getvalue())
+        self.assertIn('Assigned 1 orders.', out.getvalue())
+
+
+# Outside TestCase's wrapping transaction, so that the code under test opens the transaction itself
+@contextmanager
+def fresh_connection(reopen=False):
+    """
+    Run the block on a new, unopened connection to the test database in place of
+    `default` (the state of the first query in a new worker); with reopen, on one
+    that was opened and closed again. Needs a TransactionTestCase: the in-memory
+    test database is shared, but a TestCase's data is in an open transaction.
+    """
+    default = connections[DEFAULT_DB_ALIAS]
+    fresh = connections.create_connection(DEFAULT_DB_ALIAS)
+    if reopen:
+        fresh.ensure_connection()
+        BaseDatabaseWrapper.close(fresh)  # The SQLite wrapper's close() keeps in-memory databases open
+    fresh.force_debug_cursor = True
+    connections[DEFAULT_DB_ALIAS] = fresh
+    try:
+        yield fresh
+    finally:
+        connections[DEFAULT_DB_ALIAS] = default
+        BaseDatabaseWrapper.close(fresh)
+
+
+class SQLiteProfileTests(TransactionTestCase):
+    def test_pragmas_are_applied_on_connect(self):
+        expected = {'synchronous': 1, 'busy_timeout': 10000, 'cache_size': -64000}
+        with connection.cursor() as cursor:
+            for pragma, value in expected.items():
+                cursor.execute(f'PRAGMA {pragma}')
+                self.assertEqual(cursor.fetchone()[0], value, pragma)
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], 600)
+
+    def test_only_read_then_write_transactions_begin_immediate(self):
+        user = User.objects.create_user(username='customer', password='lemon-pass-123')
+        item = MenuItem.objects.create(title='Pasta', price=9, featured=False,
+                                       category=Category.objects.create(slug='mains', title='Mains'))
+        self.assertNotIn('transaction_mode', connection.settings_dict['OPTIONS'])
+
+        def begins(write):
+            with CaptureQueriesContext(connection) as queries:
+                write()
+            return [query['sql'] for query in queries if query['sql'].startswith('BEGIN')]
+
+        self.assertEqual(begins(lambda: update_cart(user, [{'menuitem': item.pk, 'quantity': 1}])), ['BEGIN IMMEDIATE'])
+        self.assertEqual(begins(lambda: place_order(user)), ['BEGIN IMMEDIATE'])
+
+        client = APIClient()
+        client.force_authenticate(user)
+        with mock.patch.object(SimpleRateThrottle, 'allow_request', return_value=True):
+            # The single-item POST writes first (get_or_create's INSERT): a deferred BEGIN is enough
+            self.assertEqual(begins(lambda: client.post('/api/cart/menu-items', {'menuitem': item.pk})), ['BEGIN'])
+            # Keyed POSTs run the view inside the idempotency transaction, the outermost one; the
+            # claim (an INSERT) stays deferred
+            keyed = begins(lambda: client.post('/api/orders/', HTTP_IDEMPOTENCY_KEY='checkout'))
+            self.assertEqual(keyed[-1], 'BEGIN IMMEDIATE')
+            self.assertEqual(keyed.count('BEGIN IMMEDIATE'), 1)
+
+        # Read-mostly transactions stay deferred
+        self.assertEqual(begins(rebuild_rollups), ['BEGIN'])
+
+    def test_new_and_reopened_connections_begin_immediate(self):
+        user = User.objects.create_user(username='customer', password='lemon-pass-123')
+        item = MenuItem.objects.create(title='Pasta', price=9, featured=False,
+                                       category=Category.objects.create(slug='mains', title='Mains'))
+
+        def begins(reopen):
+            with fresh_connection(reopen) as fresh:
+                update_cart(user, [{'menuitem': item.pk, 'quantity': 1}])
+            return [query['sql'] for query in fresh.queries if query['sql'].startswith('BEGIN')]
+
+        self.assertEqual(begins(reopen=False), ['BEGIN IMMEDIATE'])  # Never connected, as in a new worker
+        self.assertEqual(begins(reopen=True), ['BEGIN IMMEDIATE'])  # Closed after CONN_MAX_AGE or a failed health check
+
+
+class FastSerializationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = self.make_user('customer')
+        self.crew = self.make_user('crew', 'Delivery Crew')
+        self.manager = self.make_user('manager', 'Manager')
+        desserts = Category.objects.create(slug='desserts', title='Desserts')
+        mains = Category.objects.create(slug='mains', title='Mains')
+        items = [MenuItem.objects.create(title=f'Lemon dish {i}', price=Decimal(f'{i % 4 + 5}.5'), featured=i % 2 == 0,
+                                         category=desserts if i % 3 else mains) for i in range(12)]
+        for i, item in enumerate(items[:3]):
+            Cart.objects.create(user=self.customer, menuitem=item, quantity=i + 1)
+        for i in range(4):
+            order = Order.objects.create(user=self.customer, delivery_crew=self.crew if i % 2 else None,
+                                         status=i == 3, total=20)
+            OrderItems.objects.bulk_create([OrderItems(order=order, menuitem=item, quantity=2, unit_price=item.price,
+                                                       price=item.price * 2) for item in items[i:i + 3]])
+
+    def both_ways(self, user, path):
+        """Response bodies of the serializer path and the values() path"""
+        self.client.force_authenticate(user)
+        bodies = []
+        for fast in (False, True):
+            cache.clear()
+            with self.settings(FAST_SERIALIZATION=fast):
+                response = self.client.get(path)
+            self.assertEqual(response.status_code, 200, path)
+            bodies.append(response.content)
+        return bodies
+
+    def assert_identical(self, user, path):
+        serializer_body, values_body = self.both_ways(user, path)
+        self.assertEqual(values_body, serializer_body, path)
+        return json.loads(values_body)
+
+    def test_menu_list_is_byte_identical(self):
+        first = self.assert_identical(self.customer, '/api/menu-items/?page_size=5')
+        self.assert_identical(self.customer, first['next'])
+        for query in ('ordering=-price', 'ordering=title&page_size=3', 'search=dish%201', 'search=dish&ordering=relevance',
+                      'price=6.50', 'format=json'):
+            page = self.assert_identical(self.customer, f'/api/menu-items/?{query}')
+            if page['next']:
+                self.assert_identical(self.customer, page['next'])
+        self.assert_identical(self.customer, '/api/menu-items.json')
+
+    def test_cart_and_order_lists_are_byte_identical(self):
+        self.assertEqual(len(self.assert_identical(self.customer, '/api/cart/menu-items')), 3)
+        for user in (self.customer, self.crew, self.manager):
+            page = self.assert_identical(user, '/api/orders/?page_size=2')
+            if page['next']:
+                self.assert_identical(user, page['next'])
+        for query in ('ordering=status', 'ordering=-user__username&page_size=3', 'status=1', 'search=crew'):
+            self.assert_identical(self.manager, f'/api/orders/?{query}')
+
+    def test_values_path_skips_per_row_queries(self):
+        self.client.force_authenticate(self.manager)
+        get_roles(self.manager)
+        with self.settings(FAST_SERIALIZATION=True), CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/orders/?page_size=4')
+        self.assertEqual(len(queries), 2)  # The page of orders, then their order items
+
+
+class PrebuiltSchemaTests(TestCase):
+    def setUp(self):
+        schema.schema_bytes.cache_clear()
+        self.addCleanup(schema.schema_bytes.cache_clear)
+
+    def test_schema_is_generated_once_without_an_artifact(self):
+        with mock.patch.object(schema, '_read_artifact', return_value=None), \
+                mock.patch.object(schema, 'generate_schema', wraps=schema.generate_schema) as generate:
+            first = self.client.get('/swagger.json/')
+            second = self.client.get('/swagger.json/')
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        paths = json.loads(first.content)['paths']
+        self.assertEqual(paths['/menu-items/']['get']['summary'], 'List of all menu items')
+        self.assertEqual(paths['/menu-items/bulk/']['post']['summary'],
+                         'Create or update many menu items from a JSON array or CSV')
+        self.assertIn('date_from', [p['name'] for p in paths['/analytics/sales']['get']['parameters']])
+        self.assertEqual(self.client.get('/swagger.xml/').status_code, 404)
+
+    def test_command_builds_the_artifact_the_views_serve(self):
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('build_openapi_schema', output_dir=Path(directory), stdout=StringIO())
+            built = (Path(directory) / 'openapi' / 'schema.json').read_bytes()
+            self.assertTrue((Path(directory) / 'openapi' / 'schema.yaml').exists())
+            with override_settings(STATICFILES_DIRS=[directory]), \
+                    mock.patch.object(schema, 'generate_schema', side_effect=AssertionError('introspected')):
+                response = self.client.get('/swagger.json/')
+        self.assertEqual(response.content, built)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_docs_pages_fetch_the_prebuilt_schema(self):
+        with mock.patch.object(schema, 'generate_schema', side_effect=AssertionError('introspected')):
+            for path in ('/docs/', '/redoc/'):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 200, path)
+                self.assertIn(b'/swagger.json/', response.content)
+
+    def test_api_request_path_does_not_import_drf_yasg(self):
+        code = (
+            'import sys, django; django.setup(); '
+            'from django.urls import resolve; import LittleLemon.urls; '
+            'resolve("/api/menu-items/"); resolve("/api/orders/"); resolve("/api/orders/events"); '
+            'print(sorted(m for m in sys.modules if m.startswith("drf_yasg.")))'
+        )
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'LittleLemon.settings'}
+        output = subprocess.run([sys.executable, '-c', code], env=env, cwd=Path(__file__).resolve().parent.parent,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), '[]')
+
+
+class ColdStartTests(TestCase):
+    def test_static_files_are_indexed_on_the_first_static_request(self):
+        middleware = StaticFilesMiddleware(lambda request: HttpResponse('api'))
+        self.assertFalse(middleware.files)
+        self.assertEqual(middleware(RequestFactory().get('/api/menu-items/')).content, b'api')
+        self.assertFalse(middleware.files)  # API requests don't pay for the scan
+        response = middleware(RequestFactory().get('/static/rest_framework/css/default.css'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(middleware.files)
+        self.assertFalse(middleware.deferred)
+
+    def test_admin_urls_load_on_demand(self):
+        self.assertEqual(reverse('single-menu-item', kwargs={'pk': 1}), '/api/menu-items/1')
+        self.assertEqual(reverse('admin:index'), '/admin/')
+        self.assertEqual(reverse('admin:LittleLemonAPI_menuitem_changelist'), '/admin/LittleLemonAPI/menuitem/')
+        response = self.client.get('/admin/')
+        self.assertRedirects(response, '/admin/login/?next=/admin/')
+
+    def test_menu_urls_are_reversed_without_the_admin_urls(self):
+        from django.urls import get_resolver
+        from rest_framework import reverse as drf_reverse
+
+        self.assertNotIn('admin', get_resolver(settings.API_URLCONF).namespace_dict)
+        category = Category.objects.create(slug='mains', title='Mains')
+        item = MenuItem.objects.create(title='Pasta', price=9, featured=False, category=category)
+        with mock.patch.object(drf_reverse, 'django_reverse', wraps=drf_reverse.django_reverse) as reversed_url:
+            response = self.client.get('/api/menu-items/')
+        # The same URL as the root URLconf's
+        self.assertEqual(response.json()['results'][0]['url'],
+                         f'http://testserver{reverse("menuitem-detail", kwargs={"pk": item.pk})}')
+        self.assertTrue(reversed_url.call_args_list)
+        self.assertEqual({call.kwargs.get('urlconf') for call in reversed_url.call_args_list}, {settings.API_URLCONF})
+
+    def test_admin_checks_discover_the_admin_modules(self):
+        code = (
+            'import sys, django; django.setup(); from django.core import checks; '
+            'print("LittleLemonAPI.admin" in sys.modules); checks.run_checks(tags=[checks.Tags.admin]); '
+            'print("LittleLemonAPI.admin" in sys.modules)'
+        )
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'LittleLemon.settings'}
+        output = subprocess.run([sys.executable, '-c', code], env=env, cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.split(), ['False', 'True'])
+
+        from .admin import CategoryAdmin
+        with mock.patch.object(CategoryAdmin, 'prepopulated_fields', {'slug': ('name',)}):
+            errors = checks.run_checks(tags=[checks.Tags.admin])
+        self.assertEqual([error.id for error in errors], ['admin.E030'])
+
+    def test_profile_startup_enforces_the_budget(self):
+        database = Path(settings.BASE_DIR) / 'db.sqlite3'
+        existed = database.exists()
+        out = StringIO()
+        call_command('profile_startup', runs=1, top=3, budget_ms=100000, temp_db=True, stdout=out)
+        self.assertIn('LittleLemon.wsgi', out.getvalue())
+        self.assertRegex(out.getvalue(), r'first response from /api/menu-items/ \d+ ms \(200 OK\)')
+        with self.assertRaisesMessage(CommandError, 'over the 1 ms budget'):
+            call_command('profile_startup', runs=1, budget_ms=1, temp_db=True, stdout=StringIO())
+        # Timing an error page is no cold-start measurement
+        with self.assertRaisesMessage(CommandError, '/api/nothing-here answered 404 Not Found'):
+            call_command('profile_startup', runs=1, path='/api/nothing-here', temp_db=True, stdout=StringIO())
+        self.assertEqual(database.exists(), existed)  # The probes never touched the configured database
+
+
+@asgi_urls
+class IdempotencyKeyTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = self.make_user('customer')
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.pasta = MenuItem.objects.create(title='Pasta', price=9, featured=False, category=category)
+        self.client.force_authenticate(self.customer)
+        self.headers = self.bearer(self.customer)  # For AsyncClient
+
+    def checkout(self, key, **extra):
+        return self.client.post('/api/orders/', {}, format='json', HTTP_IDEMPOTENCY_KEY=key, **extra)
+
+    def test_retried_checkout_is_replayed_without_touching_the_order_tables(self):
+        self.client.post('/api/cart/menu-items', {'menuitem': self.pasta.pk, 'quantity': 2}, format='json')
+        first = self.checkout('checkout-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', first)
+
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.checkout('checkout-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+        touched = [q['sql'] for q in queries if '"LittleLemonAPI_cart"' in q['sql'] or '"LittleLemonAPI_order' in q['sql']]
+        self.assertEqual(touched, [])
+        self.assertEqual(Order.objects.count(), 1)
+
+        # A new key is a new checkout, of what is now an empty cart
+        self.assertEqual(self.checkout('checkout-2').status_code, 400)
+
+    def test_cart_writes_are_replayed_per_user(self):
+        body = [{'menuitem': self.pasta.pk, 'quantity': 3}]
+        first = self.client.post('/api/cart/menu-items', body, format='json', HTTP_IDEMPOTENCY_KEY='cart-1')
+        Cart.objects.filter(user=self.customer).update(quantity=1)
+        retry = self.client.post('/api/cart/menu-items', body, format='json', HTTP_IDEMPOTENCY_KEY='cart-1')
+        self.assertEqual((retry.status_code, retry.content), (first.status_code, first.content))
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 1)  # Not applied again
+
+        other = self.make_user('other')
+        self.client.force_authenticate(other)
+        response = self.client.post('/api/cart/menu-items', body, format='json', HTTP_IDEMPOTENCY_KEY='cart-1')
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertTrue(Cart.objects.filter(user=other).exists())
+
+    def test_key_reused_for_a_different_request(self):
+        self.client.post('/api/cart/menu-items', {'menuitem': self.pasta.pk, 'quantity': 1}, format='json',
+                         HTTP_IDEMPOTENCY_KEY='key')
+        response = self.client.post('/api/cart/menu-items', {'menuitem': self.pasta.pk, 'quantity': 2}, format='json',
+                                    HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.checkout('key').status_code, 422)
+        self.assertEqual(self.checkout('x' * 256).status_code, 400)
+
+    def test_raised_client_errors_are_stored_and_replayed(self):
+        first = self.checkout('empty-cart')  # place_order raises ValidationError
+        self.assertEqual(first.status_code, 400)
+        self.client.post('/api/cart/menu-items', {'menuitem': self.pasta.pk, 'quantity': 1}, format='json')
+        retry = self.checkout('empty-cart')
+        self.assertEqual((retry.status_code, retry.content), (400, first.content))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertFalse(Order.objects.exists())
+
+        response = self.client.post('/api/cart/menu-items', {'menuitem': 999}, format='json', HTTP_IDEMPOTENCY_KEY='ghost')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(IdempotentRequest.objects.get(key='ghost').status_code, 404)
+
+    def test_errors_release_the_key_and_results_expire(self):
+        with mock.patch('LittleLemonAPI.views.place_order', side_effect=RuntimeError('database went away')):
+            with self.assertRaises(RuntimeError):
+                self.checkout('retry-me')
+        self.assertFalse(IdempotentRequest.objects.exists())
+
+        self.client.post('/api/cart/menu-items', {'menuitem': self.pasta.pk, 'quantity': 1}, format='json')
+        self.assertEqual(self.checkout('retry-me').status_code, 201)
+        IdempotentRequest.objects.update(expires=timezone.now())
+        self.assertEqual(self.checkout('retry-me').status_code, 400)  # Expired: checked out again, cart now empty
+
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        IdempotentRequest.objects.update(expires=timezone.now())
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotentRequest.objects.exists())
+
+    def test_result_commits_with_the_order(self):
+        self.client.post('/api/cart/menu-items', {'menuitem': self.pasta.pk, 'quantity': 1}, format='json')
+        # The worker dies after placing the order, before the key's result is stored
+        with mock.patch('LittleLemonAPI.idempotency.complete', side_effect=RuntimeError('worker killed')):
+            with self.assertRaises(RuntimeError):
+                self.checkout('crash')
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(IdempotentRequest.objects.exists())
+
+        self.assertEqual(self.checkout('crash').status_code, 201)
+        self.assertEqual(self.checkout('crash')['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    async def test_concurrent_duplicates_wait_for_the_first(self):
+        await Cart.objects.acreate(user=self.customer, menuitem=self.pasta, quantity=2)
+        client, headers = AsyncClient(), {**self.headers, 'Idempotency-Key': 'double-tap'}
+        real_place_order = place_order
+
+        def slow_place_order(user):
+            time.sleep(0.2)
+            return real_place_order(user)
+
+        with mock.patch('LittleLemonAPI.views.place_order', side_effect=slow_place_order) as placed:
+            first, second = await asyncio.gather(
+                client.post('/api/orders/', headers=headers),
+                client.post('/api/orders/', headers=headers),
+            )
+        self.assertEqual(placed.call_count, 1)
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(sorted(r.headers.get('Idempotent-Replayed', '') for r in (first, second)), ['', 'true'])
+        self.assertEqual(await Order.objects.acount(), 1)
+
+    async def test_duplicate_gives_up_on_a_stuck_first_request(self):
+        now = timezone.now()
+        await IdempotentRequest.objects.acreate(user=self.customer, key='stuck', fingerprint=fingerprint_of('/api/orders/'),
+                                                started=now, expires=now + timedelta(hours=1))
+        with self.settings(IDEMPOTENCY_WAIT_TIMEOUT=0.1):
+            response = await AsyncClient().post('/api/orders/', headers={**self.headers, 'Idempotency-Key': 'stuck'})
+        self.assertEqual(response.status_code, 409)
+
+        await IdempotentRequest.objects.aupdate(started=now - timedelta(minutes=5))  # Its worker died
+        await Cart.objects.acreate(user=self.customer, menuitem=self.pasta, quantity=1)
+        response = await AsyncClient().post('/api/orders/', headers={**self.headers, 'Idempotency-Key': 'stuck'})
+        self.assertEqual(response.status_code, 201)
+
+
+def fingerprint_of(path, method='POST', data=None):
+    request = mock.Mock(method=method, path=path, data=data or {})
+    return idempotency.fingerprint(request)
+
+
+class CartRepricingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = self.make_user('manager', 'Manager')
+        self.customers = [self.make_user(f'customer{i}') for i in range(3)]
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.pasta = MenuItem.objects.create(title='Pasta', price=9, featured=False, category=category)
+        self.soup = MenuItem.objects.create(title='Soup', price=4, featured=False, category=category)
+        for quantity, customer in enumerate(self.customers, start=1):
+            Cart.objects.create(user=customer, menuitem=self.pasta, quantity=quantity)
+            Cart.objects.create(user=customer, menuitem=self.soup, quantity=1)
+        self.client.force_authenticate(self.manager)
+
+    def cart_prices(self, menuitem):
+        return [(str(line.unit_price), str(line.price)) for line in Cart.objects.filter(menuitem=menuitem).order_by('quantity')]
+
+    def cart_updates(self, queries):
+        return [q['sql'] for q in queries if q['sql'].startswith('UPDATE "LittleLemonAPI_cart"')]
+
+    def test_single_price_change_reprices_carts_in_one_update(self):
+        for path in (f'/api/menu-items/{self.pasta.pk}', f'/api/menu-items/{self.pasta.pk}/'):
+            price = '10.50' if path.endswith('/') else '9.75'
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.patch(path, {'price': price}, format='json')
+            self.assertEqual(response.status_code, 200, path)
+            self.assertEqual(len(self.cart_updates(queries)), 1)
+            self.assertEqual(self.cart_prices(self.pasta),
+                             [(price, str(Decimal(price) * n)) for n in (1, 2, 3)])
+        self.assertEqual(self.cart_prices(self.soup), [('4.00', '4.00')] * 3)
+
+    def test_saves_that_keep_the_price_leave_carts_alone(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(f'/api/menu-items/{self.pasta.pk}', {'title': 'Linguine'}, format='json')
+            self.pasta.save(update_fields=['featured'])
+        self.assertEqual(Cart.objects.filter(menuitem=self.pasta).exclude(unit_price=9).count(), 0)
+        self.assertEqual(len(self.cart_updates(queries)), 1)  # The PATCH checks, matching nothing stale
+        self.assertEqual(reprice_carts(Cart.objects.all()), 0)
+
+    def test_bulk_price_changes_reprice_carts_in_one_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/menu-items/bulk/', [
+                {'id': self.pasta.pk, 'title': 'Pasta', 'price': '12.00'},
+                {'id': self.soup.pk, 'title': 'Soup', 'price': '5.00'},
+            ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.cart_updates(queries)), 1)
+        self.assertEqual(self.cart_prices(self.pasta), [('12.00', '12.00'), ('12.00', '24.00'), ('12.00', '36.00')])
+        self.assertEqual(self.cart_prices(self.soup), [('5.00', '5.00')] * 3)
+
+    def test_resync_command_reprices_in_batches(self):
+        MenuItem.objects.filter(pk=self.pasta.pk).update(price='8.00')  # Bypasses save(): carts go stale
+        MenuItem.objects.filter(pk=self.soup.pk).update(price='3.50')
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('resync_cart_prices', batch_size=4, stdout=out)
+        self.assertIn('6 cart lines repriced in 2 batches', out.getvalue())
+        self.assertEqual(len(self.cart_updates(queries)), 2)
+        self.assertEqual(self.cart_prices(self.pasta), [('8.00', '8.00'), ('8.00', '16.00'), ('8.00', '24.00')])
+        self.assertEqual(self.cart_prices(self.soup), [('3.50', '3.50')] * 3)
+
+
+class OrderArchiveTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = self.make_user('manager', 'Manager')
+        self.crew = self.make_user('crew', 'Delivery Crew')
+        self.customer = self.make_user('customer')
+        self.other = self.make_user('other')
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.pasta = MenuItem.objects.create(title='Pasta', price=10, featured=False, category=category)
+        self.soup = MenuItem.objects.create(title='Soup', price=4, featured=False, category=category)
+        # Delivered 100 and 50 days ago, pending from 100 days ago, delivered yesterday
+        self.old = self.order(days=100, delivered=True)
+        self.older_than_cutoff = self.order(days=50, delivered=True)
+        self.pending = self.order(days=100, delivered=False)
+        self.recent = self.order(days=1, delivered=True)
+
+    def order(self, days, delivered):
+        for item, quantity in ((self.pasta, 2), (self.soup, 1)):
+            Cart.objects.create(user=self.customer, menuitem=item, quantity=quantity)
+        order = place_order(self.customer)
+        Order.objects.filter(pk=order.pk).update(
+            status=delivered, delivery_crew=self.crew, date=timezone.now() - timedelta(days=days))
+        return order
+
+    def archive(self, **options):
+        out = StringIO()
+        call_command('archive_orders', days=30, stdout=out, **options)
+        return out.getvalue()
+
+    def listing(self, user, params=''):
+        self.client.force_authenticate(user)
+        response = self.client.get(f'/api/orders/?page_size=10{params}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['results']
+
+    def test_command_moves_old_delivered_orders_in_batches(self):
+        live = list(Order.objects.filter(pk=self.old.pk).values('user', 'delivery_crew', 'status', 'total', 'date'))
+        with CaptureQueriesContext(connection) as queries:
+            out = self.archive(batch_size=1)
+        self.assertIn('2 delivered orders placed before', out)
+        self.assertIn('archived in 2 batches', out)
+        self.assertEqual(sum(q['sql'].startswith('INSERT INTO "LittleLemonAPI_archivedorder"') for q in queries), 2)
+
+        self.assertEqual(sorted(Order.objects.values_list('pk', flat=True)), [self.pending.pk, self.recent.pk])
+        self.assertEqual(sorted(ArchivedOrder.objects.values_list('pk', flat=True)), [self.old.pk, self.older_than_cutoff.pk])
+        self.assertEqual(list(ArchivedOrder.objects.filter(pk=self.old.pk).values('user', 'delivery_crew', 'status', 'total', 'date')), live)
+        self.assertFalse(OrderItems.objects.filter(order__in=[self.old.pk, self.older_than_cutoff.pk]).exists())
+        self.assertEqual(sorted(ArchivedOrderItems.objects.filter(order=self.old.pk).values_list('menuitem__title', 'quantity', 'price')),
+                         [('Pasta', 2, Decimal('20.00')), ('Soup', 1, Decimal('4.00'))])
+        self.assertIn('0 delivered orders', self.archive())
+
+    def test_archived_orders_stay_readable_by_id(self):
+        self.archive()
+        self.client.force_authenticate(self.customer)
+        response = self.client.get(f'/api/orders/{self.old.pk}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], self.old.pk)
+        self.assertEqual(response.json()['total'], '24.00')
+        self.assertEqual([line['menuitem']['title'] for line in response.json()['order_items']], ['Pasta', 'Soup'])
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(f'/api/orders/{self.old.pk}').status_code, 403)
+        # Read-only: changes only apply to live orders
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.patch(f'/api/orders/{self.old.pk}', {'status': 0}).status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/orders/{self.old.pk}').status_code, 404)
+        self.assertTrue(ArchivedOrder.objects.filter(pk=self.old.pk, status=True).exists())
+
+    def test_listing_reads_the_archive_on_request(self):
+        self.archive()
+        self.assertEqual([order['id'] for order in self.listing(self.manager)], [self.recent.pk, self.pending.pk])
+        archived = self.listing(self.manager, '&archived=true')
+        self.assertEqual([order['id'] for order in archived], [self.older_than_cutoff.pk, self.old.pk])
+        self.assertEqual(archived[0]['user'], 'customer')
+        self.assertEqual(len(archived[0]['order_items']), 2)
+        self.assertEqual(len(self.listing(self.manager, '&archived=true&search=customer')), 2)
+        self.assertEqual(self.listing(self.manager, '&archived=true&search=other'), [])
+        self.assertEqual(len(self.listing(self.crew, '&archived=1')), 2)
+        self.assertEqual(self.listing(self.other, '&archived=true'), [])
+        with override_settings(FAST_SERIALIZATION=True):
+            self.assertEqual(self.listing(self.manager, '&archived=true'), archived)
+
+    def test_archiving_keeps_the_sales_rollups(self):
+        def totals():
+            return sorted(DailySales.objects.values_list('day', 'revenue', 'orders', 'units'))
+
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        before = totals()
+        self.archive()
+        self.assertEqual(totals(), before)
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(totals(), before)
+        self.assertEqual(sum(DailyMenuItemSales.objects.filter(menuitem=self.pasta).values_list('orders', flat=True)), 4)
+
+
+class OrderArchiveCommandTests(TransactionTestCase):
+    def test_command_starts_on_a_new_connection(self):
+        customer = User.objects.create_user(username='customer', password='lemon-pass-123')
+        item = MenuItem.objects.create(title='Pasta', price=9, featured=False,
+                                       category=Category.objects.create(slug='mains', title='Mains'))
+        Cart.objects.create(user=customer, menuitem=item, quantity=1)
+        order = place_order(customer)
+        Order.objects.filter(pk=order.pk).update(status=True, date=timezone.now() - timedelta(days=100))
+
+        out = StringIO()
+        for reopen in (False, True):
+            with fresh_connection(reopen) as fresh:
+                call_command('archive_orders', days=30, stdout=out)
+            self.assertIn('BEGIN IMMEDIATE', [query['sql'] for query in fresh.queries])
+        self.assertIn('1 delivered orders placed before', out.getvalue())
+        self.assertEqual(list(ArchivedOrder.objects.values_list('pk', flat=True)), [order.pk])
+        self.assertFalse(Order.objects.exists())
+
+
+class SeedCommandTests(TestCase):
+    def seed(self, **options):
+        out = StringIO()
+        options = {'categories': 2, 'menu_items': 6, 'managers': 1, 'crew': 2, 'customers': 3, 'cart_lines': 2,
+                   'orders': 7, 'items_per_order': 3, 'history_days': 10, 'batch_size': 4, **options}
+        call_command('seed', stdout=out, **options)
+        return out.getvalue()
+
+    def dataset(self):
+        return (
+            list(Cart.objects.order_by('user__username', 'menuitem__title')
+                 .values_list('user__username', 'menuitem__title', 'quantity', 'price')),
+            list(Order.objects.order_by('date')
+                 .values_list('user__username', 'delivery_crew__username', 'status', 'total', 'date')),
+            list(OrderItems.objects.order_by('order__date', 'menuitem__title')
+                 .values_list('order__date', 'menuitem__title', 'quantity', 'unit_price', 'price')),
+        )
+
+    def test_seed_inserts_the_requested_dataset(self):
+        out = self.seed()
+        self.assertIn('LittleLemonAPI.OrderItems', out)
+        self.assertIn('rows/s', out)
+        self.assertEqual((Category.objects.count(), MenuItem.objects.count()), (2, 6))
+        self.assertEqual(User.objects.filter(groups__name='Manager').count(), 1)
+        self.assertEqual(User.objects.filter(groups__name='Delivery Crew').count(), 2)
+        self.assertEqual(User.objects.filter(username__startswith='customer-', groups=None).count(), 3)
+        self.assertEqual(Cart.objects.count(), 6)
+        self.assertFalse(Cart.objects.exclude(unit_price=F('menuitem__price')).exists())
+        self.assertEqual((Order.objects.count(), Order.objects.filter(status=True).count(), OrderItems.objects.count()), (7, 4, 21))
+        for order in Order.objects.prefetch_related('order_items'):
+            self.assertEqual(order.total, sum(item.price for item in order.order_items.all()))
+        dates = list(Order.objects.order_by('id').values_list('date', flat=True))
+        self.assertEqual(dates, sorted(dates))  # Dates rise with the ids, as in production
+        self.assertGreater(dates[0], dates[-1] - timedelta(days=10))
+        self.assertEqual(sum(DailySales.objects.values_list('orders', flat=True)), 7)
+
+        # The id sequence moved past the seeded orders
+        customer = User.objects.get(username='customer-0')
+        self.assertEqual(place_order(customer).id, Order.objects.order_by('id')[6].id + 1)
+
+    def test_same_seed_gives_the_same_data_at_any_batch_size(self):
+        end = timezone.now()
+        for _ in SyntheticData(menu_items=20, customers=4, orders=15, seed=7, end=end, batch_size=2).insert():
+            pass
+        first = self.dataset()
+        User.objects.filter(is_superuser=False).delete()
+        MenuItem.objects.all().delete()
+        for _ in SyntheticData(menu_items=20, customers=4, orders=15, seed=7, end=end, batch_size=1000).insert():
+            pass
+        self.assertEqual(self.dataset(), first)
+
+        User.objects.filter(is_superuser=False).delete()
+        for _ in SyntheticData(menu_items=20, customers=4, orders=15, seed=8, end=end).insert():
+            pass
+        self.assertNotEqual(self.dataset(), first)
+
+    def test_refuses_to_seed_twice(self):
+        self.seed(orders=0)
+        with self.assertRaisesMessage(CommandError, 'already exists'):
+            self.seed()
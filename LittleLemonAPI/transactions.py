@@ -0,0 +1,44 @@
+"""
+Write transactions that take SQLite's write lock at BEGIN.
+
+SQLite starts transactions DEFERRED: the write lock is only requested at
+the first write. A transaction that reads before it writes (checkout reads
+the cart, update_cart the menu prices) then fails at once with "database is
+locked" if another connection committed a write in between, whatever the
+busy_timeout, because its read snapshot is stale. `BEGIN IMMEDIATE` takes
+the lock up front, so such a transaction queues for up to busy_timeout
+instead.
+
+Only the transactions that read and then write rows other requests write
+use immediate(); everything else (reads, exports, the admin, seeding,
+transactions whose first statement is a write) keeps the default deferred
+BEGIN and never waits for a writer it doesn't conflict with.
+"""
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+@contextmanager
+def immediate(using=None):
+    """
+    transaction.atomic(using), started with BEGIN IMMEDIATE on SQLite. Inside
+    a transaction that is already open (or on another database) it is a
+    plain atomic(): the lock mode is decided by the outermost BEGIN.
+    """
+    connection = transaction.get_connection(using)
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    # Connecting resets transaction_mode from the OPTIONS, so connect (and run the health check) first
+    connection.ensure_connection()
+    mode = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            connection.transaction_mode = mode  # BEGIN has run; nested and later transactions are unaffected
+            yield
+    finally:
+        connection.transaction_mode = mode
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import MenuItemViewSet, CartView, OrderView, SingleOrderView, SingleMenuItemView, ManagerUserManagementView, SingleManagerUserView, DeliveryCrewUserManagementView, SingleDeliveryCrewUserView
+from .async_views import OrderEventsView
+from .views import MenuItemViewSet, CartView, OrderView, OrderExportView, SingleOrderView, OrderDispatchView, SalesAnalyticsView, MetricsView, SingleMenuItemView, ManagerUserManagementView, SingleManagerUserView, DeliveryCrewUserManagementView, SingleDeliveryCrewUserView
 
 router = DefaultRouter()
 router.register(r'menu-items', MenuItemViewSet)
@@ -9,6 +10,11 @@ urlpatterns = [
     path('cart/menu-items', CartView.as_view(), name='cart-menu-items'),
     path('orders/', OrderView.as_view(), name='orders-list'),
     path('orders/<int:order_id>', SingleOrderView.as_view(), name='single-order'),
+    path('orders/dispatch', OrderDispatchView.as_view(), name='orders-dispatch'),
+    path('orders/events', OrderEventsView.as_view(), name='order-events'),
+    path('orders/export.<str:export_format>', OrderExportView.as_view(), name='orders-export'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('analytics/sales', SalesAnalyticsView.as_view(), name='sales-analytics'),
     path('', include(router.urls)),  # Include router for menu items
     path('menu-items/<int:pk>', SingleMenuItemView.as_view(), name='single-menu-item'),
     path('groups/manager/users', ManagerUserManagementView.as_view(), name='manager-users'),
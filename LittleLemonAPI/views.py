@@ -1,46 +1,93 @@
-from rest_framework import viewsets, status, generics, filters, serializers
+from rest_framework import viewsets, status, generics, filters
+from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
-from .models import MenuItem, Cart, Order, OrderItems
-from .serializers import MenuItemSerializer, CartSerializer, OrderSerializer, OrderItemsSerializer
+from .models import MenuItem, Cart, Order, OrderItems, ArchivedOrder, ArchivedOrderItems
+from .serializers import MenuItemSerializer, MenuItemImportSerializer, SalesReportQuerySerializer, SalesReportSerializer, CartSerializer, CartEntrySerializer, OrderSerializer
+from .cache import menu_snapshot_key, get_menu_snapshot, set_menu_snapshot
+from .services import place_order, update_cart, import_menu, delete_order, dispatch_orders
+from .parsers import CSVParser
+from .roles import MANAGER, DELIVERY_CREW, is_manager, is_delivery_crew
+from .authentication import StatelessJWTAuthentication
+from .pagination import MenuItemCursorPagination, OrderCursorPagination
+from .idempotency import idempotent
+from .search import MenuSearchFilter
+from .projections import MenuItemRows, CartRows, OrderRows, fast_serialization_enabled, ordering_columns
+from .filters import OrderExportFilter
+from .export import ndjson_lines, csv_lines
+from .rollups import sales_report
+from .schema import swagger_auto_schema
+from . import metrics, events
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework.settings import api_settings
 from django.contrib.auth.models import User, Group
 from rest_framework.views import APIView
-from django.shortcuts import get_object_or_404
-from django.utils import timezone
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework.permissions import BasePermission
 from rest_framework.exceptions import NotFound
-from drf_yasg.utils import swagger_auto_schema
+
+# Hot endpoints (menu, cart, orders) take user id and roles from JWT claims before trying the default schemes
+HOT_PATH_AUTHENTICATION_CLASSES = [StatelessJWTAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES]
 
 # Custom permission to allow only managers to modify menu items
 class IsManager(BasePermission):
     def has_permission(self, request, view):
         if request.method == 'GET':
             return True  # Allow everyone to view menu items
-        return request.user.groups.filter(name='Manager').exists()  # Only managers can modify
+        return is_manager(request.user)  # Only managers can modify
+
+# Custom permission to allow only Managers
+class IsManagerPermission(IsAuthenticated):
+    def has_permission(self, request, view):
+        return is_manager(request.user)
 
 # ViewSet for MenuItem (Managers only for modifications)
 class MenuItemViewSet(viewsets.ModelViewSet):
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
-    queryset = MenuItem.objects.all()
+    authentication_classes = HOT_PATH_AUTHENTICATION_CLASSES
+    queryset = MenuItem.objects.select_related('category')
     serializer_class = MenuItemSerializer
     permission_classes = [IsManager]
+    pagination_class = MenuItemCursorPagination  # Keyset pages over the chosen ordering, id as tiebreaker
     # Apply the swagger decorator to the list method to document it
     @swagger_auto_schema(operation_summary='List of all menu items')
     def list(self, request, *args, **kwargs):
-        # The logic for listing all menu items
-        return super().list(request, *args, **kwargs)
+        # Serve the pre-serialized menu for this exact query while the menu version is unchanged
+        cache_key = menu_snapshot_key(request)
+        data = get_menu_snapshot(cache_key)
+        if data is not None:
+            return Response(data)
+
+        if fast_serialization_enabled():
+            response = self.fast_list(request)
+        else:
+            response = super().list(request, *args, **kwargs)
+        set_menu_snapshot(cache_key, response.data)
+        return response
+
+    def fast_list(self, request):
+        """list() built from values() rows, see projections.py"""
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = MenuItemRows(self.get_serializer_context())
+        values = rows.values(queryset, ordering_columns(self, queryset))
+        page = self.paginate_queryset(values)
+        if page is None:
+            return Response([rows(row) for row in values])
+        return self.get_paginated_response([rows(row) for row in page])
     
     
     # Enable search, ordering, and filtering 
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter] 
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, MenuSearchFilter] 
     
     # Define fields to filter by 
     filterset_fields = ['title', 'price',] # Fields for DjangoFilterBackend 
     
     # Define search fields 
-    search_fields = ['title', 'category__title'] # Fields for SearchFilter 
+    search_fields = ['title', 'category__title'] # Fields for MenuSearchFilter (FTS5 index on SQLite, icontains elsewhere) 
     
     # Define ordering fields 
     ordering_fields = ['title', 'price',] # Fields for OrderingFilter 
@@ -49,9 +96,37 @@ class MenuItemViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save()
 
+    @swagger_auto_schema(method='post', operation_summary='Create or update many menu items from a JSON array or CSV')
+    @action(detail=False, methods=['post'], url_path='bulk',
+            permission_classes=[IsManagerPermission], parser_classes=[JSONParser, CSVParser])
+    def bulk(self, request):
+        """Upsert menu items by id or title; nothing is written unless every row is valid"""
+        if not isinstance(request.data, list) or not request.data:
+            return Response({"error": "Send a non-empty JSON array or CSV of menu items"}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows, errors = [], []
+        for index, data in enumerate(request.data):
+            serializer = MenuItemImportSerializer(data=data)
+            if serializer.is_valid():
+                rows.append(serializer.validated_data)
+            else:
+                errors.append({'row': index, 'errors': serializer.errors})
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        results, errors = import_menu(rows)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'created': sum(result['action'] == 'created' for result in results),
+            'updated': sum(result['action'] == 'updated' for result in results),
+            'results': results,
+        })
+
 # View for a single menu item
 class SingleMenuItemView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = MenuItem.objects.all()
+    authentication_classes = HOT_PATH_AUTHENTICATION_CLASSES
+    queryset = MenuItem.objects.select_related('category')
     serializer_class = MenuItemSerializer
     permission_classes = [IsManager]
     
@@ -64,7 +139,7 @@ class ManagerUserManagementView(APIView):
     def get(self, request):
         """List all users in the 'Manager' group."""
         try:
-            manager_group = Group.objects.get(name='Manager')
+            manager_group = Group.objects.get(name=MANAGER)
             managers = manager_group.user_set.all()
             return Response({"managers": [user.username for user in managers]})
         except Group.DoesNotExist:
@@ -79,7 +154,7 @@ class ManagerUserManagementView(APIView):
         
         try:
             user = User.objects.get(username=username)
-            manager_group, created = Group.objects.get_or_create(name='Manager')
+            manager_group, created = Group.objects.get_or_create(name=MANAGER)
             user.groups.add(manager_group)
             return Response({"message": f"User {user.username} added to Manager group."}, status=status.HTTP_201_CREATED)
         except User.DoesNotExist:
@@ -93,7 +168,7 @@ class SingleManagerUserView(APIView):
         """Remove a user from the 'Manager' group using username."""
         try:
             user = User.objects.get(username=username)
-            manager_group = Group.objects.get(name='Manager')
+            manager_group = Group.objects.get(name=MANAGER)
             user.groups.remove(manager_group)
             return Response({"message": f"User {user.username} removed from Manager group."}, status=status.HTTP_200_OK)
         except User.DoesNotExist:
@@ -102,18 +177,13 @@ class SingleManagerUserView(APIView):
             return Response({"error": "Manager group does not exist"}, status=status.HTTP_404_NOT_FOUND)
         
 
-# Custom permission to allow only Managers
-class IsManagerPermission(IsAuthenticated):
-    def has_permission(self, request, view):
-        return request.user.groups.filter(name="Manager").exists()
-
 class DeliveryCrewUserManagementView(APIView):
     permission_classes = [IsManagerPermission]  # Only managers can manage delivery crew
 
     def get(self, request):
         """List all users in the 'Delivery Crew' group."""
         try:
-            delivery_group = Group.objects.get(name='Delivery Crew')
+            delivery_group = Group.objects.get(name=DELIVERY_CREW)
             delivery_crew = delivery_group.user_set.all()
             return Response({"delivery_crew": [user.username for user in delivery_crew]})
         except Group.DoesNotExist:
@@ -127,7 +197,7 @@ class DeliveryCrewUserManagementView(APIView):
         
         try:
             user = User.objects.get(username=username)
-            delivery_group, created = Group.objects.get_or_create(name='Delivery Crew')
+            delivery_group, created = Group.objects.get_or_create(name=DELIVERY_CREW)
             user.groups.add(delivery_group)
             return Response({"message": f"User {user.username} added to Delivery Crew group."}, status=status.HTTP_201_CREATED)
         except User.DoesNotExist:
@@ -140,7 +210,7 @@ class SingleDeliveryCrewUserView(APIView):
         """Remove a user from the 'Delivery Crew' group using username."""
         try:
             user = User.objects.get(username=username)
-            delivery_group = Group.objects.get(name='Delivery Crew')
+            delivery_group = Group.objects.get(name=DELIVERY_CREW)
             user.groups.remove(delivery_group)
             return Response({"message": f"User {user.username} removed from Delivery Crew group."}, status=status.HTTP_200_OK)
         except User.DoesNotExist:
@@ -149,27 +219,39 @@ class SingleDeliveryCrewUserView(APIView):
             return Response({"error": "Delivery Crew group does not exist"}, status=status.HTTP_404_NOT_FOUND)
 
 
-# View for Cart Management (Customers only)
+# View for Cart Management (Customers only); async_views.AsyncCartView serves it under ASGI
 class CartView(APIView):
     permission_classes = [IsAuthenticated]  # Only logged-in users can access
+    authentication_classes = HOT_PATH_AUTHENTICATION_CLASSES
 
     def get(self, request):
         """Return all cart items for the authenticated user"""
-        cart_items = Cart.objects.filter(user=request.user)
+        return Response(self.cart_data(request))
+
+    def cart_data(self, request):
+        if fast_serialization_enabled():
+            rows = CartRows({'request': request})
+            return [rows(row) for row in rows.values(Cart.objects.filter(user=request.user))]
+
+        cart_items = Cart.objects.filter(user=request.user).select_related('user', 'menuitem__category')
         serializer = CartSerializer(cart_items, many=True, context={'request': request})  #Pass request context
-        return Response(serializer.data)
+        return serializer.data
 
+    @idempotent
     def post(self, request):
-        """Add a menu item to the cart or update quantity"""
+        """Add a menu item to the cart or update quantity, or apply a list of such changes at once"""
+        if isinstance(request.data, list):
+            return self.post_many(request)
+
         menu_item_id = request.data.get("menuitem")
         quantity = int(request.data.get("quantity", 1))  # Default to 1 if not provided
         
         if not menu_item_id or not quantity or int(quantity) <= 0:
             return Response({"error": "Invalid menu item or quantity"}, status=status.HTTP_400_BAD_REQUEST)
 
-        menu_item_obj = get_object_or_404(MenuItem, id=menu_item_id)
+        menu_item_obj = get_object_or_404(MenuItem.objects.select_related('category'), id=menu_item_id)
 
-        cart_item, created = Cart.objects.get_or_create(
+        cart_item, created = Cart.objects.select_related('user', 'menuitem__category').get_or_create(
             user=request.user,
             menuitem=menu_item_obj,
             defaults={'quantity': quantity}  # No need to set unit_price, handled in model
@@ -182,15 +264,35 @@ class CartView(APIView):
 
         return Response(CartSerializer(cart_item, context={'request': request}).data, status=status.HTTP_201_CREATED)
 
+    def post_many(self, request):
+        """Set the quantity of every listed menu item (0 removes it) and return the whole cart"""
+        serializer = CartEntrySerializer(data=request.data, many=True, allow_empty=False)
+        serializer.is_valid(raise_exception=True)
+        update_cart(request.user, serializer.validated_data)
+        return Response(self.cart_data(request), status=status.HTTP_200_OK)
+
     def delete(self, request):
         """Remove all cart items for the authenticated user"""
         Cart.objects.filter(user=request.user).delete()
         return Response({"message": "Cart cleared successfully"}, status=status.HTTP_204_NO_CONTENT)
 
-# View for Order Management (Customers, Managers, Delivery Crew)
+# Orders with everything OrderSerializer renders (users, order items, menu items, categories) loaded up front
+def orders_with_details():
+    return Order.objects.select_related('user', 'delivery_crew').prefetch_related(order_items_with_details())
+
+def order_items_with_details():
+    return Prefetch('order_items', queryset=OrderItems.objects.select_related('menuitem__category'))
+
+def archived_orders_with_details():
+    return ArchivedOrder.objects.select_related('user', 'delivery_crew').prefetch_related(
+        Prefetch('order_items', queryset=ArchivedOrderItems.objects.select_related('menuitem__category')))
+
+# View for Order Management (Customers, Managers, Delivery Crew); async_views.AsyncOrderView serves it under ASGI
 class OrderView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
+    authentication_classes = HOT_PATH_AUTHENTICATION_CLASSES
     serializer_class = OrderSerializer
+    pagination_class = OrderCursorPagination  # Keyset pages, newest first by (date, id)
 
     # Enable search, ordering, and filtering
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
@@ -204,70 +306,131 @@ class OrderView(generics.ListCreateAPIView):
     # Define ordering fields
     ordering_fields = ['user__username', 'status']
 
+    # ?archived=true lists the archived orders instead of the live ones, see archive.py
+    archived_param = 'archived'
+
+    def archived(self):
+        return self.request.method == 'GET' and \
+            self.request.query_params.get(self.archived_param, '').lower() in ('1', 'true')
+
     def get_queryset(self):
         """
         Return different sets of orders based on the user's role.
         """
-        if self.request.user.groups.filter(name="Manager").exists():
+        orders = archived_orders_with_details() if self.archived() else orders_with_details()
+        if is_manager(self.request.user):
             # Manager sees all orders
-            return Order.objects.all()
-        elif self.request.user.groups.filter(name="Delivery Crew").exists():
+            return orders
+        elif is_delivery_crew(self.request.user):
             # Delivery crew sees only their assigned orders
-            return Order.objects.filter(delivery_crew=self.request.user)
+            return orders.filter(delivery_crew=self.request.user)
         else:
             # Customers see only their own orders
-            return Order.objects.filter(user=self.request.user)
+            return orders.filter(user=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        if fast_serialization_enabled():
+            return self.fast_list(request, self.filter_queryset(self.get_queryset()))
+        return super().list(request, *args, **kwargs)
+
+    def order_rows(self):
+        return OrderRows(self.get_serializer_context(), ArchivedOrderItems if self.archived() else OrderItems)
+
+    def fast_list(self, request, queryset):
+        """list() built from values() rows, see projections.py"""
+        rows = self.order_rows()
+        values = rows.values(queryset, ordering_columns(self, queryset))
+        page = self.paginate_queryset(values)
+        orders = page if page is not None else list(values)
+        data = rows.render(orders, rows.items([order['id'] for order in orders]))
+        return Response(data) if page is None else self.get_paginated_response(data)
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        """Place an order from the user's cart"""
+        return self.create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         """
         Create an order from the current cart items and clear the cart.
         """
-        user = self.request.user
-        cart_items = Cart.objects.filter(user=user)
+        order = place_order(self.request.user)
+        prefetch_related_objects([order], order_items_with_details())  # One query for the response, not one per line
+        serializer.instance = order
 
-        if not cart_items.exists():
-            raise serializers.ValidationError("Your cart is empty. Add items before placing an order.")
 
-        # Create the order
-        order = Order.objects.create(user=user, total=0, date=timezone.now())
 
-        total_price = 0  # Track total order price
+# Streaming order export for managers (NDJSON or CSV)
+class OrderExportView(APIView):
+    permission_classes = [IsManagerPermission]
+    authentication_classes = HOT_PATH_AUTHENTICATION_CLASSES
+    throttle_classes = []  # Reports are exempt from the per-user request budget
 
-        # Move items from cart to order
-        for cart_item in cart_items:
-            order_item = OrderItems.objects.create(
-                order=order,
-                menuitem=cart_item.menuitem,
-                quantity=cart_item.quantity,
-                unit_price=cart_item.menuitem.price,
-                price=cart_item.quantity * cart_item.menuitem.price,
-            )
-            total_price += order_item.price  # Add price to total
+    formats = {
+        'ndjson': (ndjson_lines, 'application/x-ndjson'),
+        'csv': (csv_lines, 'text/csv'),
+    }
 
-        # Update order total
-        order.total = total_price
-        order.save()
+    def get(self, request, export_format):
+        """Stream all orders matching the OrderView filters and an optional date_from/date_to range"""
+        if export_format not in self.formats:
+            raise NotFound("Unknown export format, use .ndjson or .csv")
 
-        # Clear the cart after creating the order
-        cart_items.delete()
+        filterset = OrderExportFilter(request.query_params, queryset=Order.objects.all(), request=request)
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        return order
+        lines, content_type = self.formats[export_format]
+        response = StreamingHttpResponse(lines(filterset.qs), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="orders.{export_format}"'
+        return response
 
 
+# Sales analytics for managers, answered from the daily rollup tables
+class SalesAnalyticsView(APIView):
+    permission_classes = [IsManagerPermission]
 
+    @swagger_auto_schema(operation_summary='Revenue, orders and units sold per day, menu item and category', query_serializer=SalesReportQuerySerializer)
+    def get(self, request):
+        """Sales figures for date_from..date_to (inclusive), with the top `limit` menu items and categories"""
+        params = SalesReportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        report = sales_report(**params.validated_data)
+        return Response(SalesReportSerializer(report).data)
+
+
+# Assign every unassigned, undelivered order to the least loaded delivery crew member (Managers only)
+class OrderDispatchView(APIView):
+    permission_classes = [IsManagerPermission]
+
+    @swagger_auto_schema(operation_summary='Assign unassigned orders to the least loaded delivery crew')
+    def post(self, request):
+        """Dispatch pending orders; returns the number assigned and each crew member's share and load"""
+        return Response(dispatch_orders())
+
+
+# Async under ASGI: async_views.AsyncSingleOrderView
 class SingleOrderView(APIView):
     permission_classes = [IsAuthenticated]
+    authentication_classes = HOT_PATH_AUTHENTICATION_CLASSES
 
-    def get_object(self, order_id):
+    def get_object(self, order_id, archived=False):
+        """The live order, else (archived=True) the archived one; archived orders are read-only"""
         try:
-            return Order.objects.get(id=order_id)
+            return orders_with_details().get(id=order_id)
         except Order.DoesNotExist:
+            if archived:
+                try:
+                    return archived_orders_with_details().get(id=order_id)
+                except ArchivedOrder.DoesNotExist:
+                    pass
             raise NotFound("Order not found")
 
     def get(self, request, order_id):
-        order = self.get_object(order_id)
+        return self.order_response(request, self.get_object(order_id, archived=True))
 
-        if request.user.groups.filter(name="Manager").exists() or \
+    def order_response(self, request, order):
+        if is_manager(request.user) or \
            request.user == order.user or \
            request.user == order.delivery_crew:
             serializer = OrderSerializer(order, context={'request': request})
@@ -277,12 +440,13 @@ class SingleOrderView(APIView):
 
     def patch(self, request, order_id):
         try:
-            order = Order.objects.get(id=order_id)
+            order = orders_with_details().get(id=order_id)
         except Order.DoesNotExist:
             return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
+        previous = (order.status, order.delivery_crew_id)
 
         # Manager: Assign delivery crew and update status
-        if request.user.groups.filter(name="Manager").exists():
+        if is_manager(request.user):
             delivery_crew_username = request.data.get('delivery_crew')
             if delivery_crew_username:
                 try:
@@ -293,26 +457,39 @@ class SingleOrderView(APIView):
 
             order.status = request.data.get('status', order.status)  # Keep the current status if not provided
             order.save()
+            self.publish_change(order, *previous)
             return Response(OrderSerializer(order, context={'request': request}).data)
 
         # Delivery Crew: Only allowed to update status
-        if request.user.groups.filter(name="Delivery Crew").exists():
+        if is_delivery_crew(request.user):
             if "status" in request.data:
                 order.status = request.data['status']
                 order.save()
+                self.publish_change(order, *previous)
                 return Response(OrderSerializer(order, context={'request': request}).data)
             return Response({"error": "You can only update the status."}, status=status.HTTP_403_FORBIDDEN)
 
         return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
 
+    def publish_change(self, order, previous_status, previous_crew_id):
+        """Tell the order event streams when the status or delivery crew changed"""
+        current_status = order._meta.get_field('status').to_python(order.status)
+        if current_status != previous_status or order.delivery_crew_id != previous_crew_id:
+            events.publish(order, previous_crew_id)
 
     def delete(self, request, order_id):
-        if request.user.groups.filter(name="Manager").exists():
-            order = self.get_object(order_id)
-            order.delete()
+        if is_manager(request.user):
+            delete_order(self.get_object(order_id))
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
 
 
+# Per-endpoint request metrics in Prometheus text format (Admins only)
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+    throttle_classes = []  # Scraped every few seconds
 
+    @swagger_auto_schema(operation_summary='Request, database and serialization metrics per endpoint (Prometheus text format)')
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,241 @@
+"""
+Throughput and latency of the main API routes under concurrent clients.
+
+Seeds a throwaway database (see harness.seed_database), then drives the real
+URL routes in-process through DRF's test client, one client per worker
+thread, authenticated the way production clients are (JWT bearer tokens by
+default). For every scenario it reports p50/p95/p99 latency, requests per
+second (wall clock), errors and the number of queries one request runs.
+
+    python -m benchmarks.api [--concurrency 4] [--requests 200] [--orders 5000]
+    python -m benchmarks.api --only menu-list,checkout --output after.json --baseline before.json
+
+Worker threads share the GIL, so higher concurrency mostly shows contention
+(database locks, shared caches) rather than extra throughput.
+"""
+import argparse
+import json
+import platform
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.harness import setup_django, seed_database, count_queries, summarize
+
+COMPARED = ['p50_ms', 'p95_ms', 'p99_ms', 'rps', 'queries']
+
+
+def build_scenarios(users, menu_ids, crew_orders):
+    """Scenario name -> (role, method, path(worker, i), body(worker, i) or None, setup(worker, i) or None)"""
+    from django.contrib.auth.models import User
+    from LittleLemonAPI.cache import bump_menu_version
+    from LittleLemonAPI.models import MenuItem, Cart
+
+    def refill_cart(worker, i):
+        customer = users['customer'][worker % len(users['customer'])]
+        items = MenuItem.objects.filter(pk__in=menu_ids[:3])
+        Cart.objects.bulk_create(
+            [Cart(user=customer, menuitem=item, quantity=1, unit_price=item.price, price=item.price) for item in items],
+            ignore_conflicts=True,
+        )
+
+    def crew_order(worker, i):
+        crew = users['crew'][worker % len(users['crew'])]
+        orders = crew_orders[crew.pk]
+        return f'/api/orders/{orders[i % len(orders)]}'
+
+    crew_names = list(User.objects.filter(pk__in=[user.pk for user in users['crew']]).values_list('username', flat=True))
+
+    return {
+        'menu-list': ('customer', 'get', lambda w, i: '/api/menu-items/', None, None),
+        'menu-list-uncached': ('customer', 'get', lambda w, i: '/api/menu-items/', None,
+                               lambda w, i: bump_menu_version()),
+        'menu-search': ('customer', 'get', lambda w, i: '/api/menu-items/?search=item%201', None,
+                        lambda w, i: bump_menu_version()),
+        'cart-get': ('customer', 'get', lambda w, i: '/api/cart/menu-items', None, None),
+        'cart-post': ('customer', 'post', lambda w, i: '/api/cart/menu-items',
+                      lambda w, i: {'menuitem': menu_ids[i % len(menu_ids)], 'quantity': i % 3 + 1}, None),
+        'checkout': ('customer', 'post', lambda w, i: '/api/orders/', lambda w, i: {}, refill_cart),
+        'orders-list-manager': ('manager', 'get', lambda w, i: '/api/orders/', None, None),
+        'orders-list-crew': ('crew', 'get', lambda w, i: '/api/orders/', None, None),
+        'orders-list-customer': ('customer', 'get', lambda w, i: '/api/orders/', None, None),
+        'order-patch-crew': ('crew', 'patch', crew_order, lambda w, i: {'status': i % 2}, None),
+        'order-patch-manager': ('manager', 'patch', crew_order,
+                                lambda w, i: {'delivery_crew': crew_names[w % len(crew_names)]}, None),
+    }
+
+
+def credentials(user, auth):
+    """HTTP_AUTHORIZATION value for the user in the chosen auth mode"""
+    if auth == 'token':
+        from rest_framework.authtoken.models import Token
+        return f'Token {Token.objects.get_or_create(user=user)[0].key}'
+    from LittleLemonAPI.authentication import RoleTokenObtainPairSerializer
+    return f'Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}'
+
+
+def request(client, method, path, body):
+    if body is None:
+        return getattr(client, method)(path)
+    return getattr(client, method)(path, body, format='json')
+
+
+def run_scenario(scenario, users, auth, requests, concurrency):
+    """Run the scenario from `concurrency` threads; returns the summary dict"""
+    from django.db import connections
+    from rest_framework.test import APIClient
+
+    role, method, path, body, setup = scenario
+    pool = users[role]
+    headers = [credentials(pool[worker % len(pool)], auth) for worker in range(concurrency)]
+    per_worker = max(1, requests // concurrency)
+    errors, lock = [], threading.Lock()
+
+    def worker(index):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=headers[index])
+        latencies = []
+        try:
+            for i in range(per_worker):
+                if setup:
+                    setup(index, i)
+                start = time.perf_counter()
+                try:
+                    response = request(client, method, path(index, i), body(index, i) if body else None)
+                    failed = response.status_code >= 400 and f'HTTP {response.status_code}'
+                except Exception as exc:  # A locked database surfaces here, count it and carry on
+                    failed = f'{type(exc).__name__}: {exc}'
+                latencies.append(time.perf_counter() - start)
+                if failed:
+                    with lock:
+                        errors.append(failed)
+        finally:
+            connections.close_all()
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = [latency for result in executor.map(worker, range(concurrency)) for latency in result]
+    wall = time.perf_counter() - start
+
+    result = summarize(latencies, wall_seconds=wall)
+    result.update(requests=len(latencies), errors=len(errors))
+    if errors:
+        result['error_sample'] = sorted(set(errors))[:3]
+    return result
+
+
+def count_scenario_queries(scenario, users, auth):
+    """Queries run by one request of the scenario (setup excluded), on the main thread"""
+    from rest_framework.test import APIClient
+
+    role, method, path, body, setup = scenario
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=credentials(users[role][0], auth))
+    if setup:
+        setup(0, 0)
+    with count_queries() as queries:
+        request(client, method, path(0, 0), body(0, 0) if body else None)
+        return len(queries)
+
+
+def compare(results, baseline):
+    """Print the change of each compared metric against a previous results file"""
+    print(f'\nchange vs baseline ({baseline["created"]}):')
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+        changes = []
+        for metric in COMPARED:
+            old, new = before.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            delta = f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+            changes.append(f'{metric} {old} -> {new} ({delta})')
+        print(f'{name:22} ' + ', '.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    scale = parser.add_argument_group('dataset')
+    scale.add_argument('--categories', type=int, default=10)
+    scale.add_argument('--items', type=int, default=500)
+    scale.add_argument('--managers', type=int, default=2)
+    scale.add_argument('--crew', type=int, default=10)
+    scale.add_argument('--customers', type=int, default=100)
+    scale.add_argument('--cart-lines', type=int, default=5)
+    scale.add_argument('--orders', type=int, default=5000)
+    scale.add_argument('--items-per-order', type=int, default=3)
+    scale.add_argument('--seed', type=int, default=1)
+    load = parser.add_argument_group('load')
+    load.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    load.add_argument('--concurrency', type=int, default=4, help='Client threads per scenario')
+    load.add_argument('--auth', choices=['jwt', 'token'], default='jwt')
+    load.add_argument('--only', help='Comma separated scenario names')
+    output = parser.add_argument_group('output')
+    output.add_argument('--output', help='Write the results as JSON to this file')
+    output.add_argument('--baseline', help='Compare with a results file written by --output')
+    args = parser.parse_args()
+
+    # A file database, so that every worker thread gets its own connection to the same data
+    teardown = setup_django(file_db=True)
+    try:
+        import django
+        from LittleLemonAPI.models import MenuItem, Order
+
+        start = time.perf_counter()
+        users = seed_database(
+            categories=args.categories, menu_items=args.items, managers=args.managers, crew=args.crew,
+            customers=args.customers, cart_lines=args.cart_lines, orders=args.orders,
+            items_per_order=args.items_per_order, seed=args.seed,
+        )
+        print(f'seeded {args.orders} orders, {args.items} menu items in {time.perf_counter() - start:.1f}s')
+
+        menu_ids = list(MenuItem.objects.order_by('pk').values_list('pk', flat=True)[:50])
+        crew_orders = {crew.pk: [] for crew in users['crew']}
+        for order_id, crew_id in Order.objects.filter(delivery_crew__isnull=False).values_list('pk', 'delivery_crew')[:10000]:
+            crew_orders[crew_id].append(order_id)
+
+        scenarios = build_scenarios(users, menu_ids, crew_orders)
+        if args.only:
+            names = args.only.split(',')
+            unknown = set(names) - set(scenarios)
+            if unknown:
+                parser.error(f'unknown scenarios: {", ".join(sorted(unknown))} (choose from {", ".join(scenarios)})')
+            scenarios = {name: scenarios[name] for name in names}
+
+        results = {}
+        print(f'concurrency={args.concurrency} requests={args.requests} auth={args.auth}')
+        for name, scenario in scenarios.items():
+            queries = count_scenario_queries(scenario, users, args.auth)
+            results[name] = {**run_scenario(scenario, users, args.auth, args.requests, args.concurrency),
+                             'queries': queries}
+            print(f'{name:22} {results[name]}')
+
+        report = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'config': vars(args),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+            },
+            'results': results,
+        }
+        if args.output:
+            with open(args.output, 'w') as fh:
+                json.dump(report, fh, indent=2)
+            print(f'results written to {args.output}')
+        if args.baseline:
+            with open(args.baseline) as fh:
+                compare(results, json.load(fh))
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+In-flight capacity of one worker: the async views under ASGI vs the sync views under WSGI.
+
+Drives LittleLemon.asgi / LittleLemon.wsgi in-process. The WSGI worker is
+modelled as a pool of --wsgi-threads threads (a gunicorn sync or gthread
+worker); the ASGI worker is one event loop. Clients keep --concurrency
+requests outstanding against the cart and order routes and the
+run reports throughput, latency and the peak number of requests the worker
+had in flight at once.
+
+Local SQLite answers in microseconds, which hides what an async worker buys;
+--db-latency-ms adds a sleep to every query to stand in for the network
+round trip to a database server.
+
+    python -m benchmarks.asgi_vs_wsgi [--concurrency 1,10,50] [--wsgi-threads 1,8] [--db-latency-ms 5]
+"""
+import argparse
+import asyncio
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from benchmarks.harness import setup_django, seed_database, summarize
+
+PATHS = ['/api/cart/menu-items', '/api/orders/']
+
+
+class InFlight:
+    """Count the requests currently inside the application and remember the peak"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.current -= 1
+
+
+def run_wsgi(application, headers, requests, concurrency, threads):
+    """Latencies (queueing included) and wall time of `requests` calls through a `threads`-thread WSGI worker"""
+    in_flight = InFlight()
+
+    def call(index):
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': PATHS[index % len(PATHS)], 'wsgi.input': io.BytesIO(b'')}
+        setup_testing_defaults(environ)
+        environ['HTTP_AUTHORIZATION'] = headers[index % len(headers)]
+        status = []
+        with in_flight:
+            body = b''.join(application(environ, lambda s, h, exc_info=None: status.append(s)))
+        assert status[0].startswith('200'), (status, body[:200])
+
+    # Clients keep `concurrency` requests outstanding; the worker runs `threads` of them at a time
+    worker = ThreadPoolExecutor(max_workers=threads)
+    slots = threading.Semaphore(concurrency)
+    latencies, done = [], threading.Event()
+    lock = threading.Lock()
+
+    def submit(index):
+        slots.acquire()
+        start = time.perf_counter()
+        future = worker.submit(call, index)
+
+        def finished(future):
+            future.result()
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                if len(latencies) == requests:
+                    done.set()
+            slots.release()
+
+        future.add_done_callback(finished)
+
+    start = time.perf_counter()
+    for index in range(requests):
+        submit(index)
+    done.wait()
+    wall = time.perf_counter() - start
+    worker.shutdown()
+    return latencies, wall, in_flight.peak
+
+
+def run_asgi(application, headers, requests, concurrency):
+    """Latencies and wall time of `requests` calls through one ASGI event loop"""
+    in_flight = InFlight()
+
+    async def call(index):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': PATHS[index % len(PATHS)], 'raw_path': b'', 'query_string': b'',
+            'root_path': '', 'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+            'headers': [(b'host', b'testserver'), (b'authorization', headers[index % len(headers)].encode())],
+        }
+        disconnected = asyncio.Event()
+        sent_body = False
+        messages = []
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnected.wait()  # Django listens for the client going away until the response is sent
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+
+        with in_flight:
+            await application(scope, receive, send)
+        disconnected.set()
+        assert messages[0]['status'] == 200, messages
+
+    async def main():
+        slots = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def client(index):
+            async with slots:
+                start = time.perf_counter()
+                await call(index)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(index) for index in range(requests)))
+        return latencies, time.perf_counter() - start
+
+    latencies, wall = asyncio.run(main())
+    return latencies, wall, in_flight.peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', default='1,10,50', help='Comma separated client concurrency levels')
+    parser.add_argument('--wsgi-threads', default='1,8', help='Comma separated WSGI worker thread counts')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per run')
+    parser.add_argument('--db-latency-ms', type=float, default=5.0, help='Simulated round trip added to every query')
+    parser.add_argument('--customers', type=int, default=50)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    teardown = setup_django(file_db=True)
+    try:
+        from django.core.asgi import get_asgi_application
+        from django.core.wsgi import get_wsgi_application
+        from django.db.backends.signals import connection_created
+        from LittleLemonAPI.authentication import RoleTokenObtainPairSerializer
+
+        users = seed_database(customers=args.customers, orders=args.orders)
+        headers = [f'Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}' for user in users['customer']]
+
+        delay = args.db_latency_ms / 1000
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            if slow_query not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_query)
+
+        if delay:
+            connection_created.connect(add_latency, weak=False)
+
+        wsgi, asgi = get_wsgi_application(), get_asgi_application()
+        levels = [int(level) for level in args.concurrency.split(',')]
+        results = []
+        print(f'requests={args.requests} db_latency_ms={args.db_latency_ms} paths={PATHS}')
+        for concurrency in levels:
+            runs = [(f'wsgi threads={threads}', lambda threads=threads: run_wsgi(wsgi, headers, args.requests, concurrency, threads))
+                    for threads in (int(value) for value in args.wsgi_threads.split(','))]
+            runs.append(('asgi', lambda: run_asgi(asgi, headers, args.requests, concurrency)))
+            for label, run in runs:
+                latencies, wall, peak = run()
+                result = {'mode': label, 'concurrency': concurrency, 'peak_in_flight': peak,
+                          **summarize(latencies, wall_seconds=wall)}
+                results.append(result)
+                print(f'concurrency={concurrency:<4} {label:16} peak in flight={peak:<4} '
+                      f'rps={result["rps"]:<8} p50={result["p50_ms"]}ms p99={result["p99_ms"]}ms')
+
+        if args.output:
+            with open(args.output, 'w') as fh:
+                json.dump({'config': vars(args), 'results': results}, fh, indent=2)
+            print(f'results written to {args.output}')
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Shared setup for the benchmark scripts.
+
+Benchmarks run against a throwaway test database (never db.sqlite3) and
+with throttling switched off, so numbers reflect the view code rather than
+the 5/minute rate limits.
+"""
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+import django
+
+
+def setup_django(file_db=False):
+    """
+    Configure Django and create a fresh test database; returns a teardown callable.
+
+    SQLite test databases live in memory unless file_db is set: then the
+    database is a file in a temporary directory (which teardown removes),
+    for when several threads need their own connections to the same data.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LittleLemon.settings')
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from rest_framework.throttling import SimpleRateThrottle
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    workdir = tempfile.TemporaryDirectory(prefix='littlelemon-bench-') if file_db else None
+    if workdir:
+        connection.settings_dict['TEST']['NAME'] = os.path.join(workdir.name, 'bench.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    throttle_patch = mock.patch.object(SimpleRateThrottle, 'allow_request', return_value=True)
+    throttle_patch.start()
+
+    def teardown():
+        throttle_patch.stop()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        if workdir:
+            workdir.cleanup()  # Along with the WAL and shared-memory files destroy_test_db leaves
+
+    return teardown
+
+
+@contextmanager
+def count_queries():
+    """
+    Collect the SQL executed inside the block.
+
+    Read the captured queries before the next request is made: Django
+    resets the query log on request_started once the block has exited.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as ctx:
+        yield ctx
+
+
+def time_calls(func, iterations):
+    """Call func repeatedly and return the per-call latencies in seconds"""
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize(latencies, wall_seconds=None):
+    """
+    Return p50/p95/p99 latency (ms) and requests per second.
+
+    Requests per second come from wall_seconds when the calls overlapped
+    (concurrent runs), otherwise from the sum of the latencies.
+    """
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    return {
+        'p50_ms': round(pct(0.50), 3),
+        'p95_ms': round(pct(0.95), 3),
+        'p99_ms': round(pct(0.99), 3),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 3),
+        'rps': round(len(ordered) / (wall_seconds or sum(ordered)), 1) if (wall_seconds or sum(ordered)) else 0.0,
+    }
+
+
+def seed_database(categories=10, menu_items=500, managers=1, crew=5, customers=50,
+                  cart_lines=5, orders=2000, items_per_order=3, seed=1, history_days=30):
+    """
+    Bulk-load a deterministic dataset with LittleLemonAPI.seeding (as `manage.py seed`
+    does); returns {'manager': [...], 'crew': [...], 'customer': [...]}.
+
+    Every customer gets cart_lines cart rows. Orders are spread over the
+    customers and the last history_days days, half delivered, each assigned
+    to a crew member, with items_per_order distinct menu items. The sales
+    rollups are rebuilt at the end so the analytics endpoint sees the orders.
+    """
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+
+    from LittleLemonAPI.rollups import rebuild_rollups
+    from LittleLemonAPI.seeding import SyntheticData
+
+    data = SyntheticData(
+        categories=categories, menu_items=menu_items, managers=managers, crew=crew, customers=customers,
+        cart_lines=cart_lines, orders=orders, items_per_order=items_per_order, history_days=history_days,
+        seed=seed, end=timezone.now(),
+    )
+    for _ in data.insert():
+        pass
+    rebuild_rollups()
+    return {role: list(User.objects.filter(pk__in=ids).order_by('pk')) for role, ids in data.user_ids.items()}
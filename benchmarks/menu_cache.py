@@ -0,0 +1,61 @@
+"""
+Menu snapshot cache: cold (cache-miss) vs warm (cache-hit) GET /api/menu-items,
+for the second page of the menu by price.
+
+    python -m benchmarks.menu_cache [--items 500] [--iterations 200]
+"""
+import argparse
+
+from benchmarks.harness import setup_django, count_queries, time_calls, summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=500)
+    parser.add_argument('--categories', type=int, default=10)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    teardown = setup_django()
+    try:
+        from django.test import Client
+        from LittleLemonAPI.cache import bump_menu_version
+        from LittleLemonAPI.models import Category, MenuItem
+
+        categories = Category.objects.bulk_create(
+            Category(slug=f'category-{i}', title=f'Category {i}') for i in range(args.categories)
+        )
+        MenuItem.objects.bulk_create(
+            MenuItem(title=f'Item {i}', price=i % 50 + 1, featured=i % 7 == 0,
+                     category=categories[i % len(categories)])
+            for i in range(args.items)
+        )
+
+        client = Client()
+        # The second page, through the keyset cursor link a client follows
+        url = client.get('/api/menu-items/?ordering=price').json()['next']
+        assert url and client.get(url).status_code == 200
+
+        def cold():
+            bump_menu_version()
+            client.get(url)
+
+        def warm():
+            client.get(url)
+
+        with count_queries() as queries:
+            cold()
+        miss_queries = len(queries)
+        with count_queries() as queries:
+            warm()
+        hit_queries = len(queries)
+
+        print(f'menu items: {args.items}, iterations: {args.iterations}')
+        print(f'cache miss: {summarize(time_calls(cold, args.iterations))}, queries={miss_queries}')
+        print(f'cache hit:  {summarize(time_calls(warm, args.iterations))}, queries={hit_queries}')
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Menu search: FTS5 trigram index vs the icontains SearchFilter, through GET /api/menu-items/.
+
+    python -m benchmarks.menu_search [--items 100000] [--iterations 50]
+"""
+import argparse
+import random
+from urllib.parse import quote
+from unittest import mock
+
+from benchmarks.harness import setup_django, count_queries, time_calls, summarize
+
+WORDS = ['lemon', 'pasta', 'grilled', 'salad', 'bruschetta', 'greek', 'tart', 'soup', 'fish', 'olive']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=100_000)
+    parser.add_argument('--categories', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    teardown = setup_django()
+    try:
+        from django.test import Client
+        from rest_framework import filters
+        from LittleLemonAPI.cache import bump_menu_version
+        from LittleLemonAPI.models import Category, MenuItem
+        from LittleLemonAPI.views import MenuItemViewSet
+
+        rng = random.Random(args.seed)
+        categories = Category.objects.bulk_create(
+            Category(slug=f'category-{i}', title=f'{rng.choice(WORDS).title()} Category {i}')
+            for i in range(args.categories)
+        )
+        MenuItem.objects.bulk_create(
+            (MenuItem(title=f'{rng.choice(WORDS).title()} {rng.choice(WORDS)} #{i}', price=i % 50 + 1,
+                      featured=False, category=categories[i % len(categories)])
+             for i in range(args.items)),
+            batch_size=5000,
+        )
+
+        client = Client()
+        icontains = mock.patch.object(MenuItemViewSet, 'filter_backends', [filters.OrderingFilter, filters.SearchFilter])
+        print(f'menu items: {args.items}, iterations: {args.iterations}')
+        # A broad term (the icontains scan fills a page early), a selective one and one with no match
+        for term in ('lemon', f'#{args.items // 2 + 1}', 'zzz'):
+            for label, extra, patch in (
+                ('icontains', '', icontains),
+                ('fts5', '', None),
+                ('fts5 ranked', '&ordering=relevance', None),
+            ):
+                url = f'/api/menu-items/?search={quote(term)}&page_size=10{extra}'
+
+                def search():
+                    bump_menu_version()  # Measure the search, not the snapshot cache
+                    assert client.get(url).status_code == 200
+
+                if patch:
+                    patch.start()
+                try:
+                    with count_queries() as queries:
+                        search()
+                    query_count = len(queries)
+                    result = summarize(time_calls(search, args.iterations))
+                finally:
+                    if patch:
+                        patch.stop()
+                print(f'search={term!r:10} {label:12} {result}, queries={query_count}')
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Manager order listing latency before and after archiving old delivered orders.
+
+Seeds a year of orders (half delivered), times the GET /api/orders/ queries
+a manager runs (first page, status filter, username filter and search,
+ordering by customer), archives the delivered orders older than --days with
+archive.archive_orders, then times the same queries again, plus the same
+search over the archive (?archived=true).
+
+    python -m benchmarks.order_archive [--orders 200000] [--days 90] [--repeat 20]
+    python -m benchmarks.order_archive --orders 2000000 --customers 10000 --repeat 5   # the README's figures
+"""
+import argparse
+import time
+
+from benchmarks.harness import setup_django, seed_database, summarize, time_calls
+
+QUERIES = [
+    ('first page', '/api/orders/'),
+    ('delivered', '/api/orders/?status=true'),
+    ('by customer', '/api/orders/?user__username=customer-7'),
+    ('search', '/api/orders/?search=customer-7'),
+    ('search, no match', '/api/orders/?search=nobody'),
+    ('by customer name', '/api/orders/?ordering=user__username'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--history-days', type=int, default=365, help='Orders are spread over this many days')
+    parser.add_argument('--days', type=int, default=90, help='Archive delivered orders older than this')
+    parser.add_argument('--batch-size', type=int, default=None, help='Orders per archive transaction')
+    parser.add_argument('--repeat', type=int, default=20, help='Requests per query and phase')
+    args = parser.parse_args()
+
+    teardown = setup_django()
+    try:
+        from rest_framework.test import APIClient
+        from LittleLemonAPI.archive import archive_cutoff, archive_orders
+        from LittleLemonAPI.models import Order, ArchivedOrder
+        from benchmarks.api import credentials
+
+        start = time.perf_counter()
+        users = seed_database(menu_items=200, customers=args.customers, cart_lines=0, orders=args.orders,
+                              history_days=args.history_days)
+        print(f'seeded {args.orders} orders over {args.history_days} days in {time.perf_counter() - start:.1f}s')
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=credentials(users['manager'][0], 'jwt'))
+
+        def p50(path):
+            response = client.get(path)
+            assert response.status_code == 200, (path, response.status_code)
+            return summarize(time_calls(lambda: client.get(path), args.repeat))['p50_ms']
+
+        before = {name: p50(path) for name, path in QUERIES}
+
+        start = time.perf_counter()
+        archived = sum(count for _, count in archive_orders(archive_cutoff(args.days), batch_size=args.batch_size))
+        seconds = time.perf_counter() - start
+        print(f'archived {archived} orders in {seconds:.1f}s ({archived / seconds:,.0f} orders/s); '
+              f'{Order.objects.count()} live, {ArchivedOrder.objects.count()} archived')
+
+        after = {name: p50(path) for name, path in QUERIES}
+
+        print(f'\n{"manager listing":18} {"before p50 ms":>14} {"after p50 ms":>13} {"speedup":>8}')
+        for name, _ in QUERIES:
+            print(f'{name:18} {before[name]:>14.2f} {after[name]:>13.2f} {before[name] / after[name]:>7.1f}x')
+        print(f'{"archive search":18} {"":>14} {p50("/api/orders/?archived=true&search=customer-7"):>13.2f}')
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
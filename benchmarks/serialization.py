@@ -0,0 +1,82 @@
+"""
+Rows serialized per second: the serializers vs the values() fast path (projections.py).
+
+Each run fetches the rows and builds the response data, as the list
+endpoints do, for the menu, all carts and the orders with their items; the
+rendered JSON of the two paths is compared byte for byte.
+
+    python -m benchmarks.serialization [--items 2000] [--orders 2000] [--repeat 5]
+"""
+import argparse
+import time
+
+from benchmarks.harness import setup_django, seed_database
+
+
+def best_rate(build, rows, repeat):
+    """Rows per second of the fastest of `repeat` runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build()
+        best = min(best, time.perf_counter() - start)
+    return rows / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=2000, help='Menu items')
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--cart-lines', type=int, default=5)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    teardown = setup_django()
+    try:
+        from rest_framework.renderers import JSONRenderer
+        from rest_framework.test import APIRequestFactory
+        from LittleLemonAPI.models import MenuItem, Cart
+        from LittleLemonAPI.projections import MenuItemRows, CartRows, OrderRows
+        from LittleLemonAPI.serializers import MenuItemSerializer, CartSerializer, OrderSerializer
+        from LittleLemonAPI.views import orders_with_details
+
+        seed_database(menu_items=args.items, customers=args.customers, cart_lines=args.cart_lines, orders=args.orders)
+        context = {'request': APIRequestFactory().get('/api/menu-items/')}
+
+        menu = MenuItem.objects.select_related('category').order_by('pk')
+        carts = Cart.objects.select_related('user', 'menuitem__category')
+
+        def fast_menu():
+            rows = MenuItemRows(context)
+            return [rows(row) for row in rows.values(menu)]
+
+        def fast_carts():
+            rows = CartRows(context)
+            return [rows(row) for row in rows.values(carts)]
+
+        def fast_orders():
+            rows = OrderRows(context)
+            orders = list(rows.values(orders_with_details().order_by('-date', '-pk')))
+            return rows.render(orders, rows.items([order['id'] for order in orders]))
+
+        cases = [
+            ('menu-items', menu.count(), lambda: MenuItemSerializer(list(menu), many=True, context=context).data, fast_menu),
+            ('cart', carts.count(), lambda: CartSerializer(list(carts), many=True, context=context).data, fast_carts),
+            ('orders', args.orders,
+             lambda: OrderSerializer(list(orders_with_details().order_by('-date', '-pk')), many=True, context=context).data,
+             fast_orders),
+        ]
+
+        print(f'{"list":12} {"rows":>7} {"serializer rows/s":>18} {"values rows/s":>14} {"speedup":>8}  identical')
+        for name, rows, serializer_path, values_path in cases:
+            identical = JSONRenderer().render(serializer_path()) == JSONRenderer().render(values_path())
+            before = best_rate(serializer_path, rows, args.repeat)
+            after = best_rate(values_path, rows, args.repeat)
+            print(f'{name:12} {rows:>7} {before:>18,.0f} {after:>14,.0f} {after / before:>7.1f}x  {identical}')
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Concurrent-writer stress test for the SQLite profile.
+
+Every thread is a different customer hammering the write paths: a bulk cart
+update (POST a list to /api/cart/menu-items), a single cart add and a
+checkout (POST /api/orders/). The run counts "database is locked" failures
+and exits non-zero if there were any.
+
+    python -m benchmarks.sqlite_writers [--threads 16] [--rounds 30]
+    python -m benchmarks.sqlite_writers --profile default   # stock SQLite settings, for comparison
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.harness import setup_django, seed_database, summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16, help='Concurrent writers, one customer each')
+    parser.add_argument('--rounds', type=int, default=30, help='Cart update + cart add + checkout rounds per writer')
+    parser.add_argument('--profile', choices=['production', 'default'], default='production',
+                        help='LITTLELEMON_SQLITE_PROFILE to run with')
+    args = parser.parse_args()
+
+    os.environ['LITTLELEMON_SQLITE_PROFILE'] = args.profile
+    teardown = setup_django(file_db=True)
+    try:
+        from django.db import connection, connections
+        from rest_framework.test import APIClient
+        from LittleLemonAPI.models import MenuItem, Order
+
+        users = seed_database(customers=args.threads, cart_lines=0, orders=0)
+        menu_ids = list(MenuItem.objects.order_by('pk').values_list('pk', flat=True)[:20])
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        connections.close_all()
+
+        latencies, errors, lock = [], [], threading.Lock()
+
+        def writer(index):
+            client = APIClient()
+            client.force_authenticate(users['customer'][index])
+            calls = [
+                lambda i: client.post('/api/cart/menu-items', [
+                    {'menuitem': menu_ids[i % len(menu_ids)], 'quantity': 2},
+                    {'menuitem': menu_ids[(i + 1) % len(menu_ids)], 'quantity': 1},
+                ], format='json'),
+                lambda i: client.post('/api/cart/menu-items', {'menuitem': menu_ids[(i + 2) % len(menu_ids)], 'quantity': 1},
+                                      format='json'),
+                lambda i: client.post('/api/orders/', {}, format='json'),
+            ]
+            try:
+                for i in range(args.rounds):
+                    for call in calls:
+                        start = time.perf_counter()
+                        try:
+                            response = call(i)
+                            failed = response.status_code >= 400 and f'HTTP {response.status_code}: {response.content[:100]!r}'
+                        except Exception as exc:
+                            failed = f'{type(exc).__name__}: {exc}'
+                        with lock:
+                            latencies.append(time.perf_counter() - start)
+                            if failed:
+                                errors.append(failed)
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            list(executor.map(writer, range(args.threads)))
+        wall = time.perf_counter() - start
+
+        locked = [error for error in errors if 'locked' in error]
+        print(f'profile={args.profile} journal_mode={journal_mode} writers={args.threads} rounds={args.rounds}')
+        print(f'requests={len(latencies)} orders={Order.objects.count()} errors={len(errors)} lock_errors={len(locked)}')
+        print(summarize(latencies, wall_seconds=wall))
+        for error in sorted(set(errors))[:5]:
+            print(f'  {error}')
+        return 1 if locked else 0
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    sys.exit(main())